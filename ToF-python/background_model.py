@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class BackgroundModel:
+    """
+    Persistent background model fed with already-processed depth maps.
+
+    The processing scripts used to rebuild the background every frame by
+    re-reading n_used frames from disk, undistorting them again and taking a
+    median over a fresh stack. This model keeps the last n_used sampled depth
+    maps in a fixed-size ring buffer instead. Each processed frame is offered
+    once through update(); one frame every n_interval / n_used frames is copied
+    into the buffer (O(pixels)), and the median is only recomputed when the
+    buffer content changed. Reading the background never touches the disk.
+
+    Args:
+        n_interval (int): Span of frames covered by the background (24 fps -> 720 for 30 seconds).
+        n_used (int): Number of frames kept in the ring buffer.
+        shape (tuple): Shape of the depth maps (height, width).
+        dtype: Storage type of the ring buffer and the background image.
+    """
+
+    def __init__(self, n_interval=720, n_used=10, shape=(480, 640), dtype=np.float32):
+        self.n_interval = n_interval
+        self.n_used = n_used
+        self.shape = tuple(shape)
+        # spacing between two sampled frames, matching the linspace sampling of create_background
+        self.stride = max(1, n_interval // n_used)
+        self._buffer = np.zeros((n_used,) + self.shape, dtype=dtype)
+        self._background = np.zeros(self.shape, dtype=dtype)
+        self._count = 0       # number of valid slots
+        self._head = 0        # next slot to overwrite
+        self._n_seen = 0      # frames offered through update()
+        self._last_index = None
+        self._dirty = False
+
+    def __len__(self):
+        return self._count
+
+    def prime(self, depth_maps):
+        """
+        Fill the ring buffer with a list of depth maps, e.g. the frames selected
+        by create_background at start-up, so the first background is meaningful.
+        """
+        for depth_map in depth_maps:
+            self.ingest(depth_map)
+
+    def prime_positions(self, n_available, from_start=False):
+        """
+        Positions of the frames to prime the model with, out of n_available
+        frames: n_used frames spread over the last n_interval, as create_background
+        for a live camera folder, or over the first n_interval with from_start
+        (a replayed capture, which starts at frame 0: the end of the file can
+        hold people walking through the first frames).
+        """
+        if n_available == 0:
+            return []
+        if n_available < self.n_interval:
+            return np.linspace(0, n_available - 1, self.n_used, dtype=int)
+        if from_start:
+            return np.linspace(0, self.n_interval - 1, self.n_used, dtype=int)
+        return np.linspace(n_available - self.n_interval, n_available - 1, self.n_used, dtype=int)
+
+    def ingest(self, depth_map):
+        """
+        Copy a depth map into the oldest slot of the ring buffer unconditionally.
+        """
+        np.copyto(self._buffer[self._head], depth_map, casting='unsafe')
+        self._head = (self._head + 1) % self.n_used
+        self._count = min(self._count + 1, self.n_used)
+        self._dirty = True
+
+    def update(self, depth_map, frame_index=None, stride=None):
+        """
+        Offer a processed depth map to the model.
+
+        Only one frame every `stride` frames is stored. When frame_index (the
+        sequence number of the frame in the capture) is given, the spacing is
+        measured in captured frames, so skipped frames are accounted for;
+        otherwise calls to update() are counted. A larger stride than the
+        model's (e.g. while the loop is behind) makes the background, and its
+        median, refresh less often.
+
+        Returns:
+            bool: True if the frame was stored in the ring buffer.
+        """
+        if frame_index is None:
+            frame_index = self._n_seen
+        self._n_seen += 1
+        if stride is None:
+            stride = self.stride
+        if self._last_index is not None and 0 <= frame_index - self._last_index < stride:
+            return False
+        self._last_index = frame_index
+        self.ingest(depth_map)
+        return True
+
+    @property
+    def background(self):
+        """
+        Current background image (per-pixel median of the ring buffer).
+        The returned array is owned by the model and is overwritten on refresh.
+        """
+        if self._dirty:
+            if self._count == 0:
+                self._background.fill(0)
+            else:
+                np.median(self._buffer[:self._count], axis=0, out=self._background)
+            self._dirty = False
+        return self._background
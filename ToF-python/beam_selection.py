@@ -0,0 +1,145 @@
+import math
+
+import numpy as np
+
+from ris_phase import PHI_COMBINATIONS, THETA_COMBINATIONS
+
+
+def direction_vectors(theta, phi):
+    """
+    Unit vectors (..., 3) of directions given by theta (from the RIS normal) and phi, in degrees.
+    """
+    theta_r, phi_r = np.radians(theta), np.radians(phi)
+    return np.stack(np.broadcast_arrays(np.sin(theta_r) * np.cos(phi_r), np.sin(theta_r) * np.sin(phi_r),
+                                        np.cos(theta_r)), axis=-1)
+
+
+def camera_to_ris_angles(angle_hor, angle_ver, flip_horizontal=False, flip_vertical=False):
+    """
+    (theta, phi) in degrees of the direction seen at the horizontal/vertical
+    angles of detection.target_angles (atan of the ray slopes), for a camera
+    aligned with the RIS normal.
+
+    The horizontal axis of the image maps to phi = 90 (positive angle_hor) and
+    phi = 270, the vertical axis to phi = 0 (positive angle_ver, downwards in
+    the image) and phi = 180, as in the 64 beam configurations.
+    """
+    if np.ndim(angle_hor) == 0 and np.ndim(angle_ver) == 0:
+        # single target: math is several times faster than numpy on scalars
+        y = math.tan(math.radians(angle_hor)) * (-1 if flip_horizontal else 1)
+        x = math.tan(math.radians(angle_ver)) * (-1 if flip_vertical else 1)
+        return math.degrees(math.atan(math.hypot(x, y))), math.degrees(math.atan2(y, x)) % 360
+    y = np.tan(np.radians(angle_hor)) * (-1 if flip_horizontal else 1)
+    x = np.tan(np.radians(angle_ver)) * (-1 if flip_vertical else 1)
+    theta = np.degrees(np.arctan(np.hypot(x, y)))
+    phi = np.mod(np.degrees(np.arctan2(y, x)), 360)
+    return theta, phi
+
+
+class BeamSelector:
+    """
+    Maps a target direction to the closest beam configuration on the sphere,
+    with hysteresis so the RIS is only retargeted on a meaningful change.
+
+    Closest means the smallest angle between the target and the configuration
+    directions. The answer is precomputed on a (theta, phi) grid, so a lookup
+    is a rounding and an array read whatever the codebook size. The current
+    configuration is kept until another one is closer by more than `hysteresis`
+    degrees for `dwell` consecutive frames.
+
+    Args:
+        theta, phi (array): Directions of the beam configurations in degrees (index order).
+        grid_step (float): Resolution of the lookup grid in degrees.
+        max_theta (float): Largest theta covered by the grid; larger values are clipped.
+        hysteresis (float): Margin in degrees by which a new configuration must be closer than the current one.
+        dwell (int): Consecutive frames the new configuration must win before switching.
+    """
+
+    def __init__(self, theta=THETA_COMBINATIONS, phi=PHI_COMBINATIONS, grid_step=0.25, max_theta=90,
+                 hysteresis=1.0, dwell=3):
+        self.theta = np.asarray(theta, dtype=np.float64)
+        self.phi = np.asarray(phi, dtype=np.float64)
+        self.directions = direction_vectors(self.theta, self.phi)
+        self.grid_step = grid_step
+        self.max_theta = max_theta
+        self.hysteresis = hysteresis
+        self.dwell = max(1, dwell)
+        self.grid = self._build_grid()
+        self.current = None
+        self._candidate = None
+        self._candidate_count = 0
+        self.n_switches = 0
+
+    def _build_grid(self):
+        thetas = np.arange(0, self.max_theta + self.grid_step / 2, self.grid_step)
+        phis = np.arange(0, 360, self.grid_step)
+        grid = np.empty((len(thetas), len(phis)), dtype=np.uint8 if len(self.theta) <= 256 else np.int32)
+        for row, theta in enumerate(thetas):
+            # the first of equally close configurations wins, as argmax
+            grid[row] = np.argmax(direction_vectors(theta, phis) @ self.directions.T, axis=-1)
+        return grid
+
+    def nearest(self, theta, phi):
+        """
+        Index of the closest configuration; theta and phi may be arrays.
+        """
+        if np.ndim(theta) == 0 and np.ndim(phi) == 0:
+            row = round(min(max(theta, 0), self.max_theta) / self.grid_step)
+            column = round(phi % 360 / self.grid_step) % self.grid.shape[1]
+            return self.grid.item(row, column)
+        row = np.rint(np.clip(theta, 0, self.max_theta) / self.grid_step).astype(np.intp)
+        column = np.rint(np.mod(phi, 360) / self.grid_step).astype(np.intp) % self.grid.shape[1]
+        return self.grid[row, column]
+
+    def nearest_exact(self, theta, phi):
+        """
+        Same as nearest without the grid (reference).
+        """
+        return np.argmax(direction_vectors(theta, phi) @ self.directions.T, axis=-1)
+
+    def angle_to(self, index, theta, phi):
+        """
+        Angle in degrees between configuration index and a direction (element-wise for arrays).
+        """
+        cosine = np.clip(np.sum(direction_vectors(theta, phi) * self.directions[index], axis=-1), -1, 1)
+        return np.degrees(np.arccos(cosine))
+
+    def _margin(self, winner, theta, phi):
+        # how much closer (degrees) the winner is than the current configuration
+        target = direction_vectors(theta, phi)
+        cosines = np.clip(self.directions[[self.current, winner]] @ target, -1, 1)
+        return math.degrees(math.acos(cosines[0]) - math.acos(cosines[1]))
+
+    def select(self, theta, phi):
+        """
+        Configuration to use for a target at (theta, phi), given the previous ones.
+
+        Returns:
+            int: The selected configuration index.
+        """
+        winner = int(self.nearest(theta, phi))
+        if self.current is None:
+            self.current = winner
+            return self.current
+        if winner == self.current or self._margin(winner, theta, phi) <= self.hysteresis:
+            self._candidate, self._candidate_count = None, 0
+            return self.current
+        if winner == self._candidate:
+            self._candidate_count += 1
+        else:
+            self._candidate, self._candidate_count = winner, 1
+        if self._candidate_count >= self.dwell:
+            self.current = winner
+            self._candidate, self._candidate_count = None, 0
+            self.n_switches += 1
+        return self.current
+
+    def select_camera(self, angle_hor, angle_ver, **kwargs):
+        """
+        select() for the horizontal/vertical camera angles of a target (see camera_to_ris_angles).
+        """
+        return self.select(*camera_to_ris_angles(angle_hor, angle_ver, **kwargs))
+
+    def reset(self):
+        self.current = None
+        self._candidate, self._candidate_count = None, 0
@@ -0,0 +1,96 @@
+"""
+Target angles: the linear pixel-to-angle mappings of calculate_bbox_angles and
+average_angle against the pinhole angle maps (mean angle of the pixels and
+direction of the depth-weighted centroid), on a person walking through the
+field of view (synthetic_scene). Errors are against the direction of the
+body centre, timings per frame.
+"""
+import numpy as np
+
+import bench_utils
+from camera_model import CameraModel
+from detection import find_components, target_angles
+from synthetic_scene import SceneGenerator
+
+N_FRAMES = 240
+
+
+def main():
+    reference = bench_utils.load_reference()
+    camera_model = CameraModel(reference.camera_matrix)
+    generator = SceneGenerator(1, seed=3, noise=0.01, dropout=0.005)
+    frames = generator.render(0, N_FRAMES)
+    positions = generator.positions(np.arange(N_FRAMES))[:, 0]
+    # direction of the body centre (half the height above the floor)
+    truth = np.array([row[7:9] for row in generator.ground_truth(0, N_FRAMES)])
+
+    masks, depths, keep = [], [], []
+    for i, frame in enumerate(frames):
+        depth = frame.astype(np.float32) * bench_utils.DEPTH_SCALE
+        mask = ((depth > 0) & (depth < generator.background - 0.3)).astype(np.int32)
+        # in view, away from the walls, and not cut by the image border
+        components = find_components(mask, max_targets=1)
+        if len(components.ids) and components.areas[0] > 500:
+            x, y, w, h = components.boxes[0]
+            if x > 0 and x + w < bench_utils.WIDTH and abs(positions[i, 0]) < 2 and positions[i, 1] < 5:
+                masks.append(mask)
+                depths.append(depth)
+                keep.append(i)
+    truth = truth[keep]
+    print(f'{len(keep)} frames with the whole person in view')
+
+    methods = {
+        'calculate_bbox_angles (linear)': lambda m, d: reference.calculate_bbox_angles(
+            [tuple(find_components(m, max_targets=1).boxes[0])], m)[0],
+        'average_angle (linear)': lambda m, d: reference.average_angle(m),
+        'target_angles, mean (pinhole)': lambda m, d: target_angles(find_components(m, max_targets=1),
+                                                                     camera_model)[0],
+        'target_angles, centroid (pinhole)': lambda m, d: target_angles(find_components(m, max_targets=1),
+                                                                         camera_model, d)[0],
+    }
+    print(f'{"":<36s} {"horizontal error (deg)":>24s} {"vertical error (deg)":>22s} {"time (ms)":>10s}')
+    print(f'{"":<36s} {"mean":>8s} {"max":>7s} {"|x|>1.5":>8s} {"mean":>8s} {"max":>7s}')
+    for name, method in methods.items():
+        angles = np.array([method(m, d) for m, d in zip(masks, depths)], dtype=np.float64)
+        times = np.concatenate([bench_utils.time_calls(method, 1, m, d) for m, d in zip(masks, depths)])
+        error = np.abs(angles - truth)
+        off_axis = np.abs(positions[keep, 0]) > 1.5
+        print(f'{name:<36s} {error[:, 0].mean():8.2f} {error[:, 0].max():7.2f} {error[off_axis, 0].mean():8.2f} '
+              f'{error[:, 1].mean():8.2f} {error[:, 1].max():7.2f} {np.mean(times):10.3f}')
+    print('(the feet do not stand out of the floor, which biases every vertical estimate upwards)')
+
+    # time of the angle step alone, on the components found once
+    components = [find_components(m, max_targets=1) for m in masks]
+    boxes = [c.boxes for c in components]
+    linear = np.concatenate([bench_utils.time_calls(reference.calculate_bbox_angles, 1, b, m)
+                             for b, m in zip(boxes, masks)])
+    argwhere = np.concatenate([bench_utils.time_calls(reference.average_angle, 1, m) for m in masks])
+    mean = np.concatenate([bench_utils.time_calls(target_angles, 1, c, camera_model) for c in components])
+    centroid = np.concatenate([bench_utils.time_calls(target_angles, 1, c, camera_model, d)
+                               for c, d in zip(components, depths)])
+    bench_utils.report('calculate_bbox_angles', linear)
+    bench_utils.report('average_angle (argwhere)', argwhere)
+    bench_utils.report('target_angles, mean', mean)
+    bench_utils.report('target_angles, centroid', centroid)
+
+    # several targets: one bincount per sum for all of them
+    generator = SceneGenerator(10, seed=10)
+    frame = generator.render(0, 1)[0]
+    depth = frame.astype(np.float32) * bench_utils.DEPTH_SCALE
+    mask = ((depth > 0) & (depth < generator.background - 0.3)).astype(np.int32)
+    components = find_components(mask)
+    per_target = [(components.labels == i).astype(np.int32) for i in components.ids]
+    x, y, w, h = components.roi
+    full = [np.pad(m, ((y, bench_utils.HEIGHT - y - h), (x, bench_utils.WIDTH - x - w))) for m in per_target]
+    loop = bench_utils.time_calls(lambda: [reference.average_angle(m) for m in full], 20)
+    batched = bench_utils.time_calls(target_angles, 20, components, camera_model)
+    print(f'{len(components.ids)} targets: average_angle per target {np.mean(loop):.3f} ms, '
+          f'target_angles {np.mean(batched):.3f} ms')
+    # same as averaging the angle maps over the coordinate list of each target
+    angle_hor, angle_ver = camera_model.angle_maps
+    expected = [(angle_hor[m == 1].mean(), angle_ver[m == 1].mean()) for m in full]
+    np.testing.assert_allclose(target_angles(components, camera_model), expected, atol=1e-4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Per-frame background cost: create_background (re-reads n_used frames from disk
+every call) against BackgroundModel (one ring-buffer update per frame).
+"""
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import bench_utils
+from background_model import BackgroundModel
+
+N_FRAMES = 240
+N_INTERVAL, N_USED = 120, 10
+
+
+def main():
+    reference = bench_utils.load_reference()
+    frames = bench_utils.synthetic_raw_frames(N_FRAMES)
+
+    with tempfile.TemporaryDirectory() as folder:
+        for i, frame in enumerate(frames):
+            cv2.imwrite(os.path.join(folder, f'data_{i}.png'), frame)
+        reference.camera_folder = folder + '/'
+        images = sorted(os.listdir(folder), key=reference.natural_sort_key)
+
+        # Before: rebuild the background from disk for each processed frame
+        with bench_utils.quiet():
+            before = bench_utils.time_calls(reference.create_background, 20,
+                                            n_interval=N_INTERVAL, n_used=N_USED, images=images)
+            expected = reference.create_background(n_interval=N_INTERVAL, n_used=N_USED, images=images)
+
+        # After: feed each processed depth map once
+        camera_matrix = reference.camera_matrix
+        dist = np.array([-0.01, -0.0, -0.0, -0.0, -0.01], dtype=np.float64)
+        depth_maps = [reference.get_depth_map(cv2.undistort(f, camera_matrix, dist), clip=50) for f in frames]
+        model = BackgroundModel(n_interval=N_INTERVAL, n_used=N_USED, shape=frames.shape[1:])
+        after = np.empty(N_FRAMES)
+        for i, depth_map in enumerate(depth_maps):
+            t0 = time.perf_counter()
+            model.update(depth_map, frame_index=i)
+            model.background
+            after[i] = (time.perf_counter() - t0) * 1e3
+
+    bench_utils.report('create_background (disk, per frame)', before)
+    bench_utils.report('BackgroundModel.update + background', after)
+    print(f'speed-up (mean): {np.mean(before) / np.mean(after):.1f}x')
+    # both medians see the same scene, so they should agree to sensor-noise level
+    print(f'max |difference| vs create_background: {np.abs(model.background - expected).max():.4f} m')
+
+
+if __name__ == '__main__':
+    main()
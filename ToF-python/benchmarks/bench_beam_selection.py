@@ -0,0 +1,71 @@
+"""
+Beam selection: the linear scan of find_closest_image (horizontal angle only)
+against the (theta, phi) lookup grid of BeamSelector, in lookups per second,
+and the number of configuration switches on noisy synthetic trajectories.
+"""
+import time
+
+import numpy as np
+
+import bench_utils
+from beam_selection import BeamSelector, camera_to_ris_angles
+
+N_FRAMES = 2400  # 100 s at 24 fps
+
+
+def trajectories(n_frames, seed=0):
+    # (angle_hor, angle_ver) of calculate_bbox_angles for a person crossing the room,
+    # a person standing still and a person walking towards the camera, with tracker noise
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, n_frames)
+    noise = rng.normal(0, 1.5, (3, 2, n_frames))
+    return {'crossing': (-45 + 90 * t + noise[0, 0], 5 + noise[0, 1]),
+            'standing': (12 + noise[1, 0], -3 + noise[1, 1]),
+            'approaching': (20 + 10 * t + noise[2, 0], 2 + 25 * t + noise[2, 1])}
+
+
+def count_switches(indices):
+    indices = np.asarray(indices)
+    return int(np.count_nonzero(indices[1:] != indices[:-1]))
+
+
+def main():
+    reference = bench_utils.load_reference('full_multi_person_processing_serial_v5')
+    selector = BeamSelector()
+    print(f'lookup grid {selector.grid.shape}, {selector.grid.nbytes / 1e3:.0f} kB')
+
+    # grid against the exact nearest configuration
+    rng = np.random.default_rng(1)
+    theta, phi = rng.uniform(0, 70, 100000), rng.uniform(0, 360, 100000)
+    grid, exact = selector.nearest(theta, phi), selector.nearest_exact(theta, phi)
+    mismatch = grid != exact
+    margin = selector.angle_to(grid[mismatch], theta[mismatch], phi[mismatch]) - \
+        selector.angle_to(exact[mismatch], theta[mismatch], phi[mismatch])
+    print(f'grid vs exact: {mismatch.mean() * 100:.2f}% differ, by at most {margin.max(initial=0):.3f} degrees')
+
+    angles = rng.uniform(-50, 50, (2, 10000))
+    for name, fn in [('find_closest_image (scan)', lambda h, v: reference.find_closest_image(h)),
+                     ('BeamSelector.nearest (grid)', lambda h, v: selector.nearest(*camera_to_ris_angles(h, v))),
+                     ('BeamSelector.nearest_exact', lambda h, v: selector.nearest_exact(*camera_to_ris_angles(h, v)))]:
+        t0 = time.perf_counter()
+        for h, v in angles.T[:2000]:
+            fn(h, v)
+        rate = 2000 / (time.perf_counter() - t0)
+        print(f'{name:<40s} {rate:12,.0f} lookups/s')
+    t0 = time.perf_counter()
+    selector.nearest(*camera_to_ris_angles(angles[0], angles[1]))
+    print(f'{"BeamSelector.nearest, batch of 10000":<40s} {10000 / (time.perf_counter() - t0):12,.0f} lookups/s')
+
+    print(f'switches over {N_FRAMES} noisy frames:')
+    for name, (hor, ver) in trajectories(N_FRAMES).items():
+        legacy = [reference.find_closest_image(h) for h in hor]
+        counts = [count_switches(legacy)]
+        for hysteresis, dwell in [(0, 1), (1.0, 3), (2.0, 5)]:
+            selector = BeamSelector(hysteresis=hysteresis, dwell=dwell)
+            counts.append(count_switches([selector.select_camera(h, v) for h, v in zip(hor, ver)]))
+        print(f'    {name:<12s} find_closest_image {counts[0]:4d}   nearest {counts[1]:4d}   '
+              f'hysteresis 1 deg / 3 frames {counts[2]:4d}   2 deg / 5 frames {counts[3]:4d}')
+
+
+if __name__ == '__main__':
+    main()
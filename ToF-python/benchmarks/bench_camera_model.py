@@ -0,0 +1,39 @@
+"""
+Undistortion + depth conversion: cv2.undistort followed by get_depth_map against
+CameraModel.depth_map (cached remap tables, fused scale/clip into float32 buffers).
+"""
+import cv2
+import numpy as np
+
+import bench_utils
+from camera_model import CameraModel, DISTORTION_COEFFICIENTS
+
+N_CALLS = 200
+
+
+def main():
+    reference = bench_utils.load_reference()
+    camera_matrix = reference.camera_matrix
+    frame = bench_utils.synthetic_raw_frames(1)[0]
+    camera_model = CameraModel(camera_matrix, clip=50)
+
+    def before(img):
+        img_undistorted = cv2.undistort(img, camera_matrix, DISTORTION_COEFFICIENTS)
+        return reference.get_depth_map(img_undistorted, clip=50)
+
+    expected = before(frame)
+    result = camera_model.depth_map(frame)
+    print(f'max |difference|: {np.abs(result - expected).max():.2e} m')
+
+    bench_utils.report('cv2.undistort + get_depth_map', bench_utils.time_calls(before, N_CALLS, frame))
+    bench_utils.report('CameraModel.depth_map', bench_utils.time_calls(camera_model.depth_map, N_CALLS, frame))
+
+    frame_bytes = frame.size * 8
+    for name, fn in [('cv2.undistort + get_depth_map', before), ('CameraModel.depth_map', camera_model.depth_map)]:
+        peak = bench_utils.peak_allocation(fn, frame)
+        print(f'{name:<40s} allocated per frame {peak / 1e6:7.2f} MB '
+              f'({peak / frame_bytes:.2f} float64 frames)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Recording and replaying frames: one PLY-sized file per frame against a single
+capture file (buffered appends, np.memmap reads by frame number and time).
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from camera_model import CameraModel
+from capture_file import CaptureReader, CaptureWriter, convert_ply_folder
+from ply_reader import load_ply, ply_to_depth_image
+
+N_FRAMES = 240
+PLY_PATH = os.path.join(bench_utils.TOF_DIR, 'lidar_data_example.ply')
+
+
+def main():
+    reference = bench_utils.load_reference()
+    camera_model = CameraModel(reference.camera_matrix)
+    frames = bench_utils.synthetic_raw_frames(N_FRAMES)
+    ply_bytes = os.path.getsize(PLY_PATH)
+    ply_vertices = np.array(load_ply(PLY_PATH))
+    fx, fy, cx, cy = camera_model.fx, camera_model.fy, camera_model.cx, camera_model.cy
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Before: one ~3 MB file per frame, as the acquisition notebook did
+        ply_folder = os.path.join(folder, 'ply')
+        os.makedirs(ply_folder)
+        payload = bytes(ply_bytes)
+        t0 = time.perf_counter()
+        for i in range(N_FRAMES):
+            with open(os.path.join(ply_folder, f'data_{i}.ply'), 'wb') as f:
+                f.write(payload)
+        files_ms = (time.perf_counter() - t0) * 1e3
+
+        # After: buffered appends to one capture file
+        capture_path = os.path.join(folder, 'capture.fdcap')
+        t0 = time.perf_counter()
+        with CaptureWriter(capture_path, max_frames=N_FRAMES) as writer:
+            for i, frame in enumerate(frames):
+                writer.append(frame, timestamp=i / 24, sequence=i)
+        capture_ms = (time.perf_counter() - t0) * 1e3
+        print(f'{"write: one PLY file per frame":<40s} {files_ms / N_FRAMES:9.3f} ms/frame')
+        print(f'{"write: capture file":<40s} {capture_ms / N_FRAMES:9.3f} ms/frame '
+              f'({os.path.getsize(capture_path) / N_FRAMES / 1e6:.2f} MB/frame)')
+
+        # Random access reads
+        shutil.rmtree(ply_folder)
+        os.makedirs(ply_folder)
+        for i in range(20):
+            shutil.copy(PLY_PATH, os.path.join(ply_folder, f'data_{i}.ply'))
+        positions = rng.integers(0, 20, 50)
+        before = np.concatenate([bench_utils.time_calls(
+            lambda: ply_to_depth_image(load_ply(os.path.join(ply_folder, f'data_{p}.ply')), fx, fy, cx, cy), 1)
+            for p in positions])
+        reader = CaptureReader(capture_path)
+        assert np.array_equal(reader[17], frames[17]) and reader.position_of(17) == 17
+        after = bench_utils.time_calls(lambda: np.asarray(reader[int(rng.integers(N_FRAMES))]).sum(), 200)
+        by_time = bench_utils.time_calls(lambda: np.asarray(reader.frame_at(rng.uniform(0, N_FRAMES / 24))).sum(), 200)
+        bench_utils.report('read: PLY file -> depth image', before)
+        bench_utils.report('read: capture frame by number', after)
+        bench_utils.report('read: capture frame by time', by_time)
+
+        t0 = time.perf_counter()
+        n_converted = convert_ply_folder(ply_folder, os.path.join(folder, 'converted.fdcap'), fx, fy, cx, cy)
+        print(f'convert_ply_folder: {n_converted} frames in {(time.perf_counter() - t0) * 1e3:.0f} ms')
+        converted = CaptureReader(os.path.join(folder, 'converted.fdcap'))
+        assert np.array_equal(converted[0], ply_to_depth_image(ply_vertices, fx, fy, cx, cy))
+        reader.close()
+        converted.close()
+
+
+if __name__ == '__main__':
+    main()
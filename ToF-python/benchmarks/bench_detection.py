@@ -0,0 +1,71 @@
+"""
+Target detection on masks of 1 to 20 people (synthetic_scene): findContours +
+sorted(contourArea) + boundingRect and the per-box angle loop, against one
+connectedComponentsWithStats pass with top-k selection and the vectorized
+angles. Checks that both give the same boxes and angles.
+"""
+import cv2
+import numpy as np
+
+import bench_utils
+from detection import bbox_angles, find_components
+from synthetic_scene import SceneGenerator
+
+N_FRAMES = 48
+PEOPLE = (1, 2, 5, 10, 20)
+
+
+def person_masks(n_people, n_frames):
+    # pixels in front of the room, opened as preprocess_image does, as the binary mask of cluster_depth_map
+    generator = SceneGenerator(n_people, seed=n_people)
+    kernel = np.ones((3, 3), np.uint8)
+    masks = []
+    for frame in generator.render(0, n_frames):
+        depth = frame.astype(np.float32) * bench_utils.DEPTH_SCALE
+        mask = ((depth > 0) & (depth < generator.background - 0.3)).astype(np.uint8)
+        masks.append(cv2.dilate(cv2.erode(mask, kernel, iterations=2), kernel, iterations=2))
+    return masks
+
+
+def contour_boxes(BW_image, k):
+    # find_two_bounding_boxes_opencv_from_array for the k largest
+    contours, _ = cv2.findContours(BW_image.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [cv2.boundingRect(contour) for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:k]]
+
+
+def main():
+    reference = bench_utils.load_reference()
+    print(f'{"people":>6s} {"contours+sort":>14s} {"components":>11s} {"angles loop":>12s} {"vectorized":>11s}  (ms)')
+    for n_people in PEOPLE:
+        masks = person_masks(n_people, N_FRAMES)
+        contours = np.concatenate([bench_utils.time_calls(contour_boxes, 1, mask, n_people) for mask in masks])
+        components = np.concatenate([bench_utils.time_calls(find_components, 1, mask, max_targets=n_people)
+                                     for mask in masks])
+        boxes = [find_components(mask, max_targets=n_people).boxes for mask in masks]
+        loop = np.concatenate([bench_utils.time_calls(reference.calculate_bbox_angles, 1, b, masks[0])
+                               for b in boxes])
+        vectorized = np.concatenate([bench_utils.time_calls(bbox_angles, 1, b, masks[0].shape) for b in boxes])
+        print(f'{n_people:6d} {np.mean(contours):14.3f} {np.mean(components):11.3f} {np.mean(loop):12.3f} '
+              f'{np.mean(vectorized):11.3f}')
+
+        # parity: the same regions (ranked by pixel count rather than contour area, so compared as sets)
+        for mask, found in zip(masks, boxes):
+            expected = contour_boxes(mask, None)
+            everything = find_components(mask).boxes
+            assert sorted(map(tuple, everything.tolist())) == sorted(expected), 'components differ from contours'
+            assert set(map(tuple, found.tolist())) <= set(expected)
+            np.testing.assert_allclose(bbox_angles(found, mask.shape),
+                                       np.reshape(reference.calculate_bbox_angles(found, mask), (-1, 2)))
+    print('same boxes as findContours/boundingRect, same angles as calculate_bbox_angles')
+
+    # min-area filter and top-k on a noisy mask
+    mask = (np.random.default_rng(0).random((bench_utils.HEIGHT, bench_utils.WIDTH)) < 0.01).astype(np.uint8)
+    mask[100:300, 200:260] = 1
+    noisy = bench_utils.time_calls(find_components, 20, mask, max_targets=2)
+    filtered = bench_utils.time_calls(find_components, 20, mask, min_area=50, max_targets=2)
+    print(f'noisy mask, {find_components(mask).areas.size} regions: top-2 {np.mean(noisy):.3f} ms, '
+          f'with min_area=50 {np.mean(filtered):.3f} ms ({find_components(mask, min_area=50).areas.size} kept)')
+
+
+if __name__ == '__main__':
+    main()
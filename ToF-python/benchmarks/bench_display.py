@@ -0,0 +1,69 @@
+"""
+Processing loop throughput with the display modes of tracking_display:
+'headless', 'blit' (artists updated in place, refreshed at display_fps or
+every frame) and 'redraw' (axes cleared and everything redrawn every frame,
+as the loop did). Frames of a synthetic two-person walk are tracked as fast
+as possible (Agg backend, so the drawing cost is measured without a window).
+Also checks that a blitted refresh gives the same pixels as a full draw.
+"""
+import os
+
+import numpy as np
+
+import bench_utils
+from camera_model import fov_camera_matrix
+from pipeline import Tracker, result_dtype
+from synthetic_scene import SceneGenerator
+from tracking_display import TrackingDisplay
+
+N_FRAMES = 240
+
+
+def run(frames, mode, max_fps):
+    tracker = Tracker(fov_camera_matrix())
+    tracker.background_model.prime(tracker.camera_model.depth_map(f).copy() for f in frames[:10])
+    record = np.zeros((), dtype=result_dtype(2))
+    display = TrackingDisplay(mode, max_targets=2, max_fps=max_fps)
+
+    def frame(img, frame_index):
+        tracker(img, frame_index, record)
+        n = int(record['n'])
+        display.update(img, tracker.depth_map, record['boxes'][:n], record['angles'][:n])
+
+    times = np.concatenate([bench_utils.time_calls(frame, 1, img, i) for i, img in enumerate(frames)])
+    n_draws = display.n_draws
+    display.close()
+    return times, n_draws
+
+
+def check_blit():
+    # the blitted figure is pixel for pixel the figure drawn from scratch with the same artists
+    generator = SceneGenerator(2, seed=5)
+    img = generator.render(40, 1)[0]
+    depth_map = img.astype(np.float32) * bench_utils.DEPTH_SCALE
+    display = TrackingDisplay('blit', max_targets=2, max_fps=None)
+    display.update(img, depth_map, [[0, 0, 10, 10]], [[0.0, 0.0]])
+    display.update(img, depth_map, [[100, 120, 80, 200], [400, 100, 60, 220]], [[-12.5, 3.25], [20.0, -1.5]])
+    blitted = np.array(display.fig.canvas.buffer_rgba())
+    display.fig.canvas.draw()
+    drawn = np.array(display.fig.canvas.buffer_rgba())
+    display.close()
+    assert np.array_equal(blitted, drawn), 'blit differs from a full draw'
+
+
+def main():
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    check_blit()
+    print('blitted refresh identical to a full draw')
+    frames = SceneGenerator(2, seed=4).render(0, N_FRAMES + 10)
+    print(f'{N_FRAMES} frames tracked as fast as possible:')
+    for name, mode, max_fps in [('headless', 'headless', None), ('blit, 10 fps cap', 'blit', 10),
+                                ('blit, every frame', 'blit', None), ('redraw (before)', 'redraw', None)]:
+        times, n_draws = run(frames, mode, max_fps)
+        times = times[10:]  # after the figure is set up
+        print(f'{name:<20s} {1e3 / np.mean(times):7.1f} frames/s  p50 {np.percentile(times, 50):6.1f} ms  '
+              f'max {times.max():6.1f} ms  {n_draws:4d} refreshes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Per-frame cost of finding the latest frame in a 10k-file capture folder:
+sorted(os.listdir(...), key=natural_sort_key) against FrameSource.refresh + latest.
+One new file is written before every lookup, as during a live capture.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from frame_source import FrameSource, Observer
+
+N_FILES = 10000
+N_CALLS = 200
+
+
+def write_frame(folder, i):
+    with open(os.path.join(folder, f'data_{i}.ply'), 'wb') as f:
+        f.write(b'\0' * 64)
+
+
+def main():
+    reference = bench_utils.load_reference()
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(N_FILES):
+            write_frame(folder, i)
+
+        # Before: list and regex-sort the whole folder every frame
+        before = np.empty(N_CALLS)
+        for k in range(N_CALLS):
+            write_frame(folder, N_FILES + k)
+            t0 = time.perf_counter()
+            images = sorted(os.listdir(folder), key=reference.natural_sort_key)
+            images[-1]
+            before[k] = (time.perf_counter() - t0) * 1e3
+
+        modes = [('polling', False)] + ([('watcher', True)] if Observer is not None else [])
+        results = {}
+        for mode, use_watcher in modes:
+            t0 = time.perf_counter()
+            frame_source = FrameSource(folder, use_watcher=use_watcher)
+            startup = (time.perf_counter() - t0) * 1e3
+            offset = N_FILES + N_CALLS * (len(results) + 1)
+            after = np.empty(N_CALLS)
+            for k in range(N_CALLS):
+                write_frame(folder, offset + k)
+                if use_watcher:
+                    time.sleep(0.002)  # let the event arrive
+                t0 = time.perf_counter()
+                frame_source.refresh()
+                frame_source.latest()
+                after[k] = (time.perf_counter() - t0) * 1e3
+            t0 = time.perf_counter()
+            frame_source.frames(len(frame_source) - 120, len(frame_source) - 1)
+            window = (time.perf_counter() - t0) * 1e3
+            frame_source.close()
+            results[mode] = (after, startup, window)
+
+    bench_utils.report('listdir + natural sort (per frame)', before)
+    for mode, (after, startup, window) in results.items():
+        bench_utils.report(f'FrameSource {mode} refresh + latest', after)
+        print(f'    start-up index of {N_FILES} files: {startup:.1f} ms, frames(i..i+119): {window:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-frame stages after the depth map (background subtraction, preprocessing,
+segmentation, components, angles) with fresh temporaries, as the loop did,
+against the Preprocessor buffers and the out= segmentation and labelling.
+Checks that both give the same results, then reports the bytes allocated at
+the peak of a frame (tracemalloc), the throughput, and the peak RSS of a
+process running each chain on its own.
+"""
+import subprocess
+import sys
+
+import numpy as np
+
+import bench_utils
+from background_model import BackgroundModel
+from camera_model import CameraModel
+from detection import find_components, target_angles
+from preprocessing import Preprocessor
+
+N_FRAMES = 200
+N_RSS_FRAMES = 20  # few frames in the RSS processes, so their own memory does not hide the temporaries
+
+
+def make_chains(reference, n_frames=N_FRAMES):
+    camera_model = CameraModel(reference.camera_matrix, clip=50)
+    frames = bench_utils.synthetic_raw_frames(n_frames + 10, seed=2)
+    background_model = BackgroundModel(n_interval=10, n_used=10)
+    background_model.prime(camera_model.depth_map(f) for f in frames[:10])
+    background = background_model.background
+    depth_maps = [camera_model.depth_map(f).copy() for f in frames[10:]]
+    preprocessor = Preprocessor()
+
+    def before(depth_map):
+        bs_human_dm = -(depth_map - background)
+        BW_dm = reference.cluster_depth_map(reference.preprocess_image(bs_human_dm))
+        components = find_components(BW_dm, max_targets=2)
+        return BW_dm, target_angles(components, camera_model, depth_map)
+
+    def after(depth_map):
+        cleaned_image = preprocessor(depth_map, background)
+        BW_dm = reference.cluster_depth_map(cleaned_image, out=preprocessor.mask)
+        components = find_components(BW_dm, max_targets=2, out=preprocessor.labels)
+        return BW_dm, target_angles(components, camera_model, depth_map)
+
+    return depth_maps, before, after
+
+
+def _status_mb(field):
+    # VmRSS / VmHWM of this process from /proc (Linux)
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def run_only(mode):
+    # child process: run one chain over the frames and print its RSS and the peak RSS of the loop in MB
+    reference = bench_utils.load_reference()
+    depth_maps, before, after = make_chains(reference, N_RSS_FRAMES)
+    chain = before if mode == 'before' else after
+    chain(depth_maps[0])
+    rss = _status_mb('VmRSS')
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')  # reset the peak (VmHWM) to the current RSS
+    for _ in range(10):
+        for depth_map in depth_maps:
+            chain(depth_map)
+    print(rss, _status_mb('VmHWM') - rss)
+
+
+def main():
+    reference = bench_utils.load_reference()
+    depth_maps, before, after = make_chains(reference)
+
+    for depth_map in depth_maps:
+        expected_mask, expected_angles = before(depth_map)
+        mask, angles = after(depth_map)
+        assert np.array_equal(mask, expected_mask), 'segmentation differs'
+        np.testing.assert_array_equal(angles, expected_angles)
+    print(f'same masks and angles on {len(depth_maps)} frames')
+
+    # interleaved, so both chains see the same machine state
+    times = {before: [], after: []}
+    for _ in range(3):
+        for depth_map in depth_maps:
+            for chain in times:
+                times[chain].append(bench_utils.time_calls(chain, 1, depth_map)[0])
+    frame_bytes = depth_maps[0].size * 4
+    for name, chain in [('fresh temporaries', before), ('preallocated buffers', after)]:
+        peak = np.median([bench_utils.peak_allocation(chain, depth_map) for depth_map in depth_maps[:20]])
+        mode = 'before' if chain is before else 'after'
+        child = subprocess.run([sys.executable, __file__, mode], capture_output=True, text=True)
+        rss = f'RSS peak +{float(child.stdout.split()[1]):.1f} MB' if child.returncode == 0 else 'RSS n/a'
+        print(f'{name:<22s} {1e3 / np.mean(times[chain]):7.1f} frames/s  p50 {np.percentile(times[chain], 50):6.2f} ms  '
+              f'allocated per frame {peak / 1e6:5.2f} MB ({peak / frame_bytes:3.1f} float32 frames)  {rss}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run_only(sys.argv[1])
+    else:
+        main()
@@ -0,0 +1,95 @@
+"""
+Multi-process pipeline (pipeline.run_pipeline) against the single-process
+loop, on a synthetic two-person capture replayed in real time. The loop
+takes the newest frame and runs tracking, serial, CSV and (optionally) the
+display, redrawn every frame as the processing scripts did, one after the
+other; the pipeline runs them in four processes connected by shared memory
+rings. Reports frames/s per stage, frames skipped and queue depth, with and
+without a display (Agg, so the drawing cost is there without a window).
+
+    python benchmarks/bench_pipeline.py [--frames 480] [--speed 1]
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from beam_selection import BeamSelector
+from camera_model import fov_camera_matrix
+from capture_file import CaptureReader
+from detection import tracking_csv_header, tracking_csv_row
+from pipeline import Tracker, format_stats, result_dtype, run_pipeline
+from ris_link import RisLink
+from synthetic_scene import SceneGenerator, write_sequence
+from tracking_display import TrackingDisplay
+
+
+def run_loop(path, csv_filename, display, replay_speed):
+    # the stages one after the other on the newest frame, as the processing loop
+    reader = CaptureReader(path, replay_speed=replay_speed)
+    tracker = Tracker(fov_camera_matrix())
+    tracker.prime(reader)
+    ris_link = RisLink('loop://')
+    beam_selector = BeamSelector(hysteresis=1.0, dwell=3)
+    record = np.zeros((), dtype=result_dtype(2))
+    view = TrackingDisplay('redraw' if display else 'headless')
+    last_index, n_frames, last_sequence = None, 0, int(reader.sequences[-1])
+    t0 = time.perf_counter()
+    with open(csv_filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(tracking_csv_header(2))
+        while last_index != last_sequence:
+            frame_index, img = reader.latest_frame()
+            if frame_index == last_index:
+                time.sleep(.001)
+                continue
+            last_index = frame_index
+            n_frames += 1
+            tracker(img, frame_index, record)
+            n = int(record['n'])
+            if n:
+                ris_link.send_index(beam_selector.select_camera(*record['angles'][0].tolist()))
+            writer.writerow(tracking_csv_row('', record['boxes'][:n], record['angles'][:n], 2))
+            view.update(img, tracker.depth_map, record['boxes'][:n], record['angles'][:n])
+    elapsed = time.perf_counter() - t0
+    ris_link.close()
+    view.close()
+    return n_frames / elapsed, len(reader) - n_frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=480)
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed of the 24 fps capture')
+    args = parser.parse_args()
+    os.environ.setdefault('MPLBACKEND', 'Agg')  # inherited by the pipeline processes
+    print(f'{os.cpu_count()} CPU(s); capture of {args.frames} frames at 24 fps replayed at {args.speed}x '
+          f'({24 * args.speed:.0f} frames/s offered)')
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'walk.fdcap')
+        write_sequence(path, SceneGenerator(2, seed=4), args.frames)
+        csv_filename = os.path.join(folder, 'tracking.csv')
+
+        for display in (False, True):
+            name = 'display every frame' if display else 'headless'
+            fps, skipped = run_loop(path, csv_filename, display, args.speed)
+            print(f'single process, {name}: {fps:.1f} frames/s, {skipped} frames skipped')
+
+        for display in (False, True):
+            name = 'display at 10 fps' if display else 'headless'
+            os.remove(csv_filename)
+            stats, fps = run_pipeline(path, csv_filename=csv_filename, port='loop://', display=display,
+                                      display_fps=10, replay_speed=args.speed, until_end=True, report=None)
+            with open(csv_filename) as file:
+                n_rows = sum(1 for _ in file) - 1
+            print(f'pipeline, {name} ({n_rows} CSV rows for {int(stats[1, 0])} frames tracked):')
+            for line in format_stats(stats, fps).splitlines():
+                print('    ' + line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Reading lidar_data_example.ply: a naive line/struct parser against the
+memory-mapped reader, the chunked reader and the depth image rasterisation.
+"""
+import os
+import struct
+import time
+
+import numpy as np
+
+import bench_utils
+from camera_model import CameraModel
+from ply_reader import iter_ply_chunks, load_ply, ply_to_depth_image, read_ply_header
+
+PLY_PATH = os.path.join(bench_utils.TOF_DIR, 'lidar_data_example.ply')
+N_CALLS = 20
+
+
+def read_ply_naive(path):
+    # Header line by line, then one struct.unpack per vertex
+    with open(path, 'rb') as f:
+        n_vertices = 0
+        while True:
+            line = f.readline().decode('ascii').strip()
+            if line.startswith('element vertex'):
+                n_vertices = int(line.split()[-1])
+            if line == 'end_header':
+                break
+        vertex = struct.Struct('<fffBBB')
+        data = f.read()
+    return [vertex.unpack_from(data, i * vertex.size) for i in range(n_vertices)]
+
+
+def read_chunks(path):
+    return sum(len(chunk) for chunk in iter_ply_chunks(path))
+
+
+def main():
+    reference = bench_utils.load_reference()
+    camera_model = CameraModel(reference.camera_matrix)
+
+    t0 = time.perf_counter()
+    naive = read_ply_naive(PLY_PATH)
+    naive_ms = (time.perf_counter() - t0) * 1e3
+    vertices = load_ply(PLY_PATH)
+    assert len(naive) == len(vertices)
+    xyz = np.stack([vertices['x'], vertices['y'], vertices['z']], axis=1)
+    assert np.array_equal(np.array([v[:3] for v in naive], dtype=np.float32), xyz)
+    print(f'{"naive struct parser":<40s} {naive_ms:9.1f} ms ({len(naive)} vertices)')
+
+    header = read_ply_header(PLY_PATH)
+    bench_utils.report('read_ply_header', bench_utils.time_calls(read_ply_header, N_CALLS, PLY_PATH))
+    bench_utils.report('load_ply (memmap, header parsed)', bench_utils.time_calls(load_ply, N_CALLS, PLY_PATH, header))
+    bench_utils.report('load_ply + sum of z (touches all pages)',
+                       bench_utils.time_calls(lambda: float(load_ply(PLY_PATH, header)['z'].sum()), N_CALLS))
+    bench_utils.report('iter_ply_chunks (64k vertices)', bench_utils.time_calls(read_chunks, N_CALLS, PLY_PATH))
+
+    out = np.empty((480, 640), dtype=np.uint16)
+    fx, fy, cx, cy = camera_model.fx, camera_model.fy, camera_model.cx, camera_model.cy
+    bench_utils.report('ply_to_depth_image', bench_utils.time_calls(ply_to_depth_image, N_CALLS, vertices,
+                                                                     fx, fy, cx, cy, out=out))
+    depth_map = reference.get_depth_map(ply_to_depth_image(vertices, fx, fy, cx, cy), clip=50)
+    print(f'depth image: {np.count_nonzero(depth_map)} pixels filled, '
+          f'depth {depth_map[depth_map > 0].min():.2f} .. {depth_map.max():.2f} m')
+
+
+if __name__ == '__main__':
+    main()
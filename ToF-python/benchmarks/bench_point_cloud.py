@@ -0,0 +1,62 @@
+"""
+Point cloud from a 640x480 depth map: the original per-pixel loop against the
+vectorized depth_map_to_point_cloud and CameraModel.point_cloud (cached ray grids).
+"""
+import time
+
+import numpy as np
+
+import bench_utils
+from camera_model import CameraModel, depth_map_to_point_cloud
+
+N_CALLS = 50
+
+
+def depth_map_to_point_cloud_loop(depth_map, fx, fy, cx, cy, depth_scale):
+    # The per-pixel implementation the processing scripts used to have
+    point_cloud = []
+    height, width = depth_map.shape
+    for v in range(height):
+        for u in range(width):
+            if depth_map[v,u] != 0:
+                d = depth_map[v, u] * depth_scale
+                X_c = (u - cx) * d / fx
+                Y_c = (v - cy) * d / fy
+                Z_c = d 
+                camera_point = np.array([X_c, Y_c, Z_c])
+                camera_point = camera_point + [8,8,0]
+                point_cloud.append(camera_point)
+    return np.array(point_cloud)
+
+
+def main():
+    reference = bench_utils.load_reference()
+    camera_model = CameraModel(reference.camera_matrix)
+    frame = bench_utils.synthetic_raw_frames(1)[0]
+    depth_map = camera_model.depth_map(frame).copy()
+    depth_map[::7, ::5] = 0  # some invalid pixels
+    fx, fy, cx, cy = camera_model.fx, camera_model.fy, camera_model.cx, camera_model.cy
+
+    t0 = time.perf_counter()
+    expected = depth_map_to_point_cloud_loop(depth_map, fx, fy, cx, cy, 1.0)
+    loop_ms = (time.perf_counter() - t0) * 1e3
+    print(f'{"per-pixel loop":<40s} {loop_ms:9.1f} ms ({len(expected)} points)')
+
+    vectorized = depth_map_to_point_cloud(depth_map, fx, fy, cx, cy, 1.0)
+    cached = camera_model.point_cloud(depth_map)
+    print(f'max |difference| float64: {np.abs(vectorized - expected).max():.2e} m, '
+          f'float32: {np.abs(cached - expected).max():.2e} m')
+
+    out = np.empty((depth_map.size, 3), dtype=np.float32)
+    bench_utils.report('depth_map_to_point_cloud (vectorized)',
+                       bench_utils.time_calls(depth_map_to_point_cloud, N_CALLS, depth_map, fx, fy, cx, cy, 1.0))
+    bench_utils.report('CameraModel.point_cloud',
+                       bench_utils.time_calls(camera_model.point_cloud, N_CALLS, depth_map))
+    bench_utils.report('CameraModel.point_cloud (out buffer)',
+                       bench_utils.time_calls(camera_model.point_cloud, N_CALLS, depth_map, out=out))
+    bench_utils.report('CameraModel.point_cloud (160x200 ROI)',
+                       bench_utils.time_calls(camera_model.point_cloud, N_CALLS, depth_map, roi=(240, 140, 160, 200)))
+
+
+if __name__ == '__main__':
+    main()
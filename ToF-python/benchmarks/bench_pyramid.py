@@ -0,0 +1,99 @@
+"""
+Target detection at full resolution against the coarse-to-fine pyramid
+(pyramid.PyramidDetector) at 1/2 and 1/4 scale, on synthetic walks of 2 and
+5 people (synthetic_scene). The coarse boxes scaled back up (what a
+detection at reduced scale gives without refinement) are shown for
+comparison. Reports the time per frame from background subtraction to
+labelling, the frames with the same number of targets as the
+full-resolution path, and the box edge and centroid differences.
+"""
+import numpy as np
+
+import bench_utils
+from background_model import BackgroundModel
+from camera_model import CameraModel, fov_camera_matrix
+from detection import find_components
+from preprocessing import Preprocessor
+from pyramid import PyramidDetector
+from segmentation import TwoMeansSegmenter
+from synthetic_scene import SceneGenerator
+
+N_FRAMES = 240
+STEPS = (2, 4)
+
+
+def depth_maps(n_people):
+    camera_model = CameraModel(fov_camera_matrix(), clip=50)
+    maps = [camera_model.depth_map(img).copy() for img in SceneGenerator(n_people, seed=n_people).render(0, N_FRAMES)]
+    background_model = BackgroundModel(n_interval=N_FRAMES, n_used=10)
+    background_model.prime(maps[i] for i in background_model.prime_positions(len(maps)))
+    return maps, background_model.background.copy()
+
+
+def full_resolution(maps, background, max_targets):
+    preprocessor, segmenter = Preprocessor(), TwoMeansSegmenter()
+
+    def detect(depth_map):
+        BW_dm = segmenter(preprocessor(depth_map, background), out=preprocessor.mask)
+        return find_components(BW_dm, max_targets=max_targets, out=preprocessor.labels)
+
+    return run(detect, maps)
+
+
+def pyramid(maps, background, max_targets, step):
+    preprocessor, segmenter = Preprocessor(), TwoMeansSegmenter()
+    detector = PyramidDetector(preprocessor, segmenter, step=step)
+    coarse = []
+
+    def detect(depth_map):
+        BW_dm = detector(depth_map, background)
+        coarse.append(detector.components.boxes[:max_targets] * step)
+        return find_components(BW_dm, max_targets=max_targets, out=preprocessor.labels)
+
+    boxes, centroids, times = run(detect, maps)
+    return boxes, centroids, times, coarse, detector.n_growths
+
+
+def run(detect, maps):
+    boxes, centroids, times = [], [], []
+    for depth_map in maps:
+        times.append(bench_utils.time_calls(lambda: boxes.append(detect(depth_map)), 1)[0])
+        centroids.append(boxes[-1].centroids.copy())
+        boxes[-1] = boxes[-1].boxes.copy()
+    return boxes, centroids, np.array(times)
+
+
+def differences(boxes, reference, centroids=None, reference_centroids=None):
+    # share of frames with the same number of targets; box edge (and centroid) differences of those frames
+    same, edges, shifts = 0, [], []
+    for i, (box, ref) in enumerate(zip(boxes, reference)):
+        if len(box) != len(ref):
+            continue
+        same += 1
+        if len(ref):
+            edges.append(np.abs(box - ref).max())
+            if centroids is not None:
+                shifts.append(np.abs(centroids[i] - reference_centroids[i]).max())
+    return same / len(reference), np.array(edges), np.array(shifts)
+
+
+def main():
+    for n_people in (2, 5):
+        maps, background = depth_maps(n_people)
+        reference, reference_centroids, full_times = full_resolution(maps, background, n_people)
+        print(f'{n_people} people, {N_FRAMES} frames (ms per frame, background subtraction to labelling):')
+        bench_utils.report('full resolution', full_times)
+        for step in STEPS:
+            boxes, centroids, times, coarse, n_growths = pyramid(maps, background, n_people, step)
+            bench_utils.report(f'pyramid 1/{step} ({n_growths} windows grown)', times)
+            same, edges, shifts = differences(boxes, reference, centroids, reference_centroids)
+            coarse_same, coarse_edges, _ = differences(coarse, reference)
+            print(f'    {np.mean(full_times) / np.mean(times):.2f}x; same targets in {same:.1%} of the frames, '
+                  f'box edges mean {edges.mean():.2f} / max {edges.max():.0f} px, centroids mean '
+                  f'{shifts.mean():.3f} / max {shifts.max():.2f} px')
+            print(f'    coarse boxes without refinement: same targets in {coarse_same:.1%} of the frames, '
+                  f'box edges mean {coarse_edges.mean():.2f} / max {coarse_edges.max():.0f} px')
+
+
+if __name__ == '__main__':
+    main()
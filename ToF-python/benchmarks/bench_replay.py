@@ -0,0 +1,221 @@
+"""
+Offline replay of a depth sequence through the stages of the processing
+scripts, headless and with a stub serial port, reporting per-stage latency
+and end-to-end fps. Fails (exit status 1) when a stage got slower than a
+saved baseline by more than the threshold.
+
+    python benchmarks/bench_replay.py                         # all scripts, all fixtures
+    python benchmarks/bench_replay.py --script serial --source ply --frames 300
+    python benchmarks/bench_replay.py --source D:/capture.fdcap
+    python benchmarks/bench_replay.py --save-baseline baseline.json
+    python benchmarks/bench_replay.py --baseline baseline.json --threshold 0.25
+
+Fixtures: 'synthetic' (room with a walking person), 'ply' (the scene of
+lidar_data_example.ply with a walking person) or a capture file. Modes:
+'loop' replays them through the loop of the script itself (process_frame,
+with its frame scheduler, ROI tracking and pyramid settings), 'reference'
+with the original per-frame functions (cv2.undistort + get_depth_map,
+create_background from a folder of PNG frames).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import bench_utils
+from beam_selection import BeamSelector
+from camera_model import DISTORTION_COEFFICIENTS, CameraModel
+from capture_file import CaptureReader
+from frame_scheduler import FrameScheduler
+from ply_reader import load_ply, ply_to_depth_image
+from ris_link import RisLink
+from stage_timer import StageTimer
+
+SCRIPTS = {'multi': 'full_multi_person_processing_v4',
+           'single': 'full_single_person_processing_v4',
+           'serial': 'full_multi_person_processing_serial_v5'}
+PLY_PATH = os.path.join(bench_utils.TOF_DIR, 'lidar_data_example.ply')
+# differences below this are noise whatever the threshold
+NOISE_FLOOR_MS = 0.2
+
+
+def load_frames(source, n_frames, camera_matrix):
+    if source == 'synthetic':
+        return bench_utils.synthetic_raw_frames(n_frames)
+    if source == 'ply':
+        camera_model = CameraModel(camera_matrix)
+        scene = ply_to_depth_image(load_ply(PLY_PATH), camera_model.fx, camera_model.fy, camera_model.cx,
+                                   camera_model.cy)
+        return bench_utils.synthetic_raw_frames(n_frames, scene=scene)
+    reader = CaptureReader(source)
+    return np.array(reader.frames[:n_frames])
+
+
+class SteppedSource:
+    """
+    The frames as a frame source handed to the loop one at a time, each one
+    captured when it is handed out (a camera the loop keeps up with), so that
+    every frame is processed.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = -1
+        self.latest_time = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def read(self, position):
+        return self.frames[position]
+
+    def refresh(self):
+        pass
+
+    def step(self):
+        self.position += 1
+        self.latest_time = time.time()
+
+    def latest_frame(self):
+        return None if self.position < 0 else (self.position, self.frames[self.position])
+
+
+def replay_loop(module, frames, stage_timer, serial):
+    # the loop of the script itself (create_loop_models, process_frame and steer_beam, with its scheduler, ROI
+    # tracking and pyramid settings), without the display and the CSV file
+    frame_source = SteppedSource(frames)
+    models = module.create_loop_models(frame_source, from_start=True)
+    scheduler = FrameScheduler(target_latency=module.target_latency, stage_timer=stage_timer)
+    ris_link = RisLink('loop://', hysteresis=1) if serial else None
+    beam_selector = BeamSelector(hysteresis=1.0, dwell=3)
+    for _ in range(len(frames)):
+        stage_timer.start()
+        frame_source.step()
+        frame_index, img = scheduler.next_frame(frame_source)
+        stage_timer.lap('read')
+        _, _, angles_list, track_ids = module.process_frame(img, frame_index, models, scheduler.quality,
+                                                            scheduler.capture_time, stage_timer)
+        if serial:
+            module.steer_beam(angles_list, track_ids, models.target_tracker, beam_selector, ris_link)
+            stage_timer.lap('serial')
+        stage_timer.frame_done(frame_index)
+        scheduler.frame_done()
+    if ris_link is not None:
+        ris_link.close()
+    return scheduler.report()
+
+
+def replay_reference(module, frames, stage_timer, serial):
+    # frames written to a folder, background re-read from it every frame as before
+    with tempfile.TemporaryDirectory() as folder:
+        names = []
+        for i, frame in enumerate(frames):
+            names.append(f'data_{i}.png')
+            cv2.imwrite(os.path.join(folder, names[-1]), frame)
+        module.camera_folder = folder + '/'
+        # the folder already holds the first n_used frames when the loop starts
+        for frame_index in range(10, len(frames)):
+            stage_timer.start()
+            img = cv2.imread(module.camera_folder + names[frame_index], cv2.IMREAD_UNCHANGED)
+            stage_timer.lap('read')
+            img_undistorted = cv2.undistort(img, module.camera_matrix, DISTORTION_COEFFICIENTS)
+            clipped_depth_map_cor = module.get_depth_map(img_undistorted, clip=50)
+            stage_timer.lap('undistort')
+            background_image = module.create_background(n_interval=120, n_used=10, images=names[:frame_index + 1])
+            bs_human_dm = -(clipped_depth_map_cor - background_image)
+            stage_timer.lap('background')
+            _, angles_list = run_detection(module, bs_human_dm, stage_timer)
+            if serial:
+                if angles_list:
+                    module.find_closest_image(angles_list[0][0])
+                stage_timer.lap('serial')
+            stage_timer.frame_done(frame_index)
+
+
+def run_detection(module, bs_human_dm, stage_timer):
+    cleaned_image = module.preprocess_image(bs_human_dm)
+    stage_timer.lap('preprocess')
+    BW_dm = module.cluster_depth_map(cleaned_image)
+    stage_timer.lap('cluster')
+    bbox_opencv, _ = module.find_two_bounding_boxes_opencv_from_array(BW_dm, plot_bb=False)
+    stage_timer.lap('contours')
+    angles_list = module.calculate_bbox_angles(bbox_opencv, BW_dm, fov_horizontal=108, fov_vertical=78)
+    stage_timer.lap('angles')
+    return bbox_opencv, angles_list
+
+
+def summarize(stage_timer):
+    result = {}
+    for row in stage_timer.stats():
+        result[row['stage'].decode()] = {'mean_ms': row['sum'] / row['count'] * 1e3, 'p50_ms': row['p50'] * 1e3,
+                                         'p95_ms': row['p95'] * 1e3}
+    result['fps'] = 1e3 / result['frame']['mean_ms']
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    Regressions of the p50 latencies against a baseline, as printable lines.
+    """
+    regressions = []
+    for run, stages in results.items():
+        for stage, values in stages.items():
+            if stage == 'fps' or stage not in baseline.get(run, {}):
+                continue
+            before, after = baseline[run][stage]['p50_ms'], values['p50_ms']
+            if after > before * (1 + threshold) and after - before > NOISE_FLOOR_MS:
+                regressions.append(f'{run} {stage}: p50 {before:.2f} -> {after:.2f} ms (+{after / before - 1:.0%})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a depth sequence through the processing stages.')
+    parser.add_argument('--script', choices=list(SCRIPTS) + ['all'], default='all')
+    parser.add_argument('--source', default='all', help="'synthetic', 'ply', 'all' or a capture file (.fdcap)")
+    parser.add_argument('--mode', choices=['loop', 'reference', 'all'], default='all')
+    parser.add_argument('--frames', type=int, default=150)
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slow-down of a stage p50')
+    args = parser.parse_args()
+
+    scripts = list(SCRIPTS) if args.script == 'all' else [args.script]
+    sources = ['synthetic', 'ply'] if args.source == 'all' else [args.source]
+    modes = ['loop', 'reference'] if args.mode == 'all' else [args.mode]
+    results = {}
+    for script in scripts:
+        module = bench_utils.load_reference(SCRIPTS[script])
+        for source in sources:
+            frames = load_frames(source, args.frames, module.camera_matrix)
+            for mode in modes:
+                run = f'{script}/{os.path.basename(source)}/{mode}'
+                stage_timer = StageTimer()
+                replay = replay_loop if mode == 'loop' else replay_reference
+                with bench_utils.quiet():
+                    scheduling = replay(module, frames, stage_timer, serial=script == 'serial')
+                results[run] = summarize(stage_timer)
+                print(f'--- {run}: {len(frames)} frames, {results[run]["fps"]:.1f} fps end to end')
+                if scheduling:
+                    print(scheduling)
+                print(stage_timer.report())
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f'REGRESSION (threshold {args.threshold:.0%}):')
+            print('\n'.join('    ' + line for line in regressions))
+            sys.exit(1)
+        print(f'no stage slower than the baseline by more than {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
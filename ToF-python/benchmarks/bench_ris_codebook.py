@@ -0,0 +1,58 @@
+"""
+Codebook of the 64 beam configurations over a distance grid: full build in
+this process and with a process pool, rebuild with nothing changed (the file
+is left alone), incremental rebuild after a parameter change, and payload
+lookup against solving the configuration on demand.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from ris_codebook import FAR_FIELD, Codebook, build_codebook
+from ris_config import port_values
+from ris_phase import PHI_COMBINATIONS, THETA_COMBINATIONS, near_field_phase
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - t0) * 1e3
+
+
+def main():
+    distances = [0.5, 1, 1.5, 2, 3, 4, 6, 8, FAR_FIELD]
+    print(f'{os.cpu_count()} CPUs')
+    for M, N in [(37, 50), (128, 128)]:
+        print(f'--- {M}x{N} panel, 64 configurations x {len(distances)} distances')
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'codebook.npy')
+            n, ms = timed(build_codebook, path, distances=distances, M=M, N=N, max_workers=0)
+            print(f'{"full build, in process":<40s} {ms:9.1f} ms  ({n} entries)')
+            os.remove(path)
+            n, ms = timed(build_codebook, path, distances=distances, M=M, N=N)
+            print(f'{"full build, process pool":<40s} {ms:9.1f} ms  ({n} entries)')
+            mtime = os.stat(path).st_mtime_ns
+            n, ms = timed(build_codebook, path, distances=distances, M=M, N=N)
+            print(f'{"rebuild, nothing changed":<40s} {ms:9.1f} ms  ({n} entries)')
+            assert n == 0 and os.stat(path).st_mtime_ns == mtime, 'unchanged codebook rewritten'
+            n, ms = timed(build_codebook, path, distances=distances + [5], M=M, N=N)
+            print(f'{"rebuild, one distance added":<40s} {ms:9.1f} ms  ({n} entries)')
+            print(f'    file size {os.path.getsize(path) / 1e6:.1f} MB')
+
+            codebook = Codebook(path)
+            for index in (0, 17, 63):
+                expected = port_values(near_field_phase(THETA_COMBINATIONS[index], PHI_COMBINATIONS[index], 2,
+                                                        M=M, N=N))
+                assert np.array_equal(codebook.payload(index, 2), expected)
+            bench_utils.report('solve + map one configuration',
+                               bench_utils.time_calls(lambda: port_values(near_field_phase(30, 90, 2, M=M, N=N)), 50))
+            bench_utils.report('codebook payload lookup',
+                               bench_utils.time_calls(lambda: codebook.payload(17, 2.2).tobytes(), 1000))
+            del codebook
+
+
+if __name__ == '__main__':
+    main()
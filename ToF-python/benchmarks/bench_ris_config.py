@@ -0,0 +1,149 @@
+"""
+Phase -> voltage -> portValue: a literal port of the processAndSaveData loops
+(and its hex round trip) against the bin-edge lookup of ris_config, with the
+.npz persistence timed separately.
+
+ris_config is also checked against references that do not go through the
+port: voltages and bytes worked out by hand from the MATLAB tables, and
+ris_config_matlab.csv, the B / BV / portValue matrices computed by MATLAB
+itself (recorded with record_ris_config_fixture.m in MATLAB or Octave).
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from ris_config import VOLTAGE_EDGES, load_config, port_values, port_values_from_levels, ris_config, save_config
+from ris_phase import PHI_COMBINATIONS, THETA_COMBINATIONS, near_field_phase, quantize_phase
+
+
+MATLAB_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ris_config_matlab.csv')
+
+# By hand from phasesheet/Voltsheet: a measured phase gets its own voltage; below the midpoint of the two
+# lowest phases (12.765 deg) and above the one between the highest and the lowest + 360 (328.005 deg) it
+# wraps to 0 V; byte = round(V * 255 / 23)
+KNOWN_PHASES_DEG = [286.0, 283.69, 280.05, 276.06, 267.42, 255.71, 229.84, 205.47, 188.54, 171.43, 121.30, 103.78,
+                    80.83, 51.80, 36.95, 27.70, 20.81, 15.52, 10.01, 0.0, 300.0, 330.0, 359.9]
+KNOWN_VOLTS = [23, 20, 18, 16, 14, 12, 10, 9, 8.5, 8, 7, 6.5, 6, 5, 4, 3, 2, 1, 0, 0, 23, 0, 0]
+KNOWN_BYTES = [255, 222, 200, 177, 155, 133, 111, 100, 94, 89, 78, 72, 67, 55, 44, 33, 22, 11, 0, 0, 255, 0, 0]
+# portValue = PortValue(:) with PortValue = portVal.': row after row of the M x N map
+KNOWN_ORDER_DEG = [[10.01, 15.52, 20.81], [27.70, 36.95, 51.80]]
+KNOWN_ORDER_BYTES = [0, 11, 22, 33, 44, 55]
+
+
+def check_known_answers():
+    config = ris_config(np.radians(KNOWN_PHASES_DEG))
+    assert np.array_equal(config.voltage, KNOWN_VOLTS)
+    assert np.array_equal(config.port_value, KNOWN_BYTES)
+    assert np.array_equal(port_values(np.radians(KNOWN_ORDER_DEG)), KNOWN_ORDER_BYTES)
+    print(f'{len(KNOWN_PHASES_DEG)} phases worked out by hand from the MATLAB tables: voltages and bytes match')
+
+
+def check_matlab_fixture():
+    if not os.path.exists(MATLAB_FIXTURE):
+        print(f'{os.path.basename(MATLAB_FIXTURE)} not recorded: run record_ris_config_fixture.m in MATLAB or '
+              f'Octave (benchmarks folder) to compare with MATLAB output')
+        return
+    rows = np.loadtxt(MATLAB_FIXTURE, delimiter=',', ndmin=2)
+    for row in rows:
+        theta, phi, r = row[:3]
+        M, N = int(row[3]), int(row[4])
+        B, BV, portValue = np.split(row[5:], [M * N, 2 * M * N])
+        B, BV = B.reshape((M, N), order='F'), BV.reshape((M, N), order='F')
+        config = ris_config(B)
+        assert np.array_equal(config.voltage, BV), f'voltages differ from MATLAB at {theta}, {phi}, {r}'
+        assert np.array_equal(config.port_value, portValue), f'bytes differ from MATLAB at {theta}, {phi}, {r}'
+        assert np.allclose(near_field_phase(theta, phi, r, M=M, N=N), B, atol=1e-9), \
+            f'phases differ from MATLAB at {theta}, {phi}, {r}'
+    print(f'{len(rows)} configurations recorded in MATLAB: phases, voltages and bytes match')
+
+
+def matlab_round(x):
+    return np.sign(x) * np.floor(np.abs(x) + 0.5)
+
+
+def process_loop(B, M, N):
+    # Element by element, as in Beamsteering_NF.m; indices shifted to 0-based
+    phasesheet = [-74 + 360, -76.31 + 360, -79.95 + 360, -83.94 + 360, -92.58 + 360, -104.29 + 360, -130.16 + 360,
+                  -154.53 + 360, -171.46 + 360, 171.43, 121.30, 103.78, 80.83, 51.80, 36.95, 27.70, 20.81, 15.52,
+                  10.01]
+    Voltsheet = [23, 20, 18, 16, 14, 12, 10, 9, 8.5, 8, 7, 6.5, 6, 5, 4, 3, 2, 1, 0]
+    phssheet = phasesheet[::-1]
+    vltsheet = Voltsheet[::-1]
+    K = len(vltsheet)
+    BD = B * 180 / np.pi
+    BV = BD.copy()
+    for i in range(M):
+        for j in range(N):
+            if BD[i, j] <= phssheet[0] + (phssheet[1] - phssheet[0]) / 2 or \
+                    BD[i, j] > phssheet[18] + (phssheet[0] + 360 - phssheet[18]) / 2:
+                BV[i, j] = vltsheet[0]
+            elif BD[i, j] <= phssheet[18] + (phssheet[0] + 360 - phssheet[18]) / 2 and \
+                    BD[i, j] > phssheet[17] + (phssheet[18] - phssheet[17]) / 2:
+                BV[i, j] = vltsheet[18]
+            for k in range(K - 2):
+                if BD[i, j] <= phssheet[k + 1] + (phssheet[k + 2] - phssheet[k + 1]) / 2 and \
+                        BD[i, j] > phssheet[k] + (phssheet[k + 1] - phssheet[k]) / 2:
+                    BV[i, j] = vltsheet[k + 1]
+    V_Dec = matlab_round(BV * 255 / 23)
+    # dec2hex, reshape(cellstr(...), [], N) and hex2dec walk the matrix column-major
+    hexMatrix = np.array(['%X' % int(v) for v in V_Dec.flatten(order='F')]).reshape((M, N), order='F')
+    portval = np.array([int(h, 16) for h in hexMatrix.flatten(order='F')])
+    portVal = portval.reshape((-1, N), order='F')
+    PortValue = portVal.T
+    portValue = PortValue.flatten(order='F')
+    return BV, portValue
+
+
+def main():
+    check_known_answers()
+    check_matlab_fixture()
+    rng = np.random.default_rng(0)
+    for M, N in [(37, 50), (128, 128)]:
+        print(f'--- {M}x{N} panel')
+        # parity: random phases (including the table boundaries) and solver outputs
+        boundaries = np.concatenate([VOLTAGE_EDGES * np.pi / 180, [0, 2 * np.pi]])
+        samples = [rng.uniform(0, 2 * np.pi, (M, N)),
+                   near_field_phase(30, 90, 2, M=M, N=N),
+                   near_field_phase(rng.uniform(0, 60), rng.uniform(0, 360), rng.uniform(0.5, 12), M=M, N=N)]
+        samples[0].flat[:len(boundaries)] = boundaries
+        for B in samples:
+            BV, portValue = process_loop(B, M, N)
+            config = ris_config(B)
+            assert np.array_equal(config.voltage, BV)
+            assert np.array_equal(config.port_value, portValue)
+            assert np.array_equal(port_values(B), portValue)
+        exact = near_field_phase(30, 90, 2, M=M, N=N, quantize=False)
+        levels = quantize_phase(exact, return_index=True)
+        assert np.array_equal(port_values_from_levels(levels), process_loop(quantize_phase(exact), M, N)[1])
+
+        B = samples[1]
+        t0 = time.perf_counter()
+        process_loop(B, M, N)
+        print(f'{"MATLAB-style loop + hex round trip":<40s} {(time.perf_counter() - t0) * 1e3:9.1f} ms')
+        bench_utils.report('port_values (searchsorted)', bench_utils.time_calls(port_values, 50, B))
+        bench_utils.report('port_values_from_levels (table)', bench_utils.time_calls(port_values_from_levels, 50,
+                                                                                      levels))
+        bench_utils.report('ris_config (all matrices)', bench_utils.time_calls(ris_config, 50, B))
+        batch = quantize_phase(near_field_phase(THETA_COMBINATIONS, PHI_COMBINATIONS, 2, M=M, N=N, quantize=False),
+                               return_index=True)
+        times = bench_utils.time_calls(port_values_from_levels, 10, batch)
+        bench_utils.report('64 configurations from levels', times)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'config.npz')
+            config = ris_config(B)
+            t0 = time.perf_counter()
+            thread = save_config(path, config)
+            queued = time.perf_counter() - t0
+            thread.join()
+            written = time.perf_counter() - t0
+            assert np.array_equal(load_config(path).port_value, config.port_value)
+            print(f'{"save_config: caller blocked / written":<40s} {queued * 1e3:9.3f} ms / {written * 1e3:.1f} ms,'
+                  f' {os.path.getsize(path)} bytes')
+
+
+if __name__ == '__main__':
+    main()
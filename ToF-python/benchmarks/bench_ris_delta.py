@@ -0,0 +1,95 @@
+"""
+Delta-encoded configuration updates along an angle trajectory: bytes on the
+line and upload time per update, full vectors against ris_delta encodings,
+through the pty controller emulator (Linux/macOS).
+
+The trajectory is a person walking slowly across the field of view, tracked
+at 24 fps: theta 20 -> 30 degrees and phi 88 -> 92 degrees over 5 seconds,
+with tracking jitter, angles rounded to 0.1 degree and the beam focused at
+2 m. Frames where the rounded angles do not change send nothing. A change of
+distance shifts the phase of every element, so deltas pay off for angle
+steps below about a degree at a fixed focus distance.
+
+Also checked: a controller that lost its stored configuration (a reset)
+rejects the next delta, and the uploader falls back to a full upload.
+"""
+import time
+
+import numpy as np
+
+import bench_utils
+from ris_config import port_values
+from ris_delta import DELTA_FULL, DELTA_RUNS, DELTA_SPARSE, apply_delta, encode_delta
+from ris_emulator import ControllerEmulator
+from ris_phase import near_field_phase
+from ris_protocol import RisUploader
+
+N_UPDATES = 120  # 24 fps, 5 s
+
+
+def trajectory(n_updates, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, n_updates)
+    theta = np.round(20 + 10 * t + rng.normal(0, 0.05, n_updates), 1)
+    phi = np.round(88 + 4 * t + rng.normal(0, 0.05, n_updates), 1)
+    return theta, phi, np.full(n_updates, 2.0)
+
+
+def main():
+    theta, phi, r = trajectory(N_UPDATES)
+    vectors = port_values(near_field_phase(theta, phi, r)).reshape(N_UPDATES, -1)
+    print(f'{N_UPDATES} updates of {vectors.shape[1]} bytes')
+
+    # encoding only
+    counts = {None: 0, DELTA_FULL: 0, DELTA_SPARSE: 0, DELTA_RUNS: 0}
+    sizes = np.empty(N_UPDATES - 1)
+    changed = np.empty(N_UPDATES - 1)
+    for i in range(1, N_UPDATES):
+        encoding, chunks = encode_delta(vectors[i - 1], vectors[i])
+        counts[encoding if chunks else None] += 1
+        sizes[i - 1] = sum(map(len, chunks))
+        changed[i - 1] = np.count_nonzero(vectors[i - 1] != vectors[i])
+        target = bytearray(vectors[i - 1].tobytes())
+        if encoding != DELTA_FULL:
+            for chunk in chunks:
+                apply_delta(target, encoding, chunk)
+            assert bytes(target) == vectors[i].tobytes()
+    print(f'changed elements per update: mean {changed.mean():.0f}, max {changed.max():.0f}')
+    print(f'encoded bytes per update: mean {sizes.mean():.0f}, max {sizes.max():.0f} (full {vectors.shape[1]})')
+    print(f'encodings: unchanged {counts[None]}, full {counts[DELTA_FULL]}, sparse {counts[DELTA_SPARSE]}, '
+          f'runs {counts[DELTA_RUNS]}')
+    bench_utils.report('encode_delta', bench_utils.time_calls(encode_delta, 200, vectors[0], vectors[1]))
+
+    # on the line
+    for delta in (False, True):
+        with ControllerEmulator(baudrate=115200) as emulator, RisUploader(emulator.port_name) as uploader:
+            uploader.upload(0, vectors[0], delta=False)
+            n_bytes = uploader.n_bytes
+            times = np.empty(N_UPDATES - 1)
+            for i in range(1, N_UPDATES):
+                t0 = time.perf_counter()
+                uploader.upload(0, vectors[i], delta=delta)
+                times[i - 1] = (time.perf_counter() - t0) * 1e3
+            assert emulator.configurations[0] == vectors[-1].tobytes()
+            per_update = (uploader.n_bytes - n_bytes) / (N_UPDATES - 1)
+        bench_utils.report(f'upload at 115200 baud, {"delta" if delta else "full"}', times)
+        print(f'    {per_update:.0f} bytes on the line per update')
+
+    # the controller lost its configurations: the delta (more frames than the window) is rejected, then
+    # the full upload and the deltas after it go through
+    with ControllerEmulator(baudrate=115200) as emulator, \
+            RisUploader(emulator.port_name, chunk_size=32, window=4, timeout=0.05) as uploader:
+        uploader.upload(0, vectors[0], delta=False)
+        emulator.configurations.clear()
+        t0 = time.perf_counter()
+        uploader.upload(0, vectors[1])
+        seconds = time.perf_counter() - t0
+        assert emulator.configurations[0] == vectors[1].tobytes()
+        for vector in vectors[2:6]:
+            uploader.upload(0, vector)
+            assert emulator.configurations[0] == vector.tobytes()
+    print(f'controller reset: rejected delta and full upload in {seconds * 1e3:.1f} ms, later deltas intact')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Sending beam indices to the RIS controller: open/write/close per frame (as
+send_image_to_serial) against a persistent, deduplicating RisLink.
+Runs against a pty stand-in for the controller (Linux/macOS) or pyserial's loop://.
+"""
+import os
+import time
+
+import numpy as np
+import serial
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from ris_link import RisLink
+
+N_FRAMES = 500
+
+
+def open_port_name():
+    # a pseudo-terminal behaves like the controller's UART; fall back to loop:// elsewhere
+    if hasattr(os, 'openpty'):
+        master, slave = os.openpty()
+        os.set_blocking(master, False)
+        return os.ttyname(slave), master
+    return 'loop://', None
+
+
+def drain(master):
+    received = b''
+    if master is not None:
+        try:
+            while True:
+                received += os.read(master, 4096)
+        except (BlockingIOError, OSError):
+            pass
+    return received
+
+
+def index_trajectory(n_frames, seed=0):
+    # a user walking slowly: the index changes every ~40 frames, with single-frame flicker
+    rng = np.random.default_rng(seed)
+    indices = 7 + (np.arange(n_frames) // 40) % 20
+    flicker = rng.random(n_frames) < 0.1
+    indices[flicker] += 1
+    return indices
+
+
+def main():
+    port_name, master = open_port_name()
+    indices = index_trajectory(N_FRAMES)
+
+    # Before: open, write one byte, close for every processed frame
+    before = np.empty(N_FRAMES)
+    for i, index in enumerate(indices):
+        t0 = time.perf_counter()
+        port = serial.serial_for_url(port_name, baudrate=115200, timeout=1)
+        port.write(bytes([int(index)]))
+        port.close()
+        before[i] = (time.perf_counter() - t0) * 1e3
+    n_before = len(drain(master))
+
+    for hysteresis in (1, 2):
+        with RisLink(port_name, baudrate=115200, hysteresis=hysteresis) as link:
+            after = np.empty(N_FRAMES)
+            for i, index in enumerate(indices):
+                t0 = time.perf_counter()
+                link.send_index(index)
+                after[i] = (time.perf_counter() - t0) * 1e3
+                time.sleep(0.001)  # the rest of the frame
+            link.flush()
+            stats = link.stats()
+        n_after = len(drain(master))
+        bench_utils.report(f'RisLink.send_index (hysteresis {hysteresis})', after)
+        print(f'    bytes sent {n_after} (vs {n_before}), write latency p50 {stats["latency_p50_ms"]:.3f} ms, '
+              f'p95 {stats["latency_p95_ms"]:.3f} ms')
+    bench_utils.report('open/write/close per frame', before)
+
+    # Reconnection: the port disappears under the link, the latest index still arrives
+    with RisLink('loop://', reconnect_delay=0.05) as link:
+        link.send_index(3)
+        link.flush()
+        link.port.close()
+        link.send_index(4)
+        assert link.flush(timeout=2.0)
+        print(f'reconnect: {link.stats()["reconnects"]} reconnect(s), last index sent {link.last_sent}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+RIS phase maps: a literal port of the MATLAB calculate() loops against the
+broadcast solver in ris_phase, at 37x50 and 128x128, single and batched targets.
+"""
+import time
+
+import numpy as np
+
+import bench_utils
+from ris_phase import (ELEMENT_SPACING, PHI_COMBINATIONS, THETA_COMBINATIONS, far_field_phase,
+                       near_field_phase, wave_number)
+
+
+def near_field_loop(theta, phi, r, frequency, M, N, du=ELEMENT_SPACING):
+    # Element by element, with the min(abs(E - phase)) quantization, as in Beamsteering_NF.m
+    k = wave_number(frequency)
+    n = 10
+    E = np.append(2 * np.pi / 2 ** n * np.linspace(0, 2 ** n - 1, 2 ** n), 2 * np.pi)
+    theta_r, phi_r = theta * np.pi / 180, phi * np.pi / 180
+    P_RX = r * np.array([np.cos(phi_r) * np.sin(theta_r), np.sin(phi_r) * np.sin(theta_r), np.cos(theta_r)])
+    B = np.zeros((M, N))
+    for i in range(M):
+        for j in range(N):
+            Q_p = np.array([i * du, j * du, 0])
+            phase_p = np.mod(k * (np.linalg.norm(Q_p) + np.linalg.norm(Q_p - P_RX)), 2 * np.pi)
+            B[i, j] = E[np.argmin(np.abs(E - phase_p))]
+    return B
+
+
+def far_field_loop(theta, phi, frequency, M, N, du=ELEMENT_SPACING):
+    # As in Beamsteering_FF.m
+    k = wave_number(frequency)
+    n = 10
+    E = np.append(2 * np.pi / 2 ** n * np.linspace(0, 2 ** n - 1, 2 ** n), 2 * np.pi)
+    theta_r, phi_r = theta * np.pi / 180, (phi - 180) * np.pi / 180
+    dsx = du * k * (np.cos(phi_r) * np.sin(theta_r))
+    dsy = du * k * (np.sin(phi_r) * np.sin(theta_r))
+    B = np.zeros((M, N))
+    for i in range(1, M + 1):
+        for j in range(1, N + 1):
+            B[i - 1, j - 1] = E[np.argmin(np.abs(E - np.mod(i * dsx + j * dsy, 2 * np.pi)))]
+    return B
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for M, N in [(37, 50), (128, 128)]:
+        print(f'--- {M}x{N} panel')
+        # parity on a few targets
+        for _ in range(3):
+            theta, phi, r = rng.uniform(0, 60), rng.uniform(0, 360), rng.uniform(0.5, 12)
+            nf = near_field_phase(theta, phi, r, M=M, N=N)
+            ff = far_field_phase(theta, phi, M=M, N=N)
+            assert np.count_nonzero(nf != near_field_loop(theta, phi, r, 3.5, M, N)) <= 1
+            assert np.count_nonzero(ff != far_field_loop(theta, phi, 3.5, M, N)) <= 1
+
+        t0 = time.perf_counter()
+        near_field_loop(30, 90, 2, 3.5, M, N)
+        print(f'{"near field, MATLAB-style loop":<40s} {(time.perf_counter() - t0) * 1e3:9.1f} ms')
+        bench_utils.report('near field, broadcast', bench_utils.time_calls(near_field_phase, 20, 30, 90, 2, M=M, N=N))
+        bench_utils.report('far field, broadcast', bench_utils.time_calls(far_field_phase, 20, 30, 90, M=M, N=N))
+        batch = bench_utils.time_calls(near_field_phase, 5, THETA_COMBINATIONS, PHI_COMBINATIONS, 2, M=M, N=N)
+        bench_utils.report('near field, 64 targets in one call', batch)
+        print(f'    {np.mean(batch) / 64:.3f} ms per configuration')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Uploading a full 37x50 configuration: the chunk-and-sleep stream of
+sendDataInChunks against the framed, acknowledged protocol of ris_protocol,
+with auto-tuning, error recovery and the next transfer after a failed one.
+Runs against the pty controller emulator (Linux/macOS).
+
+    python benchmarks/bench_ris_protocol.py [--full-legacy]
+"""
+import sys
+import time
+
+import numpy as np
+import serial
+
+import bench_utils  # noqa: F401  (sets up the import path)
+from ris_config import port_values
+from ris_emulator import ControllerEmulator
+from ris_phase import near_field_phase
+from ris_protocol import _COMMIT, FRAME_COMMIT, FRAME_PING, ProtocolError, RisUploader
+
+
+def send_data_in_chunks(port_value, port_name, delay, rate, size, index):
+    # As sendDataInChunks in Beamsteering_NF.m
+    port = serial.Serial(port_name, baudrate=rate, timeout=10)
+    port.write(bytes([index]))
+    time.sleep(delay * 1e-3)
+    for start in range(0, len(port_value), size):
+        port.write(port_value[start:start + size])
+        time.sleep(delay * 1e-3)
+    port.close()
+
+
+def timed_upload(uploader, payload, n_uploads=3):
+    t0 = time.perf_counter()
+    for index in range(n_uploads):
+        uploader.upload(index, payload)
+    return (time.perf_counter() - t0) / n_uploads
+
+
+def main():
+    payload = port_values(near_field_phase(30, 90, 2)).tobytes()
+    print(f'configuration: {len(payload)} bytes')
+
+    # GUI defaults: 9600 baud, chunks of 1 byte, 10 ms after each chunk
+    n_legacy = len(payload) if '--full-legacy' in sys.argv else 100
+    with ControllerEmulator(baudrate=9600) as emulator:
+        t0 = time.perf_counter()
+        send_data_in_chunks(payload[:n_legacy], emulator.port_name, 10, 9600, 1, 0)
+        legacy = (time.perf_counter() - t0) * len(payload) / n_legacy
+        time.sleep(0.2)
+        assert emulator.n_skipped == n_legacy + 1
+    note = '' if n_legacy == len(payload) else f' (extrapolated from {n_legacy} bytes)'
+    print(f'{"sendDataInChunks, 9600 baud, 1 B / 10 ms":<44s} {legacy:8.2f} s{note}')
+
+    for baudrate in (9600, 115200):
+        with ControllerEmulator(baudrate=baudrate) as emulator, \
+                RisUploader(emulator.port_name, baudrate=baudrate) as uploader:
+            seconds = timed_upload(uploader, payload)
+            assert emulator.configurations[0] == payload
+            print(f'{f"framed, {baudrate} baud, 256 B x 8 frames":<44s} {seconds:8.3f} s  '
+                  f'({len(payload) * 10 / baudrate:.3f} s of line time)')
+
+    # auto-tuning against a controller that needs 2 ms per frame
+    with ControllerEmulator(baudrate=115200, frame_time=0.002) as emulator, \
+            RisUploader(emulator.port_name, baudrate=115200) as uploader:
+        results = uploader.autotune(payload, chunk_sizes=(32, 128, 512, 1850), windows=(1, 4, 16), repeats=1)
+        print('autotune (2 ms per frame at the controller), fastest first:')
+        for seconds, baudrate, chunk_size, window in results[:3] + results[-2:]:
+            print(f'    chunk {chunk_size:5d}  window {window:3d}  {seconds * 1e3:8.1f} ms')
+        results = uploader.autotune(payload, chunk_sizes=(uploader.chunk_size,), windows=(uploader.window,),
+                                    baudrates=(115200, 460800, 921600), repeats=1)
+        by_baudrate = sorted(results, key=lambda result: result[1])
+        print('    baud rates: ' + ', '.join(f'{b} -> {s * 1e3:.1f} ms' for s, b, _, _ in by_baudrate))
+        print(f'    selected: {uploader.port.baudrate} baud, chunk {uploader.chunk_size}, window {uploader.window}')
+
+    # recovery from corrupted bytes
+    for byte_error_rate in (1e-4, 1e-3):
+        with ControllerEmulator(baudrate=115200, byte_error_rate=byte_error_rate) as emulator, \
+                RisUploader(emulator.port_name, timeout=0.05) as uploader:
+            seconds = timed_upload(uploader, payload, n_uploads=10)
+            assert all(emulator.configurations[index] == payload for index in range(10))
+            print(f'{f"framed, byte error rate {byte_error_rate:g}":<44s} {seconds:8.3f} s  '
+                  f'{emulator.n_crc_errors} CRC errors, {uploader.n_retransmitted} frames resent, all intact')
+
+    # a transfer aborted with frames in flight (a COMMIT the controller rejects, then pings), then an upload
+    with ControllerEmulator(baudrate=115200) as emulator, \
+            RisUploader(emulator.port_name, window=4, timeout=0.05) as uploader:
+        try:
+            uploader.send_frames([(FRAME_COMMIT, _COMMIT.pack(0, 16, 0))] + [(FRAME_PING, b'')] * 12)
+        except ProtocolError:
+            pass
+        else:
+            raise AssertionError('the bad COMMIT was accepted')
+        t0 = time.perf_counter()
+        uploader.upload(1, payload)
+        assert emulator.configurations[1] == payload
+        print(f'{"framed, upload after a failed transfer":<44s} {time.perf_counter() - t0:8.3f} s  '
+              f'{uploader.n_retransmitted} frames resent, intact')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Tracking a synthetic two-person walk (synthetic_scene) over whole frames
+against ROI tracking (target_tracker.TargetTracker: preprocessing and
+segmentation in windows around the predicted boxes, whole frame every
+sweep_interval frames). Reports the time per frame of the imaging stages,
+how far the ROI boxes and angles are from the whole-frame ones, and the
+angle error of steering with the angles of the last frame or with the
+angles predicted for the time of actuation, a few frames later.
+
+    python benchmarks/bench_roi_tracking.py [--frames 480]
+"""
+import argparse
+
+import numpy as np
+
+import bench_utils
+from camera_model import fov_camera_matrix
+from pipeline import Tracker, result_dtype
+from synthetic_scene import SceneGenerator
+
+FPS = 24
+LEADS = (1, 2, 4)  # actuation delays in frames
+
+
+def track(frames, roi_tracking):
+    tracker = Tracker(fov_camera_matrix(), roi_tracking=roi_tracking)
+    tracker.background_model.prime(tracker.camera_model.depth_map(f).copy() for f in frames[:10])
+    records = np.zeros(len(frames), dtype=result_dtype(2))
+
+    def frame(i, img):
+        tracker(img, i, records[i], timestamp=i / FPS)
+
+    times = np.concatenate([bench_utils.time_calls(frame, 1, i, img) for i, img in enumerate(frames)])
+    n_sweeps = 0 if tracker.target_tracker is None else tracker.target_tracker.n_sweeps
+    return records, times, n_sweeps
+
+
+def differences(records, reference):
+    # frames with the same number of targets, box edge and angle differences of those frames
+    same = records['n'] == reference['n']
+    edges, angles = [], []
+    for record, ref in zip(records[same], reference[same]):
+        n = int(ref['n'])
+        if n:
+            edges.append(np.abs(record['boxes'][:n] - ref['boxes'][:n]).max())
+            angles.append(np.abs(record['angles'][:n] - ref['angles'][:n]).max())
+    return same.mean(), np.array(edges), np.array(angles)
+
+
+def lead_errors(records, reference, lead):
+    # angles of frame i (as sent, and extrapolated by lead frames) against the whole-frame angles of frame i + lead
+    stale, predicted = [], []
+    for record, later in zip(records[:-lead], reference[lead:]):
+        n, n_later = int(record['n']), int(later['n'])
+        for angles, rates in zip(record['angles'][:n], record['rates'][:n]):
+            if not n_later or not rates.any():
+                continue
+            target = later['angles'][np.argmin(np.abs(later['angles'][:n_later] - angles).sum(axis=1))]
+            stale.append(np.hypot(*(angles - target)))
+            predicted.append(np.hypot(*(angles + rates * lead / FPS - target)))
+    return np.array(stale), np.array(predicted)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=480)
+    args = parser.parse_args()
+    frames = SceneGenerator(2, seed=4).render(0, args.frames)
+    reference, full_times, _ = track(frames, roi_tracking=False)
+    records, roi_times, n_sweeps = track(frames, roi_tracking=True)
+    print(f'{args.frames} frames of a two-person walk, imaging stages only:')
+    bench_utils.report('whole frames', full_times[10:])
+    bench_utils.report(f'ROI tracking ({n_sweeps} whole-frame sweeps)', roi_times[10:])
+    print(f'speed-up {np.mean(full_times[10:]) / np.mean(roi_times[10:]):.2f}x')
+    same, edges, angles = differences(records, reference)
+    print(f'ROI against whole frames: same number of targets in {same:.1%} of the frames, box edges '
+          f'mean {edges.mean():.2f} px / p99 {np.percentile(edges, 99):.0f} px / max {edges.max():.0f} px, '
+          f'angles mean {angles.mean():.3f} / max {angles.max():.3f} deg')
+    for lead in LEADS:
+        stale, predicted = lead_errors(records, reference, lead)
+        print(f'steered {lead} frame(s) ({lead / FPS * 1e3:.0f} ms) after capture: angle error with the frame '
+              f'angles mean {stale.mean():.2f} / p95 {np.percentile(stale, 95):.2f} deg, predicted '
+              f'mean {predicted.mean():.2f} / p95 {np.percentile(predicted, 95):.2f} deg')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Frame age with and without the FrameScheduler, on a synthetic two-person
+capture replayed in real time through the stages of the processing loop
+with a display refreshed every frame (blit, Agg backend): the loop alone
+processes the newest frame at full quality, the scheduler drops stale
+frames and lowers the quality to hold target_latency. Reports the frame
+age percentiles and the processed, dropped, stale and degraded counts,
+then the cost and the box error of each quality level.
+
+    python benchmarks/bench_scheduler.py [--frames 480] [--targets 0.1 0.05]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from background_model import BackgroundModel
+from camera_model import CameraModel, fov_camera_matrix
+from capture_file import CaptureReader
+from detection import find_components, target_angles
+from frame_scheduler import QUALITY_LEVELS, FrameScheduler
+from preprocessing import Preprocessor
+from pyramid import PyramidDetector
+from segmentation import TwoMeansSegmenter
+from synthetic_scene import SceneGenerator, write_sequence
+from tracking_display import TrackingDisplay
+
+
+class Loop:
+    # the stages of the processing loop, at a quality level
+
+    def __init__(self, reader):
+        self.camera_model = CameraModel(fov_camera_matrix(), clip=50)
+        self.background_model = BackgroundModel(n_interval=120, n_used=10)
+        self.background_model.prime(self.camera_model.depth_map(reader.read(i))
+                                    for i in self.background_model.prime_positions(len(reader), from_start=True))
+        self.preprocessor = Preprocessor()
+        self.segmenter = TwoMeansSegmenter()
+        self.pyramid_detector = PyramidDetector(self.preprocessor, self.segmenter, step=2)
+
+    def __call__(self, img, frame_index, quality):
+        depth_map = self.camera_model.depth_map(img)
+        self.background_model.update(depth_map, frame_index=frame_index,
+                                     stride=self.background_model.stride * quality.background_stride)
+        background = self.background_model.background
+        if quality.segmentation_step > 1:
+            BW_dm = self.pyramid_detector(depth_map, background)
+        else:
+            BW_dm = self.segmenter(self.preprocessor(depth_map, background), out=self.preprocessor.mask)
+        components = find_components(BW_dm, max_targets=2, out=self.preprocessor.labels)
+        return depth_map, components, target_angles(components, self.camera_model, depth_map)
+
+
+def replay(path, target_latency):
+    reader = CaptureReader(path, replay_speed=1.0)
+    loop = Loop(reader)
+    display = TrackingDisplay('blit', max_fps=None)
+    # target_latency None: every new frame at full quality (max_age and target never reached)
+    scheduler = FrameScheduler(target_latency=np.inf if target_latency is None else target_latency)
+    frame_index, last_sequence = None, int(reader.sequences[-1])
+    while frame_index != last_sequence:
+        latest_frame = scheduler.next_frame(reader)
+        if latest_frame is None:
+            scheduler.wait()
+            continue
+        frame_index, img = latest_frame
+        quality = scheduler.quality
+        depth_map, components, angles = loop(img, frame_index, quality)
+        if quality.display:
+            display.update(img, depth_map, components.boxes, angles)
+        scheduler.frame_done()
+    display.close()
+    return scheduler
+
+
+def level_costs(path):
+    # time per frame (without the display) and box error against full quality, each level on its own
+    reader = CaptureReader(path)
+    frames = [reader.read(i) for i in range(len(reader))]
+    reference = Loop(reader)
+    boxes = [reference(img, i, QUALITY_LEVELS[0])[1].boxes.copy() for i, img in enumerate(frames)]
+    for level, quality in enumerate(QUALITY_LEVELS):
+        loop = Loop(reader)
+        errors, times = [], []
+        for i, img in enumerate(frames):
+            t0 = time.perf_counter()
+            components = loop(img, i, quality)[1]
+            times.append((time.perf_counter() - t0) * 1e3)
+            if len(components.boxes) == len(boxes[i]) and len(boxes[i]):
+                errors.append(np.abs(components.boxes - boxes[i]).max())
+        times = np.array(times)
+        print(f'level {level} {quality}: mean {times.mean():5.1f} ms  p95 {np.percentile(times, 95):5.1f} ms  '
+              f'max {times.max():5.1f} ms  box edge error mean {np.mean(errors):4.1f} px  '
+              f'p95 {np.percentile(errors, 95):4.1f} px')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=480)
+    parser.add_argument('--targets', type=float, nargs='+', default=[0.1, 0.05], help='target latencies in seconds')
+    args = parser.parse_args()
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'walk.fdcap')
+        write_sequence(path, SceneGenerator(2, seed=4), args.frames)
+        print(f'{args.frames} frames at 24 fps, replayed in real time')
+        runs = [('newest frame, full quality', None)]
+        runs += [(f'FrameScheduler, {target * 1e3:.0f} ms', target) for target in args.targets]
+        for name, target in runs:
+            scheduler = replay(path, target)
+            print(f'{name:<28s} {scheduler.report()}')
+        level_costs(path)
+
+
+if __name__ == '__main__':
+    main()
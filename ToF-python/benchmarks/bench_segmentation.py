@@ -0,0 +1,65 @@
+"""
+cluster_depth_map backends on cleaned 640x480 frames: sklearn KMeans against the
+exact histogram 2-means (TwoMeansSegmenter), with a label parity check.
+"""
+import subprocess
+import sys
+
+import numpy as np
+
+import bench_utils
+from background_model import BackgroundModel
+from camera_model import CameraModel
+from segmentation import TwoMeansSegmenter
+
+N_FRAMES = 30
+MIN_AGREEMENT = 0.999
+
+
+def cleaned_frames(reference, n_frames):
+    # background-subtracted, opened and thresholded frames, as fed to cluster_depth_map
+    camera_model = CameraModel(reference.camera_matrix, clip=50)
+    frames = bench_utils.synthetic_raw_frames(n_frames + 10, seed=1)
+    background_model = BackgroundModel(n_interval=10, n_used=10)
+    background_model.prime(camera_model.depth_map(f) for f in frames[:10])
+    background = background_model.background.astype(np.float64)
+    return [reference.preprocess_image(-(camera_model.depth_map(f).astype(np.float64) - background))
+            for f in frames[10:]]
+
+
+def import_time(module):
+    code = f'import time; t0 = time.perf_counter(); import {module}; print(time.perf_counter() - t0)'
+    return float(subprocess.check_output([sys.executable, '-c', code], cwd=bench_utils.TOF_DIR)) * 1e3
+
+
+def main():
+    reference = bench_utils.load_reference()
+    images = cleaned_frames(reference, N_FRAMES)
+
+    # Parity: same partition as KMeans, with the majority label 0
+    segmenter = TwoMeansSegmenter()
+    agreement = []
+    for image in images:
+        expected = reference.cluster_depth_map(image, backend='kmeans')
+        labels = segmenter(image)
+        assert np.count_nonzero(labels == 0) >= np.count_nonzero(labels == 1)
+        agreement.append(np.mean(labels == expected))
+    print(f'label agreement with KMeans: min {min(agreement):.5f}, mean {np.mean(agreement):.5f}')
+    assert min(agreement) >= MIN_AGREEMENT, 'histogram backend disagrees with KMeans'
+
+    kmeans = np.concatenate([bench_utils.time_calls(reference.cluster_depth_map, 1, image, backend='kmeans')
+                             for image in images])
+    cold = TwoMeansSegmenter()
+    exact = np.concatenate([bench_utils.time_calls(cold, 1, image) for image in images])
+    warm = TwoMeansSegmenter(warm_start=True)
+    warm_started = np.concatenate([bench_utils.time_calls(warm, 1, image) for image in images])
+    bench_utils.report('KMeans (sklearn)', kmeans)
+    bench_utils.report('histogram 2-means, exhaustive', exact)
+    bench_utils.report('histogram 2-means, warm-started', warm_started)
+    print(f'speed-up (mean, exhaustive): {np.mean(kmeans) / np.mean(exact):.0f}x')
+    print(f'import sklearn.cluster: {import_time("sklearn.cluster"):.0f} ms, '
+          f'import segmentation: {import_time("segmentation"):.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Cost of the per-stage instrumentation: StageTimer calls enabled and disabled,
+and the processing loop stages (no plotting) timed with it, with the
+overhead relative to the frame time. Prints the stage table and the
+Prometheus text dump.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from background_model import BackgroundModel
+from camera_model import CameraModel
+from stage_timer import StageTimer
+
+N_FRAMES = 200
+N_CALLS = 100000
+
+
+def run_pipeline(reference, frames, stage_timer):
+    camera_model = CameraModel(reference.camera_matrix, clip=50)
+    background_model = BackgroundModel(n_interval=120, n_used=10)
+    background_model.prime(camera_model.depth_map(frame) for frame in frames[:10])
+    t0 = time.perf_counter()
+    for frame_index, img in enumerate(frames):
+        stage_timer.start()
+        clipped_depth_map_cor = camera_model.depth_map(img)
+        stage_timer.lap('undistort')
+        background_model.update(clipped_depth_map_cor, frame_index=frame_index)
+        bs_human_dm = -(clipped_depth_map_cor - background_model.background)
+        stage_timer.lap('background')
+        cleaned_image = reference.preprocess_image(bs_human_dm)
+        stage_timer.lap('preprocess')
+        BW_dm = reference.cluster_depth_map(cleaned_image)
+        stage_timer.lap('cluster')
+        bbox_opencv, _ = reference.find_two_bounding_boxes_opencv_from_array(BW_dm, plot_bb=False)
+        stage_timer.lap('contours')
+        reference.calculate_bbox_angles(bbox_opencv, BW_dm, fov_horizontal=108, fov_vertical=78)
+        stage_timer.lap('angles')
+        # every third camera frame is skipped
+        stage_timer.frame_done(frame_index + frame_index // 2)
+    return (time.perf_counter() - t0) / len(frames)
+
+
+def main():
+    for enabled in (False, True):
+        stage_timer = StageTimer(enabled=enabled)
+        stage_timer.start()
+        t0 = time.perf_counter()
+        for _ in range(N_CALLS):
+            stage_timer.lap('stage')
+        per_call = (time.perf_counter() - t0) / N_CALLS
+        print(f'{f"lap(), enabled={enabled}":<40s} {per_call * 1e9:9.0f} ns per call')
+
+    reference = bench_utils.load_reference()
+    frames = bench_utils.synthetic_raw_frames(N_FRAMES)
+    with bench_utils.quiet():
+        run_pipeline(reference, frames[:20], StageTimer(enabled=False))  # warm-up
+        disabled = run_pipeline(reference, frames, StageTimer(enabled=False))
+        with tempfile.TemporaryDirectory() as folder:
+            stage_timer = StageTimer(enabled=True, dump_path=os.path.join(folder, 'stages.prom'), dump_interval=0.5)
+            enabled = run_pipeline(reference, frames, stage_timer)
+            stage_timer.dump()
+            with open(stage_timer.dump_path) as f:
+                text = f.read()
+            stage_timer.dump(os.path.join(folder, 'stages.npy'))
+            assert np.array_equal(np.load(os.path.join(folder, 'stages.npy')), stage_timer.stats())
+    # 6 laps and frame_done per frame, at the enabled cost per call
+    overhead = 7 * per_call
+    print(f'frame time {disabled * 1e3:.2f} ms disabled, {enabled * 1e3:.2f} ms enabled; '
+          f'instrumentation {overhead * 1e6:.1f} us per frame ({overhead / disabled * 100:.3f}%)')
+    print(stage_timer.report())
+    print('\n'.join(text.splitlines()[:6] + ['...'] + text.splitlines()[-6:]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Synthetic multi-person sequences: generation rate for 1 to 20 people against
+the per-frame generator of bench_utils, writing to a capture file, the
+determinism by seed, and the ground truth angles against the pinhole angles
+(detection.target_angles) of the silhouettes found in the rendered frames,
+for people standing at known positions and for a walk.
+"""
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import bench_utils
+from camera_model import CameraModel, fov_camera_matrix
+from capture_file import CaptureReader
+from detection import find_components, target_angles
+from synthetic_scene import SceneGenerator, write_sequence
+
+N_FRAMES = 240
+PEOPLE = (1, 2, 5, 10, 20)
+
+
+def silhouette_angles(generator, camera_model, frame):
+    # direction of the depth-weighted centroid of the pixels in front of the room, as the pipeline computes it
+    depth = frame.astype(np.float32) * bench_utils.DEPTH_SCALE
+    mask = ((depth > 0) & (depth < generator.background - 0.3)).astype(np.int32)
+    return target_angles(find_components(mask, max_targets=1), camera_model, depth)[0]
+
+
+def standing_person(x, z):
+    # one person standing still at (x, z)
+    generator = SceneGenerator(1, seed=3, noise=0, dropout=0)
+    generator.start[:] = x, z
+    generator.velocity[:] = 0
+    return generator
+
+
+def main():
+    t0 = time.perf_counter()
+    bench_utils.synthetic_raw_frames(N_FRAMES)
+    baseline_fps = N_FRAMES / (time.perf_counter() - t0)
+    print(f'{"bench_utils.synthetic_raw_frames (1 person)":<44s} {baseline_fps:8.1f} frames/s')
+    for n_people in PEOPLE:
+        generator = SceneGenerator(n_people, seed=0)
+        t0 = time.perf_counter()
+        for first in range(0, N_FRAMES, 32):
+            generator.render(first, min(32, N_FRAMES - first))
+        fps = N_FRAMES / (time.perf_counter() - t0)
+        print(f'{f"SceneGenerator.render ({n_people} people)":<44s} {fps:8.1f} frames/s  '
+              f'(1 h at 24 fps in {24 * 3600 / fps / 60:.1f} min)')
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'synthetic.fdcap')
+        generator = SceneGenerator(5, seed=0)
+        t0 = time.perf_counter()
+        truth_path = write_sequence(path, generator, N_FRAMES)
+        fps = N_FRAMES / (time.perf_counter() - t0)
+        print(f'{"write_sequence (5 people, capture + truth)":<44s} {fps:8.1f} frames/s')
+        with CaptureReader(path) as reader, open(truth_path, newline='') as f:
+            rows = list(csv.DictReader(f))
+            frames = np.array(reader[N_FRAMES // 2:N_FRAMES // 2 + 8])
+            assert len(reader) == N_FRAMES and len(rows) == N_FRAMES * 5
+            assert np.array_equal(frames, generator.render(N_FRAMES // 2, 8)), 'capture differs from the render'
+        assert np.array_equal(SceneGenerator(5, seed=0).render(77, 4), SceneGenerator(5, seed=0).render(77, 4))
+        assert not np.array_equal(SceneGenerator(5, seed=0).render(77, 4), SceneGenerator(5, seed=1).render(77, 4))
+        print('capture matches the render, same seed gives the same frames')
+
+    # ground truth of people standing on the optical axis and 1 m to the side, 3 m away
+    camera_model = CameraModel(fov_camera_matrix(), distortion_coefficients=np.zeros(5))
+    for x, expected_hor in ((0.0, 0.0), (1.0, 18.435), (-1.0, -18.435)):
+        generator = standing_person(x, 3.0)
+        row = generator.ground_truth(0, 1)[0]
+        expected_ver = np.degrees(np.arctan2(generator.camera_height - generator.person_height[0] / 2, 3.0))
+        found = silhouette_angles(generator, camera_model, generator.render(0, 1)[0])
+        print(f'person at x = {x:+.1f} m, z = 3 m: ground truth {row[7]:+.3f} / {row[8]:+.3f} deg, '
+              f'silhouette {found[0]:+.3f} / {found[1]:+.3f} deg')
+        assert abs(row[7] - expected_hor) < 1e-3 and abs(row[8] - expected_ver) < 1e-9
+        # the feet do not stand out of the floor, which moves the silhouette centroid up
+        assert abs(found[0] - expected_hor) < 0.1 and abs(found[1] - expected_ver) < 1.0
+
+    # ground truth: one person walking, silhouette in the noisy frame
+    generator = SceneGenerator(1, seed=3, dropout=0.01)
+    frames = generator.render(0, N_FRAMES)
+    rows = generator.ground_truth(0, N_FRAMES)
+    # in view, and not right against a wall (where it does not stand out of it)
+    clear = np.array([row[11] and abs(row[9]) < generator.room[0] / 2 - 1 and row[10] < generator.room[1] - 1
+                      for row in rows])
+    truth = np.array([row[7:9] for row in rows])[clear]
+    found = np.array([silhouette_angles(generator, camera_model, frame) for frame in frames[clear]])
+    error = np.abs(found - truth).max(axis=0)
+    print(f'ground truth vs silhouette ({clear.sum()} frames): max error {error[0]:.2f} deg horizontal, '
+          f'{error[1]:.2f} deg vertical')
+    assert error[0] < 0.1 and error[1] < 1.0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+
+The benchmarks are plain scripts, run from the ToF-python folder or from here:
+    python benchmarks/bench_background_model.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+TOF_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if TOF_DIR not in sys.path:
+    sys.path.insert(0, TOF_DIR)
+
+HEIGHT, WIDTH = 480, 640
+DEPTH_SCALE = 0.001 * 0.25  # raw units -> meters, as in get_depth_map
+
+
+def load_reference(module_name='full_multi_person_processing_v4'):
+    """
+    Import one of the processing scripts as the reference implementation,
+    with a non-interactive matplotlib backend so no window is opened.
+    """
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    with quiet():
+        module = __import__(module_name)
+        camera_matrix, fx, fy, cx, cy = module.load_camera_matrix()
+    # the scripts expect camera_matrix as a module global set by __main__
+    module.camera_matrix = camera_matrix
+    return module
+
+
+def quiet():
+    """
+    Context manager that swallows the progress prints of the reference functions.
+    """
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def synthetic_raw_frames(n_frames, seed=0, shape=(HEIGHT, WIDTH), scene=None):
+    """
+    Raw uint16 depth frames: a static room (wall at ~4.5 m, floor gradient)
+    with sensor noise and one person-sized blob walking across the image.
+    scene (raw uint16 frame, e.g. a rasterised PLY) replaces the room.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    v = np.arange(height, dtype=np.float32)[:, None]
+    u = np.arange(width, dtype=np.float32)[None, :]
+    if scene is None:
+        room = np.broadcast_to(4.5 - 2.0 * np.clip((v - height * 0.6) / height, 0, None), shape)
+    else:
+        room = scene.astype(np.float32) * DEPTH_SCALE
+    frames = np.empty((n_frames, height, width), dtype=np.uint16)
+    for i in range(n_frames):
+        depth = room + rng.normal(0, 0.01, size=shape).astype(np.float32)
+        if scene is not None:
+            depth[scene == 0] = 0  # pixels without a return stay empty
+        cu = width * (0.2 + 0.6 * (i % 200) / 200)
+        blob = ((u - cu) / 40) ** 2 + ((v - height * 0.5) / 120) ** 2 < 1
+        depth = np.where(blob, 2.0, depth)
+        frames[i] = np.clip(depth / DEPTH_SCALE, 0, 65535).astype(np.uint16)
+    return frames
+
+
+def time_calls(fn, n_calls, *args, **kwargs):
+    """
+    Call fn n_calls times and return the per-call wall times in milliseconds.
+    """
+    times = np.empty(n_calls)
+    for i in range(n_calls):
+        t0 = time.perf_counter()
+        fn(*args, **kwargs)
+        times[i] = (time.perf_counter() - t0) * 1e3
+    return times
+
+
+def peak_allocation(fn, *args, **kwargs):
+    """
+    Bytes allocated at the peak of one call of fn, above what was live before
+    the call, as seen by tracemalloc (NumPy and OpenCV output arrays included).
+    """
+    fn(*args, **kwargs)  # warm-up, so lazily created buffers are not counted
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - baseline
+
+
+def report(name, times_ms):
+    print(f'{name:<40s} mean {np.mean(times_ms):9.3f} ms  '
+          f'p50 {np.percentile(times_ms, 50):9.3f} ms  p95 {np.percentile(times_ms, 95):9.3f} ms')
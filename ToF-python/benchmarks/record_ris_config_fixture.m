@@ -0,0 +1,89 @@
+% Records the reference of benchmarks/bench_ris_config.py: the phase map B, the voltages BV and the
+% bytes portValue computed by calculate() and processAndSaveData() of MATLAB/Beamsteering_NF.m for a
+% few receiver positions, on an 8 x 10 panel (not square, so a transposed order shows). The lines are
+% those of Beamsteering_NF.m, without the Excel files, the serial port and the plot. Run in this
+% folder with MATLAB or Octave:
+%     record_ris_config_fixture
+% Each row of ris_config_matlab.csv: theta, phi, r, M, N, B(:), BV(:), portValue (MATLAB column order).
+
+cases = [30 90 2; 0 0 2; 45 200 0.7; 60 315 5; 12 47 1.3];
+M = 8;
+N = 10;
+frequency = 3.5;
+rows = [];
+
+for c = 1:size(cases, 1)
+    theta = cases(c, 1);
+    phi = cases(c, 2);
+    r = cases(c, 3);
+
+    % --- calculate() ---
+    c0 = 299792458; % Speed of light in vacuum (m/s); c in calculate(), the case index here
+    f = frequency * 1e9; % Frequency (Hz)
+    lambda = c0 / f; % Wavelength (m)
+    k = 2 * pi / lambda; % Wave number
+    dist = r;
+    n = 10;
+    E = 2 * pi / 2^n * linspace(0, 2^n - 1, 2^n);
+    E(end + 1) = 2 * pi; % Ensure coverage of full phase range
+    thetaR = theta * pi / 180;
+    phiR = phi * pi / 180;
+    du = 11.30e-3; % Element spacing (meters)
+    Q = zeros(M * N, 3);
+    for i = 1:M
+        for j = 1:N
+            idx = (i - 1) * N + j;
+            Q(idx, :) = [(i - 1) * du, (j - 1) * du, 0];
+        end
+    end
+    P_TX = [0, 0, 0];
+    P_RX = dist * [cos(phiR) * sin(thetaR), sin(phiR) * sin(thetaR), cos(thetaR)];
+    B = zeros(M, N);
+    for i = 1:M
+        for j = 1:N
+            idx = (i - 1) * N + j;
+            Q_p = Q(idx, :);
+            d_TX_p = norm(Q_p - P_TX);
+            d_p_RX = norm(Q_p - P_RX);
+            phase_p = k * (d_TX_p + d_p_RX);
+            phase_p = mod(phase_p, 2 * pi);
+            [~, p] = min(abs(E - phase_p));
+            B(i, j) = E(p);
+        end
+    end
+
+    % --- processAndSaveData() ---
+    phasesheet=[-74+360,-76.31+360,-79.95+360,-83.94+360,-92.58+360,-104.29+360,-130.16+360,-154.53+360,-171.46+360,171.43,121.30,103.78,80.83,51.80,36.95,27.70,20.81,15.52,10.01];
+    Voltsheet=[23,20,18,16,14,12,10,9,8.5,8,7,6.5,6,5,4,3,2,1,0];
+    phssheet=flip(phasesheet);
+    vltsheet=flip(Voltsheet);
+    K=length(vltsheet);
+    BD=B*180/pi;
+    BV=BD;
+    for i=1:M
+        for j=1:N
+            if BD(i,j)<=phssheet(1)+(phssheet(2)-phssheet(1))/2 || BD(i,j)>phssheet(19)+(phssheet(1)+360-phssheet(19))/2
+                BV(i,j)=vltsheet(1);
+            elseif BD(i,j)<=phssheet(19)+(phssheet(1)+360-phssheet(19))/2 && BD(i,j)>phssheet(18)+(phssheet(19)-phssheet(18))/2
+                BV(i,j)=vltsheet(19);
+            end
+            for k=1:K-2
+                if BD(i,j)<=phssheet(k+1)+(phssheet(k+2)-phssheet(k+1))/2 && BD(i,j)>phssheet(k)+(phssheet(k+1)-phssheet(k))/2
+                BV(i,j)=vltsheet(k+1);
+                end
+            end
+        end
+    end
+    V_Dec = round(BV * 255 / 23);
+    HexData = dec2hex(V_Dec);
+    hexMatrix = reshape(cellstr(HexData), [], N);
+    portval=hex2dec(hexMatrix);
+    portVal=reshape(portval, [], N);
+    PortValue=portVal.';
+    portValue=PortValue(:);
+
+    rows(c, :) = [theta, phi, r, M, N, B(:).', BV(:).', portValue(:).'];
+end
+
+dlmwrite('ris_config_matlab.csv', rows, 'precision', 17);
+disp(['ris_config_matlab.csv: ', num2str(size(rows, 1)), ' cases']);
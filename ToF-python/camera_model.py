@@ -0,0 +1,180 @@
+import cv2
+import numpy as np
+
+# Distortion coefficients used by the processing scripts (k1, k2, p1, p2, k3)
+DISTORTION_COEFFICIENTS = np.array([-0.01, -0.0, -0.0, -0.0, -0.01], dtype=np.float64)
+# Raw ToF values to meters, as in get_depth_map
+DEPTH_SCALE_FACTOR = 0.001 * 0.25
+# Offset added to every camera point by depth_map_to_point_cloud
+POINT_CLOUD_OFFSET = (8, 8, 0)
+
+
+def _ray_grids(shape, fx, fy, cx, cy, dtype=np.float64):
+    # Per-pixel (u-cx)/fx and (v-cy)/fy, so that X = ray_x * d and Y = ray_y * d
+    height, width = shape
+    ray_x = (np.arange(width, dtype=np.float64) - cx) / fx
+    ray_y = (np.arange(height, dtype=np.float64) - cy) / fy
+    ray_x = np.broadcast_to(ray_x[None, :], shape).astype(dtype)
+    ray_y = np.broadcast_to(ray_y[:, None], shape).astype(dtype)
+    return ray_x, ray_y
+
+
+def fov_camera_matrix(shape=(480, 640), fov=(108, 78)):
+    """
+    Intrinsic matrix of a pinhole camera with the principal point at the image centre, as load_camera_matrix.
+    """
+    height, width = shape
+    f_x = width / (2 * np.tan(np.radians(fov[0]) / 2))
+    f_y = height / (2 * np.tan(np.radians(fov[1]) / 2))
+    return np.array([[f_x, 0, width / 2], [0, f_y, height / 2], [0, 0, 1]], dtype=np.float64)
+
+
+def angle_maps(shape, fx, fy, cx, cy, dtype=np.float32):
+    """
+    Horizontal and vertical angles in degrees of the ray through each pixel,
+    atan((u - cx) / fx) and atan((v - cy) / fy), positive to the right and downwards.
+    """
+    ray_x, ray_y = _ray_grids(shape, fx, fy, cx, cy)
+    return np.degrees(np.arctan(ray_x)).astype(dtype), np.degrees(np.arctan(ray_y)).astype(dtype)
+
+
+def _fill_point_cloud(depth_map, ray_x, ray_y, depth_scale, mask, roi, offset, out, dtype):
+    if roi is not None:
+        x, y, w, h = roi
+        depth_map, ray_x, ray_y = depth_map[y:y + h, x:x + w], ray_x[y:y + h, x:x + w], ray_y[y:y + h, x:x + w]
+        if mask is not None:
+            mask = mask[y:y + h, x:x + w]
+    valid = depth_map != 0
+    if mask is not None:
+        valid &= mask.astype(bool, copy=False)
+    # boolean indexing keeps the row-major (v, u) order of the original loops
+    d = depth_map[valid].astype(dtype, copy=False)
+    n_points = d.size
+    if out is None:
+        out = np.empty((n_points, 3), dtype=dtype)
+    elif out.shape[0] < n_points:
+        raise ValueError(f'output buffer holds {out.shape[0]} points, {n_points} needed')
+    else:
+        out = out[:n_points]
+    np.multiply(d, depth_scale, out=out[:, 2])
+    np.multiply(ray_x[valid], out[:, 2], out=out[:, 0])
+    np.multiply(ray_y[valid], out[:, 2], out=out[:, 1])
+    if offset is not None:
+        out += np.asarray(offset, dtype=out.dtype)
+    return out
+
+
+def depth_map_to_point_cloud(depth_map, fx, fy, cx, cy, depth_scale, mask=None, roi=None,
+                             offset=POINT_CLOUD_OFFSET, out=None, dtype=np.float64):
+    """
+    Vectorized conversion of the non-zero pixels of a depth map to camera points.
+
+    Same result as the per-pixel loop it replaces, including the [8, 8, 0]
+    offset. Use CameraModel.point_cloud in a loop, it caches the ray grids.
+
+    Args:
+        depth_map (numpy.ndarray): 2D depth map.
+        fx, fy, cx, cy (float): Camera intrinsics in pixels.
+        depth_scale (float): Factor applied to the depth values.
+        mask (numpy.ndarray): Optional 2D mask, only pixels where it is non-zero are used.
+        roi (tuple): Optional (x, y, w, h) region, in the bounding box format of cv2.boundingRect.
+        offset (tuple): Offset added to every point, None for none.
+        out (numpy.ndarray): Optional (M, 3) buffer with M >= number of points; a view of it is returned.
+        dtype: Type of the returned points.
+
+    Returns:
+        numpy.ndarray: (N, 3) array of X, Y, Z points.
+    """
+    ray_x, ray_y = _ray_grids(depth_map.shape, fx, fy, cx, cy)
+    return _fill_point_cloud(depth_map, ray_x, ray_y, depth_scale, mask, roi, offset, out, dtype)
+
+
+class CameraModel:
+    """
+    Camera intrinsics with a cached undistortion map and a fused depth stage.
+
+    cv2.undistort rebuilds the distortion mapping on every call. Here the
+    initUndistortRectifyMap tables are computed once, and depth_map() applies
+    remap, raw-to-meter scaling and the far clip in one pass into float32
+    buffers that are allocated once and reused for every frame.
+
+    Args:
+        camera_matrix (numpy.ndarray): 3x3 intrinsic matrix, as returned by load_camera_matrix().
+        distortion_coefficients (numpy.ndarray): Distortion coefficients passed to OpenCV.
+        shape (tuple): Image shape (height, width).
+        depth_scale (float): Factor converting raw values to meters.
+        clip (float): Depths above this value (meters) are set to 0. Use None to disable.
+    """
+
+    def __init__(self, camera_matrix, distortion_coefficients=DISTORTION_COEFFICIENTS,
+                 shape=(480, 640), depth_scale=DEPTH_SCALE_FACTOR, clip=50):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.distortion_coefficients = np.asarray(distortion_coefficients, dtype=np.float64)
+        self.shape = tuple(shape)
+        self.depth_scale = depth_scale
+        self.clip = clip
+        self.fx, self.fy = self.camera_matrix[0, 0], self.camera_matrix[1, 1]
+        self.cx, self.cy = self.camera_matrix[0, 2], self.camera_matrix[1, 2]
+
+        height, width = self.shape
+        # Fixed-point maps give the same result as cv2.undistort and remap fastest
+        self._map1, self._map2 = cv2.initUndistortRectifyMap(
+            self.camera_matrix, self.distortion_coefficients, None, self.camera_matrix,
+            (width, height), cv2.CV_16SC2)
+        self._raw = None  # undistorted raw frame, allocated on first use with the frame dtype
+        self._depth = np.empty(self.shape, dtype=np.float32)
+        self._ray_x, self._ray_y = _ray_grids(self.shape, self.fx, self.fy, self.cx, self.cy, dtype=np.float32)
+        self._angle_maps = None
+
+    def undistort(self, img, out=None):
+        """
+        Undistort a raw frame with the cached maps (same result as cv2.undistort).
+        """
+        if out is None:
+            if self._raw is None or self._raw.dtype != img.dtype:
+                self._raw = np.empty(self.shape, dtype=img.dtype)
+            out = self._raw
+        return cv2.remap(img, self._map1, self._map2, cv2.INTER_LINEAR,
+                         dst=out, borderMode=cv2.BORDER_CONSTANT)
+
+    def depth_map(self, img, out=None):
+        """
+        Undistorted, scaled and clipped float32 depth map (meters) from a raw frame.
+
+        Equivalent to get_depth_map(cv2.undistort(img, ...), clip=self.clip).
+        Without `out`, the returned array is owned by the model and is
+        overwritten by the next call.
+        """
+        if out is None:
+            out = self._depth
+        raw = self.undistort(img)
+        np.multiply(raw, self.depth_scale, out=out, casting='unsafe')
+        if self.clip:
+            # in place: values above the clipping threshold become 0
+            cv2.threshold(out, self.clip, 0, cv2.THRESH_TOZERO_INV, dst=out)
+        return out
+
+    def point_cloud(self, depth_map, depth_scale=1.0, mask=None, roi=None,
+                    offset=POINT_CLOUD_OFFSET, out=None):
+        """
+        (N, 3) float32 camera points of the non-zero pixels of a depth map, using the cached ray grids.
+        See depth_map_to_point_cloud for the arguments.
+        """
+        return _fill_point_cloud(depth_map, self._ray_x, self._ray_y, depth_scale, mask, roi, offset, out,
+                                 np.float32)
+
+    @property
+    def ray_grids(self):
+        """
+        Per-pixel ray slopes (u - cx) / fx and (v - cy) / fy (float32), so that X = ray_x * depth.
+        """
+        return self._ray_x, self._ray_y
+
+    @property
+    def angle_maps(self):
+        """
+        Per-pixel horizontal and vertical angles in degrees (see angle_maps), computed on first use.
+        """
+        if self._angle_maps is None:
+            self._angle_maps = angle_maps(self.shape, self.fx, self.fy, self.cx, self.cy)
+        return self._angle_maps
@@ -0,0 +1,271 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+from frame_source import frame_number
+from ply_reader import load_ply, ply_to_depth_image
+
+# File extension of capture files; the processing scripts replay camera_folder values ending with it
+CAPTURE_EXTENSION = '.fdcap'
+CAPTURE_MAGIC = b'FDASCAP1'
+CAPTURE_VERSION = 1
+
+# Fixed header: magic, version, height, width, max_frames, n_frames, index offset, data offset
+_HEADER = struct.Struct('<8sIIIIQQQ')
+_HEADER_SIZE = 64
+_N_FRAMES_OFFSET = struct.calcsize('<8sIIII')
+# One index entry per frame: byte offset of the frame, capture time (time.time() clock, seconds, so frame ages
+# compare with those of FrameSource), camera sequence number
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('timestamp', '<f8'), ('sequence', '<i8')])
+
+
+def _read_header(f):
+    f.seek(0)
+    magic, version, height, width, max_frames, n_frames, index_offset, data_offset = \
+        _HEADER.unpack(f.read(_HEADER.size))
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f'{f.name} is not a capture file')
+    if version != CAPTURE_VERSION:
+        raise ValueError(f'{f.name}: unsupported capture version {version}')
+    return (height, width), max_frames, n_frames, index_offset, data_offset
+
+
+class CaptureWriter:
+    """
+    Append-only recording of raw uint16 depth frames in a single file.
+
+    Layout: a fixed 64-byte header, an index of max_frames entries (offset,
+    timestamp, sequence number), then the frames stored contiguously. Frames
+    are collected in a memory buffer and written buffer_frames at a time; the
+    index entries are written before the frame count in the header, so a
+    reader (or a crash) never sees a frame that is not completely on disk.
+
+    Args:
+        path (str): Capture file to create (overwritten if it exists).
+        shape (tuple): Frame shape (height, width).
+        max_frames (int): Capacity of the frame index.
+        buffer_frames (int): Number of frames buffered before a write.
+    """
+
+    def __init__(self, path, shape=(480, 640), max_frames=100000, buffer_frames=16):
+        self.path = path
+        self.shape = tuple(shape)
+        self.max_frames = max_frames
+        self.frame_bytes = int(np.prod(self.shape)) * 2
+        self.index_offset = _HEADER_SIZE
+        self.data_offset = self.index_offset + max_frames * INDEX_DTYPE.itemsize
+        self.n_frames = 0
+        self._buffer = np.empty((buffer_frames,) + self.shape, dtype=np.uint16)
+        self._index = np.zeros(buffer_frames, dtype=INDEX_DTYPE)
+        self._n_buffered = 0
+        self._file = open(path, 'w+b')
+        self._write_header()
+        # reserve the index so the frames start at data_offset
+        self._file.truncate(self.data_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_frames + self._n_buffered
+
+    def _write_header(self):
+        self._file.seek(0)
+        header = _HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, self.shape[0], self.shape[1], self.max_frames,
+                              self.n_frames, self.index_offset, self.data_offset)
+        self._file.write(header.ljust(_HEADER_SIZE, b'\0'))
+
+    def append(self, frame, timestamp=None, sequence=None):
+        """
+        Add a raw depth frame. timestamp defaults to time.time() (the clock latest_time and the frame ages are
+        measured on: a camera's own clock does not fit), sequence to the frame number.
+        """
+        if len(self) >= self.max_frames:
+            raise ValueError(f'{self.path}: capture is full ({self.max_frames} frames)')
+        position = len(self)
+        entry = self._index[self._n_buffered]
+        entry['offset'] = self.data_offset + position * self.frame_bytes
+        entry['timestamp'] = time.time() if timestamp is None else timestamp
+        entry['sequence'] = position if sequence is None else sequence
+        np.copyto(self._buffer[self._n_buffered], frame, casting='unsafe')
+        self._n_buffered += 1
+        if self._n_buffered == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered frames, then their index entries, then the new frame count.
+        """
+        if self._n_buffered == 0:
+            return
+        f = self._file
+        f.seek(self.data_offset + self.n_frames * self.frame_bytes)
+        f.write(self._buffer[:self._n_buffered].tobytes())
+        f.seek(self.index_offset + self.n_frames * INDEX_DTYPE.itemsize)
+        f.write(self._index[:self._n_buffered].tobytes())
+        f.flush()
+        self.n_frames += self._n_buffered
+        self._n_buffered = 0
+        f.seek(_N_FRAMES_OFFSET)
+        f.write(struct.pack('<Q', self.n_frames))
+        f.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+class CaptureReader:
+    """
+    Zero-copy access to a capture file written by CaptureWriter.
+
+    Frames are np.memmap views, selected by position, by camera sequence number
+    or by time. The reader can also stand in for the FrameSource of the
+    processing scripts: refresh() picks up frames appended by a running writer
+    and latest_frame() returns the newest frame or, with replay_speed, the frame
+    that was current at the same time in the recording.
+
+    Args:
+        path (str): Capture file.
+        replay_speed (float): Replay against the wall clock at this speed; None to always return the newest frame.
+    """
+
+    def __init__(self, path, replay_speed=None):
+        self.path = path
+        self.replay_speed = replay_speed
+        self._file = open(path, 'rb', buffering=0)  # unbuffered: the header is re-read on refresh
+        self.shape, self.max_frames, _, self.index_offset, self.data_offset = _read_header(self._file)
+        self._n_frames = 0
+        self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self.frames = np.zeros((0,) + self.shape, dtype=np.uint16)
+        self._replay_start = None
+        self._replay_start_time = None
+        # capture time (time.time() clock) of the frame last returned by latest_frame(), for its age
+        self.latest_time = None
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return self._n_frames
+
+    def __getitem__(self, position):
+        return self.frames[position]
+
+    def refresh(self):
+        """
+        Map the frames appended since the last call.
+
+        Returns:
+            int: Number of new frames.
+        """
+        n_frames = _read_header(self._file)[2]
+        n_new = n_frames - self._n_frames
+        if n_new > 0:
+            self._n_frames = n_frames
+            self.index = np.memmap(self.path, dtype=INDEX_DTYPE, mode='r', offset=self.index_offset,
+                                   shape=(n_frames,))
+            self.frames = np.memmap(self.path, dtype=np.uint16, mode='r', offset=self.data_offset,
+                                    shape=(n_frames,) + self.shape)
+        return n_new
+
+    @property
+    def timestamps(self):
+        return self.index['timestamp']
+
+    @property
+    def sequences(self):
+        return self.index['sequence']
+
+    def read(self, position):
+        """
+        Raw uint16 frame at a position (a view on the file).
+        """
+        return self.frames[position]
+
+    def position_at(self, timestamp):
+        """
+        Position of the last frame captured at or before timestamp (0 if before the first frame).
+        """
+        return max(int(np.searchsorted(self.timestamps, timestamp, side='right')) - 1, 0)
+
+    def frame_at(self, timestamp):
+        return self.frames[self.position_at(timestamp)]
+
+    def position_of(self, sequence):
+        """
+        Position of the frame with a camera sequence number, or None.
+        """
+        position = int(np.searchsorted(self.sequences, sequence))
+        if position < len(self) and self.sequences[position] == sequence:
+            return position
+        return None
+
+    def latest_frame(self):
+        """
+        (sequence number, frame) of the newest frame, or of the frame matching the
+        replay clock when replay_speed is set; None if the capture is empty.
+        Sets latest_time to its capture time (for a replay, the time it would
+        have been captured at in the replayed session).
+        """
+        if len(self) == 0:
+            return None
+        if self.replay_speed is None:
+            position = len(self) - 1
+            self.latest_time = float(self.timestamps[position])
+        else:
+            if self._replay_start is None:
+                self._replay_start, self._replay_start_time = time.monotonic(), time.time()
+            elapsed = (time.monotonic() - self._replay_start) * self.replay_speed
+            position = self.position_at(self.timestamps[0] + elapsed)
+            self.latest_time = self._replay_start_time + (self.timestamps[position] - self.timestamps[0]) / \
+                self.replay_speed
+        return int(self.sequences[position]), self.frames[position]
+
+
+def convert_ply_folder(folder, path, fx, fy, cx, cy, shape=(480, 640)):
+    """
+    Convert a folder of PLY frames (data_0.ply, data_1.ply, ...) into a capture file.
+    The file modification times are used as timestamps.
+
+    Returns:
+        int: Number of converted frames.
+    """
+    names = sorted((name for name in os.listdir(folder)
+                    if name.lower().endswith('.ply') and frame_number(name) is not None), key=frame_number)
+    depth_image = np.empty(shape, dtype=np.uint16)
+    with CaptureWriter(path, shape=shape, max_frames=max(len(names), 1)) as writer:
+        for name in names:
+            ply_path = os.path.join(folder, name)
+            ply_to_depth_image(load_ply(ply_path), fx, fy, cx, cy, shape=shape, out=depth_image)
+            writer.append(depth_image, timestamp=os.path.getmtime(ply_path), sequence=frame_number(name))
+    return len(names)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert a folder of PLY frames into a capture file.')
+    parser.add_argument('folder')
+    parser.add_argument('output')
+    parser.add_argument('--fov', type=float, nargs=2, default=(108, 78), help='horizontal and vertical FOV (degrees)')
+    args = parser.parse_args()
+    height, width = 480, 640
+    fx = width / (2 * np.tan(np.radians(args.fov[0]) / 2))
+    fy = height / (2 * np.tan(np.radians(args.fov[1]) / 2))
+    n_converted = convert_ply_folder(args.folder, args.output, fx, fy, width / 2, height / 2)
+    print(f'{n_converted} frames written to {args.output}')
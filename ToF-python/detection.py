@@ -0,0 +1,119 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Targets found in a binary mask, largest first:
+#   boxes (k, 4) int32 as x, y, w, h; areas (k,) pixel counts; centroids (k, 2) float64 as x, y;
+#   ids (k,) their values in labels, the int32 component image (0 = background) of the part
+#   roi (x, y, w, h) of the mask that holds all its non-zero pixels
+Components = namedtuple('Components', ['boxes', 'areas', 'centroids', 'ids', 'labels', 'roi'])
+
+CSV_FIELDS = ['x', 'y', 'w', 'h', 'angle_hor', 'angle_ver']
+
+
+def find_components(BW_image, min_area=0, max_targets=None, connectivity=8, out=None):
+    """
+    Bounding boxes, areas and centroids of the connected regions of a binary
+    mask, from a single cv2.connectedComponentsWithStats pass.
+
+    Replaces findContours + sorted(contourArea) + boundingRect: the statistics
+    of all regions come back as one array, regions smaller than min_area are
+    dropped and the max_targets largest are kept with a partial sort. Regions
+    are ranked by pixel count (contourArea is the polygon area of the outline,
+    which can order two nearly equal regions differently). Only the bounding
+    rectangle of the non-zero pixels is labelled.
+
+    Args:
+        BW_image (numpy.ndarray): Mask, non-zero for the targets.
+        min_area (int): Smallest region kept, in pixels.
+        max_targets (int): Number of regions kept, None for all.
+        connectivity (int): 8 (as findContours) or 4.
+        out (numpy.ndarray): int32 buffer of the mask shape the labels are written into.
+
+    Returns:
+        Components: The kept regions, largest first.
+    """
+    mask = BW_image if BW_image.dtype == np.uint8 else BW_image.astype(np.uint8)
+    roi = x, y, w, h = cv2.boundingRect(mask)
+    # Grana's block-based labelling, the fastest of the OpenCV algorithms on these masks
+    n_labels, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+        mask[y:y + h, x:x + w], connectivity, cv2.CV_32S, cv2.CCL_GRANA,
+        labels=None if out is None else out.reshape(-1)[:h * w].reshape(h, w))  # contiguous part of out
+    if labels is None:
+        labels = np.zeros((h, w), dtype=np.int32)  # empty mask
+    stats[:, cv2.CC_STAT_LEFT] += x
+    stats[:, cv2.CC_STAT_TOP] += y
+    centroids += (x, y)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    ids = np.flatnonzero(areas >= min_area) if min_area > 0 else np.arange(n_labels - 1)
+    if max_targets is not None and len(ids) > max_targets:
+        ids = ids[np.argpartition(-areas[ids], max_targets - 1)[:max_targets]] if max_targets > 0 else ids[:0]
+    # largest first, ties in label (raster) order
+    ids = ids[np.argsort(-areas[ids], kind='stable')] + 1
+    return Components(stats[ids, :4], stats[ids, cv2.CC_STAT_AREA], centroids[ids], ids, labels, roi)
+
+
+def bbox_angles(boxes, shape, fov_horizontal=108, fov_vertical=78):
+    """
+    Horizontal and vertical angles (k, 2) in degrees of the centres of boxes (k, 4),
+    computed as calculate_bbox_angles for all boxes at once.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    image_height, image_width = shape
+    center = np.array([image_width / 2, image_height / 2])
+    half_fov = np.radians([fov_horizontal, fov_vertical]) / 2
+    bbox_center = boxes[:, :2] + boxes[:, 2:] / 2
+    return np.degrees((bbox_center - center) / center * half_fov)
+
+
+def _label_sums(components, *images):
+    # per-component sums (len(images), k) of images cropped to the labelled region, in the order of ids
+    labels = components.labels.ravel()
+    n_labels = int(components.ids.max()) + 1
+    return np.array([np.bincount(labels, weights=image.ravel(), minlength=n_labels)[components.ids]
+                     for image in images])
+
+
+def target_angles(components, camera_model, depth_map=None):
+    """
+    Horizontal and vertical angles (k, 2) in degrees of the targets, from the
+    per-pixel angle maps of the camera (true pinhole angles) instead of the
+    linear pixel-to-angle approximation.
+
+    Without depth_map, the mean angle over the pixels of each target (what
+    average_angle computes for a single target). With depth_map, the
+    direction of the centroid of the target's 3D points: atan of the
+    depth-weighted mean ray slope, sum(d * (u - cx) / fx) / sum(d). Every sum
+    is one weighted bincount over the component labels, for all targets at once.
+    """
+    if len(components.ids) == 0:
+        return np.empty((0, 2))
+    x, y, w, h = components.roi
+    window = np.s_[y:y + h, x:x + w]
+    if depth_map is None:
+        angle_hor, angle_ver = camera_model.angle_maps
+        return _label_sums(components, angle_hor[window], angle_ver[window]).T / components.areas[:, None]
+    ray_x, ray_y = camera_model.ray_grids
+    depth = depth_map[window]
+    depth_sums, slope_x, slope_y = _label_sums(components, depth, ray_x[window] * depth, ray_y[window] * depth)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.degrees(np.arctan(np.stack([slope_x, slope_y], axis=1) / depth_sums[:, None]))
+
+
+def tracking_csv_header(n_slots):
+    """
+    Header of the tracking CSV with n_slots targets: timestamp, x_1 .. angle_ver_1, x_2 ...
+    """
+    return ['timestamp'] + [f'{field}_{slot}' for slot in range(1, n_slots + 1) for field in CSV_FIELDS]
+
+
+def tracking_csv_row(timestamp, boxes, angles, n_slots):
+    """
+    Row of the tracking CSV: the first n_slots targets, empty slots filled with None.
+    """
+    row = [timestamp]
+    for box, angle in zip(np.asarray(boxes).tolist()[:n_slots], np.asarray(angles).tolist()[:n_slots]):
+        row += box + angle
+    row += [None] * (1 + n_slots * len(CSV_FIELDS) - len(row))
+    return row
@@ -0,0 +1,175 @@
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Per-slot header: sequence number of the item (-1 while it is written), tag (e.g. the camera frame
+# number) and timestamp (time.perf_counter of the producer)
+_SLOT_DTYPE = np.dtype([('seq', '<i8'), ('tag', '<i8'), ('timestamp', '<f8')])
+# Ring header: sequence number of the last published item, closed flag
+_RING_DTYPE = np.dtype([('last_seq', '<i8'), ('closed', '<i8')])
+
+
+class FrameRing:
+    """
+    Fixed-size slots in shared memory, written by one process and read by
+    any number of others with latest-wins semantics.
+
+    Item seq goes to slot seq % n_slots. A slot is marked as being written
+    (seq -1) before its data is copied and gets its sequence number after,
+    then the ring's last_seq is advanced; a reader copies a slot and checks
+    afterwards that its sequence number did not change (a sequence lock), so
+    the producer never waits for a consumer and a consumer never sees a torn
+    item. Slow consumers simply skip to the newest item, or read the items
+    still held in the ring in order.
+
+    The ordering relies on aligned 8-byte stores being atomic and not
+    reordered (x86-64). A ring is pickled by name: passed to a
+    multiprocessing.Process, it is attached in the child.
+
+    Args:
+        shape (tuple): Shape of an item.
+        dtype: Type of an item (a structured type for records).
+        n_slots (int): Number of items held.
+        name (str): Shared memory block to attach to; None to create one.
+    """
+
+    def __init__(self, shape, dtype, n_slots=4, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.n_slots = n_slots
+        item_bytes = int(np.prod(self.shape, dtype=np.int64)) * self.dtype.itemsize
+        header_bytes = _RING_DTYPE.itemsize + n_slots * _SLOT_DTYPE.itemsize
+        # items start on a 64-byte boundary
+        self._data_offset = -(-header_bytes // 64) * 64
+        size = self._data_offset + n_slots * item_bytes
+        create = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        # the creating process frees the block (a forked child inherits the object but is not the owner)
+        self._owner_pid = os.getpid() if create else None
+        buffer = self.shm.buf
+        ring = np.ndarray((), dtype=_RING_DTYPE, buffer=buffer)
+        slots = np.ndarray((n_slots,), dtype=_SLOT_DTYPE, buffer=buffer, offset=_RING_DTYPE.itemsize)
+        self._last_seq, self._closed = ring['last_seq'], ring['closed']
+        self._seq, self._tag, self._timestamp = slots['seq'], slots['tag'], slots['timestamp']
+        self._items = np.ndarray((n_slots,) + self.shape, dtype=self.dtype, buffer=buffer,
+                                 offset=self._data_offset)
+        if create:
+            self._last_seq[()] = -1
+            self._closed[()] = 0
+            self._seq[:] = -1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __getstate__(self):
+        return self.shape, self.dtype, self.n_slots, self.name
+
+    def __setstate__(self, state):
+        shape, dtype, n_slots, name = state
+        self.__init__(shape, dtype, n_slots, name=name)
+
+    def __len__(self):
+        return self.n_slots
+
+    @property
+    def last_seq(self):
+        """
+        Sequence number of the newest published item, -1 if none.
+        """
+        return int(self._last_seq)
+
+    @property
+    def closed(self):
+        return bool(self._closed)
+
+    def close_writer(self):
+        """
+        Tell the readers that no more items will come.
+        """
+        self._closed[()] = 1
+
+    def claim(self):
+        """
+        Slot array of the next item, to be filled in place and then published with publish().
+        """
+        slot = (self.last_seq + 1) % self.n_slots
+        self._seq[slot] = -1
+        return self._items[slot, ...]  # an array even for record items
+
+    def publish(self, tag=-1, timestamp=None):
+        """
+        Publish the item filled in the claimed slot.
+
+        Returns:
+            int: Its sequence number.
+        """
+        seq = self.last_seq + 1
+        slot = seq % self.n_slots
+        self._tag[slot] = tag
+        self._timestamp[slot] = time.perf_counter() if timestamp is None else timestamp
+        self._seq[slot] = seq
+        self._last_seq[()] = seq
+        return seq
+
+    def write(self, item, tag=-1, timestamp=None):
+        """
+        Copy an item into the ring and publish it.
+        """
+        np.copyto(self.claim(), item, casting='unsafe')
+        return self.publish(tag, timestamp)
+
+    def read(self, seq, out):
+        """
+        Copy item seq into out.
+
+        Returns:
+            tuple: (tag, timestamp), or None if the item is not in the ring (overwritten or not written yet).
+        """
+        slot = seq % self.n_slots
+        if self._seq[slot] != seq:
+            return None
+        tag, timestamp = int(self._tag[slot]), float(self._timestamp[slot])
+        np.copyto(out, self._items[slot, ...])
+        if self._seq[slot] != seq:
+            return None  # overwritten while copying
+        return tag, timestamp
+
+    def read_latest(self, out, after=-1):
+        """
+        Copy the newest item into out if it is newer than item `after`.
+
+        Returns:
+            tuple: (seq, tag, timestamp), or None if there is no newer item.
+        """
+        while True:
+            seq = self.last_seq
+            if seq <= after:
+                return None
+            result = self.read(seq, out)
+            if result is not None:
+                return (seq,) + result
+
+    def wait_latest(self, out, after=-1, timeout=None, poll=0.0005):
+        """
+        read_latest(), waiting up to timeout seconds (None: until the writer closes the ring).
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            result = self.read_latest(out, after)
+            if result is not None or self.closed:
+                return result
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def close(self):
+        """
+        Detach from the shared memory; the creating process also frees it.
+        """
+        self._last_seq = self._closed = self._seq = self._tag = self._timestamp = self._items = None
+        self.shm.close()
+        if self._owner_pid == os.getpid():
+            self.shm.unlink()
@@ -0,0 +1,158 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# What the loop does for a frame at a quality level:
+#   display: refresh the display; background_stride: multiple of the background model's sampling
+#   stride (the median is recomputed that much less often); segmentation_step: whole frames
+#   segmented coarse-to-fine at 1/step scale (pyramid.PyramidDetector), 1 for full resolution
+Quality = namedtuple('Quality', ['display', 'background_stride', 'segmentation_step'])
+
+# From full quality to the most degraded; each level adds a step to the previous one
+QUALITY_LEVELS = [
+    Quality(display=True, background_stride=1, segmentation_step=1),
+    Quality(display=False, background_stride=1, segmentation_step=1),
+    Quality(display=False, background_stride=4, segmentation_step=1),
+    Quality(display=False, background_stride=4, segmentation_step=2),
+]
+# Counters also added to a StageTimer (its frame_done() already counts processed and dropped frames)
+_TIMER_COUNTERS = ('stale_frames', 'degraded_frames')
+
+
+class FrameScheduler:
+    """
+    Latest-frame scheduling of the processing loop with a latency budget.
+
+    The age of a frame is measured from its capture time (latest_time of the
+    FrameSource or CaptureReader) to the end of its processing. next_frame()
+    hands out the newest frame only: frames that arrived in between are dropped
+    on purpose (the loop is behind, they would only add latency), and a frame
+    that is already older than max_age when it is picked up is dropped in
+    favour of the next one, unless the previous frame was late as well (then
+    the source itself is late and dropping would starve the loop).
+
+    After each frame the quality level is adapted on a moving average of the
+    age (so that the occasional slow frame, such as a background refresh,
+    neither degrades the quality nor holds back its recovery):
+    degrade_after consecutive frames with the average over target_latency
+    step it down (QUALITY_LEVELS: no display, then a less frequent background
+    refresh, then downsampled segmentation), and recover_after consecutive
+    frames under recover_ratio * target_latency step it back up. Counts of
+    processed, dropped, stale and degraded frames are kept in `counters`; the
+    stale and degraded counts are also added to the counters of stage_timer,
+    so they are written with its statistics.
+
+    Args:
+        target_latency (float): Frame age to hold, in seconds.
+        max_age (float): Age at pick-up above which a frame is dropped, in seconds (default 2 * target_latency).
+        levels (list): Quality of each level, the first being full quality.
+        degrade_after (int): Consecutive frames over the target before the quality is lowered.
+        recover_after (int): Consecutive frames under recover_ratio * target_latency before it is raised.
+        recover_ratio (float): Fraction of the target under which a frame counts towards recovery.
+        smoothing (float): Weight of the newest age in the moving average.
+        poll_interval (float): Seconds to wait when there is no new frame.
+        window (int): Number of recent frame ages the percentiles are computed over.
+        stage_timer (StageTimer): Timer whose counters get the stale and degraded counts.
+    """
+
+    def __init__(self, target_latency=0.1, max_age=None, levels=QUALITY_LEVELS, degrade_after=2, recover_after=48,
+                 recover_ratio=0.6, smoothing=0.25, poll_interval=0.002, window=1000, stage_timer=None):
+        self.target_latency = target_latency
+        self.max_age = 2 * target_latency if max_age is None else max_age
+        self.levels = list(levels)
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.recover_ratio = recover_ratio
+        self.smoothing = smoothing
+        self.poll_interval = poll_interval
+        self.stage_timer = stage_timer
+        self.level = 0
+        self.smoothed_age = None      # moving average of the age, seconds
+        self.counters = {'processed_frames': 0, 'dropped_frames': 0, 'stale_frames': 0, 'degraded_frames': 0}
+        self.ages = np.zeros(window)  # age of the last processed frames, seconds
+        self._last_index = None       # last frame handed out or dropped
+        self.capture_time = None      # of the frame being processed, on the time.time() clock
+        self._previous_late = True    # never drop the first frame
+        self._over = 0
+        self._under = 0
+
+    @property
+    def quality(self):
+        return self.levels[self.level]
+
+    def _count(self, name, n=1):
+        self.counters[name] += n
+        if self.stage_timer is not None and name in _TIMER_COUNTERS:
+            self.stage_timer.count(name, n)
+
+    def next_frame(self, frame_source):
+        """
+        (frame index, raw frame) of the newest frame of the source if it is new
+        and not dropped; None otherwise (wait poll_interval and ask again).
+        """
+        latest_frame = frame_source.latest_frame()
+        if latest_frame is None or latest_frame[0] == self._last_index:
+            return None
+        frame_index = latest_frame[0]
+        if self._last_index is not None and frame_index > self._last_index + 1:
+            # backlog: the frames between the last one and the newest are skipped
+            self._count('dropped_frames', frame_index - self._last_index - 1)
+        self._last_index = frame_index
+        capture_time = getattr(frame_source, 'latest_time', None)
+        now = time.time()
+        late = capture_time is not None and now - capture_time > self.max_age
+        if late and not self._previous_late:
+            self._previous_late = True
+            self._count('dropped_frames')
+            self._count('stale_frames')
+            return None
+        self._previous_late = late
+        self.capture_time = now if capture_time is None else capture_time
+        return latest_frame
+
+    def frame_done(self):
+        """
+        Close the frame handed out by next_frame(): record its age and adapt the quality level.
+
+        Returns:
+            float: Age of the frame in seconds.
+        """
+        age = time.time() - self.capture_time
+        processed = self.counters['processed_frames']
+        self.ages[processed % len(self.ages)] = age
+        self._count('processed_frames')
+        if self.level > 0:
+            self._count('degraded_frames')
+        if self.smoothed_age is None:
+            self.smoothed_age = age
+        else:
+            self.smoothed_age += self.smoothing * (age - self.smoothed_age)
+        if self.smoothed_age > self.target_latency:
+            self._over, self._under = self._over + 1, 0
+            if self._over >= self.degrade_after and self.level < len(self.levels) - 1:
+                self.level += 1
+                self._over = 0
+        elif self.smoothed_age < self.recover_ratio * self.target_latency:
+            self._over, self._under = 0, self._under + 1
+            if self._under >= self.recover_after and self.level > 0:
+                self.level -= 1
+                self._under = 0
+        else:
+            self._over = self._under = 0
+        return age
+
+    def wait(self):
+        time.sleep(self.poll_interval)
+
+    def age_percentiles(self, quantiles=(50, 95, 99)):
+        """
+        Percentiles of the age of the recently processed frames, in seconds.
+        """
+        n = min(self.counters['processed_frames'], len(self.ages))
+        return np.percentile(self.ages[:n], quantiles) if n else np.full(len(quantiles), np.nan)
+
+    def report(self):
+        p50, p95, p99 = self.age_percentiles() * 1e3
+        return (', '.join(f'{name} {value}' for name, value in self.counters.items()) +
+                f', level {self.level}, age p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms')
@@ -0,0 +1,259 @@
+import bisect
+import os
+import queue
+import re
+import time
+
+import cv2
+
+from ply_reader import load_ply, ply_to_depth_image
+
+try:
+    # watchdog uses inotify on Linux and ReadDirectoryChangesW on Windows
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def frame_number(name):
+    """
+    Sequence number of a frame file (first number in the name, as natural_sort_key), or None.
+    """
+    match = re.search(r'\d+', name)
+    return int(match.group()) if match else None
+
+
+class _EventHandler(FileSystemEventHandler):
+    # Forward file system events to the FrameSource through a thread-safe queue
+    def __init__(self, events):
+        self.events = events
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.events.put(('created', event.src_path))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.events.put(('created', event.dest_path))
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.events.put(('closed', event.src_path))
+
+
+class FrameSource:
+    """
+    Incrementally maintained, sequence-ordered index of the frames in a capture folder.
+
+    Replaces the per-frame `sorted(os.listdir(camera_folder), key=natural_sort_key)`.
+    New files are picked up from file system events when watchdog is installed,
+    otherwise by polling. Polling first probes for the next file names in the
+    sequence (data_41.ply after data_40.ply) and only rescans the whole folder
+    when its modification time changed and nothing was found that way, or every
+    rescan_interval seconds. A frame is only handed out once it is completely written: its
+    writer closed it, a frame with a higher sequence number exists, or its size
+    did not change for settle_time seconds.
+
+    Args:
+        folder (str): Folder the acquisition writes frames to.
+        settle_time (float): Seconds a file size must stay unchanged to count as complete.
+        use_watcher (bool): Use file system events if watchdog is available.
+        rescan_interval (float): Seconds between full rescans while polling.
+        camera_matrix (numpy.ndarray): Intrinsics used to rasterise .ply frames into depth images.
+    """
+
+    def __init__(self, folder, settle_time=0.05, use_watcher=True, rescan_interval=1.0, camera_matrix=None):
+        self.folder = folder
+        self.camera_matrix = camera_matrix
+        self.settle_time = settle_time
+        self.rescan_interval = rescan_interval
+        self._names = []          # complete frames, sorted by sequence number
+        self._numbers = []        # their sequence numbers
+        self._known = set()       # every frame name seen, complete or not
+        self._pending = {}        # name -> (number, last size, time the size last changed)
+        self._max_seen = -1       # highest sequence number seen
+        self._max_name = None     # name of that frame, template for probing
+        self._dir_mtime = None
+        self._last_scan = 0.0
+        self.latest_time = None   # modification time of the frame last returned by latest_frame()
+        self._events = queue.Queue()
+        self._observer = None
+        if use_watcher and Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self._events), folder, recursive=False)
+            self._observer.start()
+        # initial scan, also needed with a watcher for the files that already exist
+        self._scan()
+        self._settle()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, position):
+        return self._names[position]
+
+    @property
+    def names(self):
+        """
+        File names of the complete frames in sequence order (do not modify).
+        """
+        return self._names
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def refresh(self):
+        """
+        Pick up new files and promote the ones that are completely written.
+
+        Returns:
+            int: Number of frames that became available.
+        """
+        n_before = len(self._names)
+        if self._observer is not None:
+            while True:
+                try:
+                    kind, path = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                name = os.path.basename(path)
+                self._add(name)
+                if kind == 'closed' and name in self._pending:
+                    self._complete(name)
+        else:
+            found = self._probe()
+            if time.monotonic() - self._last_scan > self.rescan_interval:
+                self._scan(force=True)
+            elif found:
+                # the probed files explain the change of the folder
+                self._dir_mtime = os.stat(self.folder).st_mtime_ns
+            else:
+                self._scan()
+        self._settle()
+        return len(self._names) - n_before
+
+    def latest(self):
+        """
+        Latest complete frame as (sequence number, path), or None if there is none yet.
+        """
+        if not self._names:
+            return None
+        return self._numbers[-1], self.path(self._names[-1])
+
+    def read(self, position):
+        """
+        Raw depth image of the complete frame at a position; .ply frames are rasterised.
+        """
+        path = self.path(self._names[position])
+        if path.lower().endswith('.ply'):
+            if self.camera_matrix is None:
+                raise ValueError('a camera_matrix is needed to read .ply frames')
+            (fx, _, cx), (_, fy, cy) = self.camera_matrix[:2]
+            return ply_to_depth_image(load_ply(path), fx, fy, cx, cy)
+        return cv2.imread(path, cv2.IMREAD_UNCHANGED)
+
+    def latest_frame(self):
+        """
+        Latest complete frame as (sequence number, raw depth image), or None if there is none yet.
+        Sets latest_time to the time its file was last written (time.time() clock).
+        """
+        if not self._names:
+            return None
+        try:
+            self.latest_time = os.stat(self.path(self._names[-1])).st_mtime
+        except FileNotFoundError:
+            self.latest_time = None
+        return self._numbers[-1], self.read(-1)
+
+    def frames(self, i, j):
+        """
+        Paths of the complete frames at positions i..j (inclusive) in sequence order.
+        """
+        return [self.path(name) for name in self._names[i:j + 1]]
+
+    def _probe(self):
+        # Look for the next names of the sequence directly, O(1) per new frame
+        if self._max_name is None:
+            return 0
+        match = re.search(r'\d+', self._max_name)
+        prefix, suffix = self._max_name[:match.start()], self._max_name[match.end():]
+        found = 0
+        while True:
+            name = f'{prefix}{self._max_seen + 1}{suffix}'
+            if name in self._known or not os.path.isfile(self.path(name)):
+                return found
+            self._add(name)
+            found += 1
+
+    def _scan(self, force=False):
+        # Rescan the folder only when entries were added or removed
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            return
+        # with coarse (whole second) timestamps a change within the same second
+        # would be missed, so such folders are rescanned while the stamp is recent
+        coarse = mtime % 1_000_000_000 == 0
+        if not force and mtime == self._dir_mtime and not (coarse and time.time_ns() - mtime < 2_000_000_000):
+            return
+        self._dir_mtime = mtime
+        self._last_scan = time.monotonic()
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name not in self._known and entry.is_file():
+                    self._add(entry.name)
+
+    def _add(self, name):
+        if name in self._known:
+            return
+        number = frame_number(name)
+        if number is None:
+            return
+        self._known.add(name)
+        self._pending[name] = (number, -1, time.monotonic())
+        if number > self._max_seen:
+            self._max_seen = number
+            self._max_name = name
+
+    def _settle(self):
+        now = time.monotonic()
+        for name, (number, last_size, since) in list(self._pending.items()):
+            if number < self._max_seen:
+                # the writer is sequential: a newer frame means this one is closed
+                self._complete(name)
+                continue
+            try:
+                size = os.stat(self.path(name)).st_size
+            except FileNotFoundError:
+                del self._pending[name]
+                self._known.discard(name)
+                continue
+            if size != last_size:
+                self._pending[name] = (number, size, now)
+            elif size > 0 and now - since >= self.settle_time:
+                self._complete(name)
+
+    def _complete(self, name):
+        number = self._pending.pop(name)[0]
+        if not self._numbers or number > self._numbers[-1]:
+            # frames normally arrive in order, which keeps this O(1)
+            self._numbers.append(number)
+            self._names.append(name)
+        else:
+            position = bisect.bisect(self._numbers, number)
+            self._numbers.insert(position, number)
+            self._names.insert(position, name)
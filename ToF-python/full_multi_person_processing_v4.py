@@ -4,12 +4,25 @@ import cv2
 import numpy as np
 import re
 import csv
+from collections import namedtuple
 from datetime import datetime
 
 # import open3d as o3d
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
-from sklearn.cluster import KMeans
+
+from background_model import BackgroundModel
+from camera_model import CameraModel, depth_map_to_point_cloud
+from capture_file import CAPTURE_EXTENSION, CaptureReader
+from detection import bbox_angles, find_components, target_angles, tracking_csv_header, tracking_csv_row
+from frame_scheduler import FrameScheduler
+from frame_source import FrameSource
+from preprocessing import Preprocessor
+from pyramid import PyramidDetector
+from segmentation import TwoMeansSegmenter
+from stage_timer import StageTimer
+from target_tracker import TargetTracker
+from tracking_display import TrackingDisplay
 
 plt.ion()
  
@@ -23,6 +36,39 @@ custom_cmap = mcolors.LinearSegmentedColormap.from_list('Custom cmap', cmaplist,
 # Define the folders
 # camera_folder = 'camera_images/'
 camera_folder = 'C:/ProgramData/Lucid Vision Labs/ArenaView/ArenaJp/Jupyter Source Code Examples/myfolder/3D_data_output/'
+# camera_folder can also be a capture file (.fdcap) written by the acquisition notebook, it is then replayed
+# camera_folder = 'D:/LiDAR Capture/3D_data_output/capture.fdcap'
+
+# Per-stage latency statistics of the processing loop, written every 10 seconds to stage_latency_file
+# (Prometheus text format, or a binary stage_timer.STATS_DTYPE array for a .npy file)
+profile_stages = False
+stage_latency_file = 'C:/run_lidar_analysis/stage_latency.prom'
+
+# Number of people tracked (the largest regions of the mask) and smallest region counted as a person, in pixels;
+# the CSV has a slot per person, at least two
+max_people = 2
+min_person_area = 0
+
+# Angles of a target: 'centroid' (direction of the centroid of its 3D points), 'mean' (mean angle of its pixels),
+# both from the true pinhole angle of every pixel, or 'bbox' (centre of the box, linear pixel-to-angle mapping)
+angle_model = 'centroid'
+
+# Display of the loop: 'blit' (artists created once, refreshed at most display_fps times per second),
+# 'redraw' (everything recreated and redrawn every frame) or 'headless' (no plotting at all)
+display_mode = 'blit'
+display_fps = 10
+
+# Latency budget of the loop in seconds: only the newest frame is processed, and while frames come out older
+# than this the display is skipped, then the background refreshed less often, then the segmentation downsampled
+target_latency = 0.1
+
+# Follow the targets from frame to frame: the frames are processed in windows around the predicted boxes, with a
+# sweep of the whole frame every second (every 6 frames while fewer than max_people are followed)
+roi_tracking = True
+
+# Whole frames coarse-to-fine: the targets found at 1/pyramid_step scale (2 or 4), the mask computed at full
+# resolution only in windows around them; 1 for full resolution everywhere (the scheduler still uses 1/2 when behind)
+pyramid_step = 1
 
 # Sorting function
 def natural_sort_key(s):
@@ -72,10 +118,10 @@ def display_2_images(img1,img2,fig=None,axes=None):
     fig.canvas.draw()
     fig.canvas.flush_events()
 
-# Get the background image by using the median over an interval with spacing
-def create_background(n_interval=720,n_used=10,images=None):
+# Load the depth maps used for the background, spaced over an interval
+def load_background_frames(n_interval=720,n_used=10,images=None):
     """
-    Use existing images to create background image.
+    Read, undistort and scale the n_used frames spread over the last n_interval images.
     24 fps -> 720 for 30 seconds 
     """
     # total interval of frames from which n_used are selected for the background
@@ -94,6 +140,15 @@ def create_background(n_interval=720,n_used=10,images=None):
         img_undistorted = cv2.undistort(img, camera_matrix, distortion_coefficients)
         clipped_depth_map_cor = get_depth_map(img_undistorted,clip=50)
         list_of_depth_maps.append(clipped_depth_map_cor)
+    return list_of_depth_maps
+
+# Get the background image by using the median over an interval with spacing
+def create_background(n_interval=720,n_used=10,images=None):
+    """
+    Use existing images to create background image.
+    24 fps -> 720 for 30 seconds 
+    """
+    list_of_depth_maps = load_background_frames(n_interval=n_interval, n_used=n_used, images=images)
     # calculate background with the median
     running_median = np.median(np.array(list_of_depth_maps), axis=0)
 
@@ -138,18 +193,40 @@ def preprocess_image(image):
     processed_image = remove_low_intensity(er_op_image, relative_threshold=0.25)
     return processed_image
 
-def cluster_depth_map(depth_map):
-    # Reshape depth map for clustering
+# Segmentation backend of cluster_depth_map: 'histogram' (exact 1-D 2-means) or 'kmeans' (sklearn)
+cluster_backend = 'histogram'
+two_means_segmenter = TwoMeansSegmenter()
+
+def cluster_depth_map(depth_map, backend=None, out=None, n_outside=0):
+    # out: optional array the labels are written into (e.g. a preallocated uint8 mask)
+    # n_outside: zeros of the frame not in depth_map (packed windows), counted in the clustering
+    backend = backend or cluster_backend
+    if backend == 'histogram':
+        # Same labels as 2-means, from a histogram of the values, warm-started from the last frame
+        return two_means_segmenter(depth_map, out=out, n_outside=n_outside)
+
+    # imported here so the histogram backend does not pay for the sklearn import
+    from sklearn.cluster import KMeans
+
+    # Reshape depth map for clustering (the n_outside zeros as one weighted sample)
     depth_values = depth_map.reshape(-1, 1)
+    sample_weight = None
+    if n_outside:
+        depth_values = np.append(depth_values, [[0]], axis=0)
+        sample_weight = np.ones(len(depth_values))
+        sample_weight[-1] = n_outside
     
     # Apply K-means clustering
-    kmeans = KMeans(n_clusters=2, random_state=0).fit(depth_values)
-    labels = kmeans.labels_.reshape(depth_map.shape)
+    kmeans = KMeans(n_clusters=2, random_state=0).fit(depth_values, sample_weight=sample_weight)
+    labels = kmeans.labels_[:depth_map.size].reshape(depth_map.shape)
 
     # Ensure the label with the most elements is 0
-    label_counts = np.bincount(labels.flatten())
+    label_counts = np.bincount(kmeans.labels_, weights=sample_weight)
     if label_counts[1] > label_counts[0]:
         labels = 1 - labels  # Swap labels (0 becomes 1, and 1 becomes 0)
+    if out is not None:
+        np.copyto(out, labels, casting='unsafe')
+        return out
     return labels
 
 def find_bounding_box_opencv_from_array(BW_image, plot_bb=False):
@@ -208,21 +285,6 @@ def find_two_bounding_boxes_opencv_from_array(BW_image, plot_bb=False):
 
 
 
-def depth_map_to_point_cloud(depth_map, fx, fy, cx, cy, depth_scale): #, R, t
-    point_cloud = []
-    height, width = depth_map.shape
-    for v in range(height):
-        for u in range(width):
-            if depth_map[v,u] != 0:
-                d = depth_map[v, u] * depth_scale
-                X_c = (u - cx) * d / fx
-                Y_c = (v - cy) * d / fy
-                Z_c = d 
-                camera_point = np.array([X_c, Y_c, Z_c])
-                camera_point = camera_point + [8,8,0]
-                point_cloud.append(camera_point)
-    return np.array(point_cloud)
-
 # def numpy_to_open3d_point_cloud(points):
 #     pc = o3d.geometry.PointCloud()
 #     try:
@@ -363,90 +425,166 @@ def calculate_bbox_angles(bounding_boxes, image, fov_horizontal=108, fov_vertica
 
 
 
+# Models of the processing loop kept from frame to frame, created by create_loop_models
+LoopModels = namedtuple('LoopModels', ['camera_model', 'background_model', 'preprocessor', 'pyramid_detectors',
+                                       'target_tracker'])
+
+
+def create_loop_models(frame_source, from_start=None):
+    # from_start: prime the background from the first frames of the source rather than the last (by default
+    # for a capture file, replayed from its start)
+    if from_start is None:
+        from_start = isinstance(frame_source, CaptureReader)
+
+    # Cached undistortion maps and depth buffers
+    camera_model = CameraModel(camera_matrix, clip=50)
+
+    # Background model: primed once from disk (the start of a replayed capture), then fed with every
+    # processed frame
+    background_model = BackgroundModel(n_interval=120, n_used=10)
+    background_model.prime(camera_model.depth_map(frame_source.read(i))
+                           for i in background_model.prime_positions(len(frame_source), from_start=from_start))
+
+    # Float32 working buffers of the background subtraction, preprocessing and segmentation,
+    # allocated once and overwritten every frame
+    preprocessor = Preprocessor()
+    pyramid_detectors = {}  # coarse-to-fine segmentation by scale, created on first use
+
+    # Kalman tracks of the targets and the windows of the next frame they can be in
+    target_tracker = TargetTracker(max_tracks=max_people)
+    return LoopModels(camera_model, background_model, preprocessor, pyramid_detectors, target_tracker)
+
+
+def process_frame(img, frame_index, models, quality, capture_time, stage_timer):
+    # One iteration of the processing loop up to the tracking, for the frame handed out by the scheduler
+    # (quality and capture_time of the frame): depth map, targets (boxes, angles) and their track ids
+    camera_model, background_model, preprocessor, pyramid_detectors, target_tracker = models
+
+    # Correct distortion and get the depth map in one pass
+    clipped_depth_map_cor = camera_model.depth_map(img)
+    stage_timer.lap('undistort')
+
+    background_model.update(clipped_depth_map_cor, frame_index=frame_index,
+                            stride=background_model.stride * quality.background_stride)
+    background_image = background_model.background
+    windows = target_tracker.windows(capture_time) if roi_tracking else None
+    step = max(pyramid_step, quality.segmentation_step)
+    if windows is None and step > 1:
+        # Whole frame coarse-to-fine: subtraction, cleaning, clustering and labelling at 1/step scale, then
+        # again at full resolution in windows around the regions found (the mask of the targets)
+        if step not in pyramid_detectors:
+            pyramid_detectors[step] = PyramidDetector(preprocessor, cluster_depth_map, step=step,
+                                                      min_area=min_person_area)
+        BW_dm = pyramid_detectors[step](clipped_depth_map_cor, background_image)
+        stage_timer.lap('pyramid')
+    else:
+        # Subtract background: in the windows around the predicted targets (pixels packed), or over the
+        # whole frame
+        if windows is None:
+            bs_human_dm = preprocessor.subtract_background(clipped_depth_map_cor, background_image)
+        else:
+            bs_human_dm = preprocessor.subtract_background_windows(clipped_depth_map_cor, background_image,
+                                                                   windows)
+        stage_timer.lap('background')
+
+        # Clean the depth map
+        if windows is None:
+            cleaned_image = preprocessor.preprocess(bs_human_dm)
+        else:
+            cleaned_image = preprocessor.preprocess_windows(bs_human_dm, windows)
+        stage_timer.lap('preprocess')
+
+        # BW cluster with Kmeans for mask
+        if windows is None:
+            BW_dm = cluster_depth_map(cleaned_image, out=preprocessor.mask)
+        else:
+            BW_dm = cluster_depth_map(cleaned_image, out=preprocessor.packed_mask[:cleaned_image.size],
+                                      n_outside=preprocessor.mask.size - cleaned_image.size)
+            BW_dm = preprocessor.unpack_mask(BW_dm, windows)
+        stage_timer.lap('cluster')
+
+    # Get bounding box
+    components = find_components(BW_dm, min_area=min_person_area, max_targets=max_people,
+                                 out=preprocessor.labels)
+    bbox_opencv, bbox_areas = components.boxes, components.areas
+    stage_timer.lap('contours')
+
+    # Get angles of the targets
+    if angle_model == 'bbox':
+        angles_list = bbox_angles(bbox_opencv, BW_dm.shape, fov_horizontal=108, fov_vertical=78)
+    else:
+        angles_list = target_angles(components, camera_model,
+                                    clipped_depth_map_cor if angle_model == 'centroid' else None)
+    stage_timer.lap('angles')
+
+    # Continue the tracks of the targets (track id of each box, and windows of the next frame)
+    track_ids = target_tracker.update(bbox_opencv, angles_list, capture_time) if roi_tracking else []
+    stage_timer.lap('tracking')
+    return clipped_depth_map_cor, bbox_opencv, angles_list, track_ids
+
+
 def process_images(fx, fy, cx, cy, csv_filename):
     processing_idx = 0
-    fig, axes = plt.subplots(1, 2, figsize=(10, 5))
+    # Frame, depth map and targets; decoupled from the processing rate
+    display = TrackingDisplay(display_mode, max_targets=max(max_people, 2), max_fps=display_fps, cmap=custom_cmap)
     
     # Open CSV file to store bounding box and angle data
     with open(csv_filename, mode='a', newline='') as file:
         writer = csv.writer(file)
-        writer.writerow(['timestamp',
-                         'x_1', 'y_1', 'w_1', 'h_1', 'angle_hor_1', 'angle_ver_1', 
-                         'x_2', 'y_2', 'w_2', 'h_2', 'angle_hor_2', 'angle_ver_2'])  # CSV headers
+        csv_slots = max(max_people, 2)
+        writer.writerow(tracking_csv_header(csv_slots))  # CSV headers: timestamp, x_1 .. angle_ver_1, x_2 ...
         # x,y: coordinates of bottom left corner of bounding box
         # w,h: the width and height of the boxes
         # angle_hor,angle_ver: horizontal and vertical angles of centre of a box
         # calculate: w x h = area, 2w + 2h = circumference, (x+w/2,y+h/2) = (x,y)_centre
+
+        # Sequence-ordered index of the completely written frames in the camera folder,
+        # or replay of a capture file recorded with capture_file.CaptureWriter
+        if camera_folder.endswith(CAPTURE_EXTENSION):
+            frame_source = CaptureReader(camera_folder, replay_speed=1.0)
+        else:
+            frame_source = FrameSource(camera_folder, camera_matrix=camera_matrix)
+
+        # Camera model, background model, preprocessing buffers and target tracks (see process_frame)
+        models = create_loop_models(frame_source)
+
+        # Latency of each stage of the loop (no-op unless profile_stages)
+        stage_timer = StageTimer(enabled=profile_stages, dump_path=stage_latency_file)
+
+        # Newest frame only, with the quality lowered to hold target_latency (counts of processed, dropped,
+        # stale and degraded frames in scheduler.counters, and in the stage latency file)
+        scheduler = FrameScheduler(target_latency=target_latency, stage_timer=stage_timer)
+
         while True:
-            # List all files in the camera folder
-            images = sorted(os.listdir(camera_folder), key=natural_sort_key)
-            
-            # Load last image and correct distortion
-            img = cv2.imread(camera_folder + images[-1], cv2.IMREAD_UNCHANGED)
-            distortion_coefficients = np.array([-0.01, -0.0, -0.0, -0.0, -0.01], dtype=np.float64)
-            
-            try:
-                img_undistorted = cv2.undistort(img, camera_matrix, distortion_coefficients)
-            except:
-                img = cv2.imread(camera_folder + images[-2], cv2.IMREAD_UNCHANGED)
-                img_undistorted = cv2.undistort(img, camera_matrix, distortion_coefficients)
-            
-            # Get depth map from corrected image
-            clipped_depth_map_cor = get_depth_map(img_undistorted, clip=50)
-            
-            # Subtract background
-            background_image = create_background(n_interval=120, n_used=10, images=images)
-            bs_human_dm = -(clipped_depth_map_cor - background_image)
-            
-            # Clean the depth map
-            cleaned_image = preprocess_image(bs_human_dm)
-            
-            # BW cluster with Kmeans for mask
-            BW_dm = cluster_depth_map(cleaned_image)
-            
-            # Get bounding box
-            bbox_opencv, bbox_areas = find_two_bounding_boxes_opencv_from_array(BW_dm, plot_bb=False)
-            
-            # Get angles of bounding box centers
-            angles_list = calculate_bbox_angles(bbox_opencv, BW_dm, fov_horizontal=108, fov_vertical=78)
-            
-            # Plot the image with custom colormap
-            axes[0].cla()  # Clear the first axis
-            axes[1].cla()  # Clear the second axis
-            axes[0].imshow(img, cmap='Greys')
-            im0 = axes[1].imshow(clipped_depth_map_cor, cmap=custom_cmap, vmin=0, vmax=10)
-            
-            if processing_idx == 0:
-                fig.colorbar(im0, label='Depth (meter)', pad=.05, fraction=0.034)
-            
-            for x, y, w, h in bbox_opencv:
-                p = plt.Rectangle((x, y), w, h, fill=False, color='white')
-                axes[1].add_patch(p)
-            
-            for i, (angle_hor, angle_ver) in enumerate(angles_list):
-                text_str = f'horizontal: {angle_hor:.2f}$^\circ$\nvertical: {angle_ver:.2f}$^\circ$'
-                axes[1].text(bbox_opencv[i][0], bbox_opencv[i][1] - 10, text_str, color='white', fontsize=10,
-                             ha='right', va='bottom', bbox=dict(facecolor='black', alpha=0.5, pad=5))
-            
+            stage_timer.start()
+            # Pick up the frames written since the last iteration
+            frame_source.refresh()
+            latest_frame = scheduler.next_frame(frame_source)
+            if latest_frame is None:
+                scheduler.wait()
+                continue
+            frame_index, img = latest_frame
+            quality = scheduler.quality
+            stage_timer.lap('read')
+
+            # Depth map, targets and their tracks
+            clipped_depth_map_cor, bbox_opencv, angles_list, track_ids = process_frame(
+                img, frame_index, models, quality, scheduler.capture_time, stage_timer)
+
             # Save bounding box data and angles to CSV file
-            # If there are less than two bounding boxes, fill with placeholder values (e.g., None)
+            # If there are less bounding boxes than slots, fill with placeholder values (e.g., None)
             current_timestamp = datetime.now().strftime("%d-%m-%y %H:%M:%S")
-            bbox_data = [current_timestamp]
-            for i in range(2):
-                if i < len(bbox_opencv):
-                    x, y, w, h = bbox_opencv[i]
-                    angle_hor, angle_ver = angles_list[i]
-                    bbox_data.extend([x, y, w, h, angle_hor, angle_ver])
-                else:
-                    bbox_data.extend([None, None, None, None, None, None])
-            
+            bbox_data = tracking_csv_row(current_timestamp, bbox_opencv, angles_list, csv_slots)
             writer.writerow(bbox_data)
+            stage_timer.lap('csv')
             
-            # Redraw the updated plot
-            fig.canvas.draw()
-            fig.canvas.flush_events()
+            # Plot the image with custom colormap (only when a refresh is due; never when headless or behind)
+            if quality.display:
+                display.update(img, clipped_depth_map_cor, bbox_opencv, angles_list)
+            stage_timer.lap('plot')
+            stage_timer.frame_done(frame_index)
+            scheduler.frame_done()
             processing_idx += 1
-            time.sleep(.01)
 
 
 
@@ -0,0 +1,460 @@
+import csv
+import multiprocessing
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from background_model import BackgroundModel
+from beam_selection import BeamSelector
+from camera_model import CameraModel, fov_camera_matrix
+from capture_file import CAPTURE_EXTENSION, CaptureReader
+from detection import bbox_angles, find_components, target_angles, tracking_csv_header, tracking_csv_row
+from frame_ring import FrameRing
+from frame_source import FrameSource
+from preprocessing import Preprocessor
+from pyramid import PyramidDetector
+from ris_link import RisLink
+from segmentation import TwoMeansSegmenter
+from target_tracker import TargetTracker
+from tracking_display import TrackingDisplay
+
+# Stages of the pipeline, one process each, and the counters every stage publishes:
+#   items processed, items skipped (camera frames never picked up, or ring items passed over),
+#   queue depth (items waiting when the stage took its last one), latency from acquisition and
+#   busy time per item in ms (exponential moving averages)
+STAGES = ['source', 'tracking', 'actuation', 'logging']
+STAT_FIELDS = ['items', 'skipped', 'queue', 'latency_ms', 'busy_ms']
+# Weight of the newest value in the moving averages
+EMA_WEIGHT = 0.1
+
+
+def result_dtype(max_targets):
+    """
+    Record of the tracking results of a frame: camera frame number, number of targets,
+    their boxes (x, y, w, h), angles (horizontal, vertical) and angular velocities
+    in degrees per second (0 unless tracked), largest first.
+    """
+    return np.dtype([('frame', '<i8'), ('n', '<i8'), ('boxes', '<i4', (max_targets, 4)),
+                     ('angles', '<f8', (max_targets, 2)), ('rates', '<f8', (max_targets, 2))])
+
+
+def open_source(source, camera_matrix, replay_speed=None):
+    """
+    CaptureReader of a capture file (replayed at replay_speed), or FrameSource of a camera folder.
+    """
+    if source.endswith(CAPTURE_EXTENSION):
+        return CaptureReader(source, replay_speed=replay_speed)
+    return FrameSource(source, camera_matrix=camera_matrix)
+
+
+class _StageStats:
+    # Row of a stage in the shared statistics array; written by that stage only
+
+    def __init__(self, shared, stage):
+        self.row = np.frombuffer(shared, dtype=np.float64).reshape(len(STAGES), len(STAT_FIELDS))[STAGES.index(stage)]
+
+    def item_done(self, skipped=0, queue=0, acquired=None, started=None):
+        now = time.perf_counter()
+        row = self.row
+        first = row[0] == 0
+        row[1] += skipped
+        for field, value in ((2, queue), (3, None if acquired is None else (now - acquired) * 1e3),
+                             (4, None if started is None else (now - started) * 1e3)):
+            if value is not None:
+                row[field] = value if first else row[field] + EMA_WEIGHT * (value - row[field])
+        row[0] += 1
+
+    def skip(self, n):
+        self.row[1] += n
+
+
+def _wait_ready(ready):
+    # start together once every stage is set up; False if another stage failed to start
+    try:
+        ready.wait()
+        return True
+    except threading.BrokenBarrierError:
+        return False
+
+
+class Tracker:
+    """
+    The imaging stages of the processing loop for one raw frame: depth map,
+    background model, preprocessing, segmentation, components and angles,
+    written into a result record (see result_dtype).
+
+    Args:
+        camera_matrix (numpy.ndarray): 3x3 intrinsic matrix.
+        max_people (int): Number of targets kept.
+        min_person_area (int): Smallest region counted as a target, in pixels.
+        angle_model (str): 'centroid', 'mean' or 'bbox' (see the processing scripts).
+        n_interval, n_used (int): Background model span and number of frames.
+        roi_tracking (bool): Process the windows around the targets predicted by a TargetTracker,
+            with periodic sweeps of the whole frame.
+        pyramid_step (int): Segment whole frames coarse-to-fine at 1/pyramid_step scale (see
+            pyramid.PyramidDetector); 1 for full resolution.
+    """
+
+    def __init__(self, camera_matrix, max_people=2, min_person_area=0, angle_model='centroid', n_interval=120,
+                 n_used=10, roi_tracking=True, pyramid_step=1):
+        self.camera_model = CameraModel(camera_matrix, clip=50)
+        self.background_model = BackgroundModel(n_interval=n_interval, n_used=n_used)
+        self.preprocessor = Preprocessor()
+        self.segmenter = TwoMeansSegmenter()
+        self.max_people = max_people
+        self.min_person_area = min_person_area
+        self.angle_model = angle_model
+        self.target_tracker = TargetTracker(max_tracks=max_people) if roi_tracking else None
+        self.pyramid_detector = (PyramidDetector(self.preprocessor, self.segmenter, step=pyramid_step,
+                                                 min_area=min_person_area) if pyramid_step > 1 else None)
+        self.depth_map = None  # depth map of the last frame, overwritten by the next one
+
+    def prime(self, frame_source):
+        # a capture file is replayed from its first frame: primed from its start, a camera folder from its end
+        positions = self.background_model.prime_positions(len(frame_source),
+                                                          from_start=isinstance(frame_source, CaptureReader))
+        self.background_model.prime(self.camera_model.depth_map(frame_source.read(i)) for i in positions)
+
+    def __call__(self, img, frame_index, record, timestamp=None):
+        # timestamp: acquisition time of the frame (time.perf_counter() when it is processed by default)
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        depth_map = self.depth_map = self.camera_model.depth_map(img)
+        self.background_model.update(depth_map, frame_index=frame_index)
+        background = self.background_model.background
+        preprocessor = self.preprocessor
+        windows = None if self.target_tracker is None else self.target_tracker.windows(timestamp)
+        if windows is None and self.pyramid_detector is not None:
+            BW_dm = self.pyramid_detector(depth_map, background)
+        elif windows is None:
+            BW_dm = self.segmenter(preprocessor(depth_map, background), out=preprocessor.mask)
+        else:
+            foreground = preprocessor.subtract_background_windows(depth_map, background, windows)
+            cleaned_image = preprocessor.preprocess_windows(foreground, windows)
+            labels = self.segmenter(cleaned_image, out=preprocessor.packed_mask[:cleaned_image.size],
+                                    n_outside=preprocessor.mask.size - cleaned_image.size)
+            BW_dm = preprocessor.unpack_mask(labels, windows)
+        components = find_components(BW_dm, min_area=self.min_person_area, max_targets=self.max_people,
+                                     out=self.preprocessor.labels)
+        if self.angle_model == 'bbox':
+            angles = bbox_angles(components.boxes, BW_dm.shape)
+        else:
+            angles = target_angles(components, self.camera_model,
+                                   depth_map if self.angle_model == 'centroid' else None)
+        n = len(components.ids)
+        record['frame'] = frame_index
+        record['n'] = n
+        record['boxes'][:n] = components.boxes
+        record['angles'][:n] = angles
+        record['rates'][:n] = 0
+        if self.target_tracker is not None:
+            ids = self.target_tracker.update(components.boxes, angles, timestamp)
+            tracked = ids >= 0
+            record['rates'][:n][tracked] = self.target_tracker.angle_rates(ids[tracked])
+        return record
+
+
+def source_stage(source, frames, shared_stats, stop, ready, camera_matrix=None, replay_speed=1.0, until_end=False):
+    """
+    Acquisition process: hands every new frame of the source to the frame ring,
+    tagged with its camera frame number and stamped with the time it was picked up.
+    With until_end, stops after the last frame of a capture file.
+    """
+    stats = _StageStats(shared_stats, 'source')
+    frame_source = open_source(source, camera_matrix, replay_speed)
+    last_index = None
+    try:
+        # the replay clock starts with the first latest_frame(), once the consumers are ready
+        if not _wait_ready(ready):
+            return
+        while not stop.is_set():
+            frame_source.refresh()
+            latest_frame = frame_source.latest_frame()
+            if latest_frame is None or latest_frame[0] == last_index:
+                if until_end and last_index is not None and isinstance(frame_source, CaptureReader) \
+                        and last_index == frame_source.sequences[-1]:
+                    break
+                time.sleep(.001)
+                continue
+            started = time.perf_counter()
+            frame_index, img = latest_frame
+            frames.write(img, tag=frame_index, timestamp=started)
+            stats.item_done(skipped=0 if last_index is None else max(frame_index - last_index - 1, 0),
+                            started=started)
+            last_index = frame_index
+    finally:
+        frames.close_writer()
+        frame_source.close()
+        frames.close()
+
+
+def tracking_stage(source, frames, results, depth_maps, shared_stats, stop, ready, camera_matrix, **tracker_args):
+    """
+    Processing process: runs the Tracker on the newest frame of the frame ring
+    (older ones are skipped) and publishes the result record, and the depth map
+    for the display if depth_maps is a ring.
+    """
+    stats = _StageStats(shared_stats, 'tracking')
+    tracker = Tracker(camera_matrix, **tracker_args)
+    # Background primed from the frames already in the source, as the processing scripts do
+    frame_source = open_source(source, camera_matrix)
+    tracker.prime(frame_source)
+    frame_source.close()
+    img = np.empty(frames.shape, dtype=frames.dtype)
+    seq = -1
+    try:
+        if not _wait_ready(ready):
+            return
+        while not stop.is_set():
+            latest = frames.wait_latest(img, after=seq, timeout=0.1)
+            if latest is None:
+                if frames.closed:
+                    break
+                continue
+            started = time.perf_counter()
+            queue = frames.last_seq - seq
+            new_seq, frame_index, acquired = latest
+            record = results.claim()
+            record['n'] = 0
+            tracker(img, frame_index, record, timestamp=acquired)
+            results.publish(tag=frame_index, timestamp=acquired)
+            if depth_maps is not None:
+                depth_maps.write(tracker.depth_map, tag=frame_index, timestamp=acquired)
+            stats.item_done(skipped=new_seq - seq - 1, queue=queue, acquired=acquired, started=started)
+            seq = new_seq
+    finally:
+        results.close_writer()
+        if depth_maps is not None:
+            depth_maps.close_writer()
+            depth_maps.close()
+        results.close()
+        frames.close()
+
+
+def actuation_stage(results, shared_stats, stop, ready, port='COM5', baudrate=115200):
+    """
+    Actuation process: steers the RIS to the largest target of the newest result,
+    at the angles extrapolated from the acquisition of its frame to now.
+    """
+    stats = _StageStats(shared_stats, 'actuation')
+    ris_link = RisLink(port, baudrate=baudrate, hysteresis=1)
+    beam_selector = BeamSelector(hysteresis=1.0, dwell=3)
+    record = np.zeros((), dtype=results.dtype)
+    seq = -1
+    try:
+        if not _wait_ready(ready):
+            return
+        while not stop.is_set():
+            latest = results.wait_latest(record, after=seq, timeout=0.1)
+            if latest is None:
+                if results.closed:
+                    break
+                continue
+            started = time.perf_counter()
+            queue = results.last_seq - seq
+            new_seq, frame_index, acquired = latest
+            if record['n']:
+                angle_hor, angle_ver = (record['angles'][0] + record['rates'][0] * (started - acquired)).tolist()
+                ris_link.send_index(beam_selector.select_camera(angle_hor, angle_ver))
+            stats.item_done(skipped=new_seq - seq - 1, queue=queue, acquired=acquired, started=started)
+            seq = new_seq
+    finally:
+        ris_link.flush()
+        ris_link.close()
+        results.close()
+
+
+def logging_stage(results, depth_maps, shared_stats, stop, ready, csv_filename=None, csv_slots=2, display_fps=10):
+    """
+    Logging and display process: writes a CSV row for every result still held
+    in the ring (results overwritten before they were read count as skipped)
+    and, if depth_maps is a ring, shows the newest depth map at most
+    display_fps times per second.
+    """
+    stats = _StageStats(shared_stats, 'logging')
+    record = np.zeros((), dtype=results.dtype)
+    display = None
+    if depth_maps is not None:
+        display = TrackingDisplay('blit', max_targets=results.dtype['boxes'].shape[0], max_fps=display_fps,
+                                  shape=depth_maps.shape, show_frame=False)
+    depth_map = None if display is None else np.zeros(depth_maps.shape, dtype=depth_maps.dtype)
+    file = open(csv_filename, mode='a', newline='') if csv_filename else None
+    writer = None
+    if file is not None:
+        writer = csv.writer(file)
+        writer.writerow(tracking_csv_header(csv_slots))
+    next_seq = 0
+    try:
+        if not _wait_ready(ready):
+            return
+        while not stop.is_set():
+            last_seq = results.last_seq
+            if last_seq < next_seq:
+                if results.closed:
+                    break
+                time.sleep(.001)
+                continue
+            started = time.perf_counter()
+            queue = last_seq - next_seq + 1
+            # the oldest results may already be overwritten
+            lost = max(last_seq - len(results) + 1 - next_seq, 0)
+            next_seq += lost
+            latest = results.read(next_seq, record)
+            next_seq += 1
+            if latest is None:
+                stats.skip(lost + 1)  # overwritten while it was read
+                continue
+            frame_index, acquired = latest
+            n = int(record['n'])
+            if writer is not None:
+                current_timestamp = datetime.now().strftime("%d-%m-%y %H:%M:%S")
+                writer.writerow(tracking_csv_row(current_timestamp, record['boxes'][:n], record['angles'][:n],
+                                                 csv_slots))
+            # the display only refreshes once the CSV caught up, so it cannot make rows get lost
+            if display is not None and next_seq > results.last_seq and display.due() \
+                    and depth_maps.read_latest(depth_map) is not None:
+                display.update(None, depth_map, record['boxes'][:n], record['angles'][:n])
+            stats.item_done(skipped=lost, queue=queue, acquired=acquired, started=started)
+    finally:
+        if file is not None:
+            file.close()
+        if display is not None:
+            display.close()
+            depth_maps.close()
+        results.close()
+
+
+def format_stats(stats, fps):
+    """
+    Table of the per-stage statistics (see pipeline_stats).
+    """
+    lines = [f'{"stage":<10s} {"fps":>6s} {"items":>7s} {"skipped":>8s} {"queue":>6s} {"latency ms":>11s} '
+             f'{"busy ms":>8s}']
+    for stage, row, stage_fps in zip(STAGES, stats, fps):
+        items, skipped, queue, latency, busy = row.tolist()
+        lines.append(f'{stage:<10s} {stage_fps:6.1f} {items:7.0f} {skipped:8.0f} {queue:6.2f} {latency:11.1f} '
+                     f'{busy:8.2f}')
+    return '\n'.join(lines)
+
+
+def run_pipeline(source, camera_matrix=None, csv_filename=None, port='COM5', display=False, display_fps=10,
+                 max_people=2, min_person_area=0, angle_model='centroid', roi_tracking=True, pyramid_step=1,
+                 replay_speed=1.0, until_end=False, duration=None, n_slots=4, report_interval=2.0, report=print):
+    """
+    Run the acquisition -> tracking -> actuation and logging stages in four
+    processes connected by shared memory rings (see frame_ring.FrameRing).
+
+    Frames and depth maps go through rings of n_slots slots and every consumer
+    takes the newest item, so a stage that falls behind skips frames instead of
+    building a backlog, and a slow display never holds up tracking; the result
+    records are held in a longer ring so the CSV gets every frame processed.
+
+    Args:
+        source (str): Camera folder or capture file (.fdcap).
+        camera_matrix (numpy.ndarray): 3x3 intrinsic matrix; None for the 108 x 78 degree camera.
+        csv_filename (str): Tracking CSV appended to; None for no CSV.
+        port (str): Serial port of the RIS controller ('loop://' for none).
+        display (bool): Show the depth map and the targets.
+        display_fps (float): Largest display refresh rate.
+        roi_tracking (bool): Track the targets in windows around their predicted boxes (see Tracker).
+        pyramid_step (int): Segment whole frames coarse-to-fine at 1/pyramid_step scale (see Tracker).
+        replay_speed (float): Replay speed of a capture file.
+        until_end (bool): Stop after the last frame of a capture file.
+        duration (float): Stop after this many seconds; None to run until interrupted or until_end.
+        n_slots (int): Slots of the frame and depth map rings.
+        report_interval (float): Seconds between two statistics tables passed to report (None: no reports).
+
+    Returns:
+        tuple: Per-stage statistics (len(STAGES), len(STAT_FIELDS)) and average fps of each stage.
+    """
+    if camera_matrix is None:
+        camera_matrix = fov_camera_matrix()
+    frame_source = open_source(source, camera_matrix)
+    frame_shape = np.shape(frame_source.read(0)) if len(frame_source) else (480, 640)
+    frame_source.close()
+    frames = FrameRing(frame_shape, np.uint16, n_slots)
+    results = FrameRing((), result_dtype(max_people), max(64, n_slots))
+    depth_maps = FrameRing(frame_shape, np.float32, n_slots) if display else None
+    shared_stats = multiprocessing.RawArray('d', len(STAGES) * len(STAT_FIELDS))
+    stats = np.frombuffer(shared_stats, dtype=np.float64).reshape(len(STAGES), len(STAT_FIELDS))
+    stop = multiprocessing.Event()
+    ready = multiprocessing.Barrier(len(STAGES))
+    processes = [
+        multiprocessing.Process(target=source_stage, name='source', args=(source, frames, shared_stats, stop, ready),
+                                kwargs=dict(camera_matrix=camera_matrix, replay_speed=replay_speed,
+                                            until_end=until_end)),
+        multiprocessing.Process(target=tracking_stage, name='tracking',
+                                args=(source, frames, results, depth_maps, shared_stats, stop, ready, camera_matrix),
+                                kwargs=dict(max_people=max_people, min_person_area=min_person_area,
+                                            angle_model=angle_model, roi_tracking=roi_tracking,
+                                            pyramid_step=pyramid_step)),
+        multiprocessing.Process(target=actuation_stage, name='actuation', args=(results, shared_stats, stop, ready),
+                                kwargs=dict(port=port)),
+        multiprocessing.Process(target=logging_stage, name='logging',
+                                args=(results, depth_maps, shared_stats, stop, ready),
+                                kwargs=dict(csv_filename=csv_filename, csv_slots=max(max_people, 2),
+                                            display_fps=display_fps)),
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    first_items = np.zeros(len(STAGES))  # items and time when each stage got its first one, for the average fps
+    first_times = np.full(len(STAGES), np.nan)
+    last_items, last_report = stats[:, 0].copy(), start
+    try:
+        while any(process.is_alive() for process in processes):
+            time.sleep(0.05)
+            now = time.perf_counter()
+            started = np.isnan(first_times) & (stats[:, 0] > 0)
+            first_items[started], first_times[started] = stats[started, 0], now
+            if duration is not None and now - start >= duration:
+                stop.set()
+            if any(process.exitcode for process in processes):
+                # a stage failed: the others stop instead of waiting for it
+                ready.abort()
+                stop.set()
+            if report is not None and report_interval and now - last_report >= report_interval:
+                report(format_stats(stats, (stats[:, 0] - last_items) / (now - last_report)))
+                last_items, last_report = stats[:, 0].copy(), now
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+        end_times = np.where(np.isnan(first_times), np.inf, time.perf_counter() - first_times)
+        fps = (stats[:, 0] - first_items) / end_times
+        result = stats.copy(), fps
+        if report is not None:
+            report(format_stats(*result))
+        frames.close()
+        results.close()
+        if depth_maps is not None:
+            depth_maps.close()
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Multi-process tracking pipeline (acquisition, tracking, '
+                                                 'actuation, logging/display).')
+    parser.add_argument('source', help='camera folder or capture file (.fdcap)')
+    parser.add_argument('--csv', help='tracking CSV appended to')
+    parser.add_argument('--port', default='COM5', help="serial port of the RIS controller ('loop://' for none)")
+    parser.add_argument('--display', action='store_true')
+    parser.add_argument('--display-fps', type=float, default=10)
+    parser.add_argument('--people', type=int, default=2)
+    parser.add_argument('--full-frame', action='store_true', help='process whole frames, without ROI tracking')
+    parser.add_argument('--pyramid', type=int, default=1, choices=(1, 2, 4),
+                        help='segment whole frames coarse-to-fine at 1/PYRAMID scale')
+    parser.add_argument('--replay-speed', type=float, default=1.0)
+    parser.add_argument('--until-end', action='store_true', help='stop after the last frame of a capture file')
+    parser.add_argument('--duration', type=float)
+    args = parser.parse_args()
+    run_pipeline(args.source, csv_filename=args.csv, port=args.port, display=args.display,
+                 display_fps=args.display_fps, max_people=args.people, replay_speed=args.replay_speed,
+                 roi_tracking=not args.full_frame, pyramid_step=args.pyramid, until_end=args.until_end,
+                 duration=args.duration)
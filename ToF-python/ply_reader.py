@@ -0,0 +1,128 @@
+from collections import namedtuple
+
+import numpy as np
+
+# PLY property types and their NumPy equivalents
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+PLY_BYTE_ORDER = {'binary_little_endian': '<', 'binary_big_endian': '>'}
+
+# Lucid Helios PLY files store x, y, z in millimeters (0.25 mm steps), x and y shifted by 8192 mm
+HELIOS_XY_OFFSET = 8192.0
+HELIOS_Z_STEP = 0.25
+
+PlyHeader = namedtuple('PlyHeader', ['format', 'n_vertices', 'dtype', 'data_offset'])
+
+
+def read_ply_header(path):
+    """
+    Parse the header of a binary PLY file.
+
+    Returns:
+        PlyHeader: format, number of vertices, structured dtype of a vertex and
+        byte offset of the vertex block in the file.
+    """
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f'{path} is not a PLY file')
+        ply_format, n_vertices, properties = None, None, []
+        element = None
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f'{path}: end_header not found')
+            words = line.decode('ascii').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            if words[0] == 'end_header':
+                break
+            if words[0] == 'format':
+                ply_format = words[1]
+            elif words[0] == 'element':
+                element = words[1]
+                if element == 'vertex':
+                    n_vertices = int(words[2])
+                elif n_vertices is None:
+                    raise ValueError(f'{path}: vertex must be the first element')
+            elif words[0] == 'property' and element == 'vertex':
+                if words[1] == 'list':
+                    raise ValueError(f'{path}: list properties are not supported for vertices')
+                properties.append((words[2], PLY_TYPES[words[1]]))
+        data_offset = f.tell()
+    if ply_format not in PLY_BYTE_ORDER:
+        raise ValueError(f'{path}: unsupported PLY format {ply_format!r}, binary expected')
+    byte_order = PLY_BYTE_ORDER[ply_format]
+    dtype = np.dtype([(name, byte_order + code) for name, code in properties])
+    return PlyHeader(ply_format, n_vertices, dtype, data_offset)
+
+
+def load_ply(path, header=None):
+    """
+    Vertices of a binary PLY file as a read-only structured array memory-mapped
+    on the file (no copy; fields 'x', 'y', 'z', ... as in the header).
+    """
+    if header is None:
+        header = read_ply_header(path)
+    return np.memmap(path, dtype=header.dtype, mode='r', offset=header.data_offset,
+                     shape=(header.n_vertices,))
+
+
+def iter_ply_chunks(path, chunk_size=65536, header=None):
+    """
+    Stream the vertices of a binary PLY file in structured arrays of at most chunk_size vertices.
+    """
+    if header is None:
+        header = read_ply_header(path)
+    with open(path, 'rb') as f:
+        f.seek(header.data_offset)
+        remaining = header.n_vertices
+        while remaining > 0:
+            chunk = np.fromfile(f, dtype=header.dtype, count=min(chunk_size, remaining))
+            if len(chunk) == 0:
+                raise ValueError(f'{path}: file ends {remaining} vertices early')
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ply_to_depth_image(vertices, fx, fy, cx, cy, shape=(480, 640), xy_offset=HELIOS_XY_OFFSET,
+                       z_step=HELIOS_Z_STEP, out=None):
+    """
+    Rasterise PLY vertices back into a raw uint16 depth image usable by get_depth_map.
+
+    The points are projected with the pinhole model; where several points fall on
+    the same pixel, the nearest one is kept. Pixels without a point are 0.
+
+    Args:
+        vertices (numpy.ndarray): Structured array with 'x', 'y', 'z' fields (e.g. from load_ply).
+        fx, fy, cx, cy (float): Camera intrinsics in pixels.
+        shape (tuple): Image shape (height, width).
+        xy_offset (float): Offset subtracted from x and y.
+        z_step (float): Size of one raw depth unit in the units of z.
+        out (numpy.ndarray): Optional uint16 output image.
+
+    Returns:
+        numpy.ndarray: Raw depth image (z / z_step), uint16.
+    """
+    height, width = shape
+    z = np.asarray(vertices['z'], dtype=np.float32)
+    valid = z > 0
+    z = z[valid]
+    x = vertices['x'][valid] - np.float32(xy_offset)
+    y = vertices['y'][valid] - np.float32(xy_offset)
+    u = np.rint(x / z * fx + cx).astype(np.intp)
+    v = np.rint(y / z * fy + cy).astype(np.intp)
+    inside = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+    raw = np.minimum(np.rint(z[inside] / z_step), 65534).astype(np.uint16)
+
+    if out is None:
+        out = np.empty(shape, dtype=np.uint16)
+    flat = out.reshape(-1)
+    # z-buffer: keep the smallest depth per pixel, 65535 marks empty pixels
+    flat.fill(65535)
+    np.minimum.at(flat, v[inside] * width + u[inside], raw)
+    flat[flat == 65535] = 0
+    return out
@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+
+
+class Preprocessor:
+    """
+    Background subtraction, opening and low-intensity removal of the
+    processing loop on float32 buffers allocated once.
+
+    Same results as -(depth_map - background) followed by preprocess_image
+    (apply_opening, then remove_low_intensity), but every stage writes into a
+    buffer owned by the preprocessor: np.subtract with out=, cv2.erode and
+    cv2.dilate with dst=, and the relative threshold applied in place. The
+    uint8 `mask` buffer is there for the segmentation labels (see
+    TwoMeansSegmenter.fit_labels), and `labels` for find_components.
+    The returned arrays are overwritten by the next frame.
+
+    The *_windows methods run the same stages on windows (x, y, w, h) of the
+    depth maps only, e.g. around the targets predicted by a TargetTracker. The
+    windows are processed into consecutive parts of the buffers and handed
+    over packed, as a 1-D array of their pixels (window by window, row by
+    row), which is what the segmentation needs; unpack_mask() puts the labels
+    back in place. Erosion and dilation treat the window edges as image
+    borders, so the windows need a margin around the targets.
+
+    Args:
+        shape (tuple): Shape of the depth maps (height, width).
+        kernel_size (int): Size of the square structuring element of the opening.
+        er_it (int): Erosion iterations.
+        op_it (int): Dilation iterations.
+        relative_threshold (float): Fraction of the maximum below which values are removed.
+    """
+
+    def __init__(self, shape=(480, 640), kernel_size=3, er_it=2, op_it=2, relative_threshold=0.25):
+        self.shape = tuple(shape)
+        self.kernel_size = kernel_size
+        self.kernel = np.ones((kernel_size, kernel_size), np.uint8)
+        self.er_it = er_it
+        self.op_it = op_it
+        self.relative_threshold = relative_threshold
+        self._foreground = np.empty(self.shape, dtype=np.float32)
+        self._eroded = np.empty(self.shape, dtype=np.float32)
+        self._opened = np.empty(self.shape, dtype=np.float32)
+        self._low = np.empty(self.shape, dtype=bool)
+        self.mask = np.empty(self.shape, dtype=np.uint8)
+        self.labels = np.empty(self.shape, dtype=np.int32)
+        self.packed_mask = np.empty(self.mask.size, dtype=np.uint8)  # labels of packed windows
+        self._downsampled = {}
+
+    def subtract_background(self, depth_map, background):
+        """
+        -(depth_map - background): how far in front of the background each pixel is.
+        """
+        return np.subtract(background, depth_map, out=self._foreground, casting='unsafe')
+
+    def preprocess(self, image):
+        """
+        preprocess_image(image) into the preprocessor's buffers.
+        """
+        cv2.erode(image, self.kernel, dst=self._eroded, iterations=self.er_it)
+        cv2.dilate(self._eroded, self.kernel, dst=self._opened, iterations=self.op_it)
+        return self._remove_low_intensity(self._opened, self._low)
+
+    def _remove_low_intensity(self, opened, low):
+        # remove_low_intensity, with the same divide/compare/multiply so the values are unchanged
+        if opened.size == 0:
+            return opened  # no window
+        im_max = opened.max()
+        if im_max <= 0:
+            # nothing in front of the background (e.g. an empty window): all removed, rather than 0 / 0
+            opened.fill(0)
+            return opened
+        np.divide(opened, im_max, out=opened)
+        np.less(opened, self.relative_threshold, out=low)
+        np.putmask(opened, low, 0)
+        np.multiply(opened, im_max, out=opened)
+        return opened
+
+    @staticmethod
+    def _packed(buffer, windows):
+        # consecutive (h, w) parts of a buffer, one per window
+        flat = buffer.reshape(-1)
+        offset = 0
+        for x, y, w, h in windows:
+            yield np.s_[y:y + h, x:x + w], flat[offset:offset + w * h].reshape(h, w)
+            offset += w * h
+
+    def subtract_background_windows(self, depth_map, background, windows):
+        """
+        subtract_background() on windows of the depth maps, packed.
+        """
+        for window, foreground in self._packed(self._foreground, windows):
+            np.subtract(background[window], depth_map[window], out=foreground, casting='unsafe')
+        return self._foreground.reshape(-1)[:sum(w * h for _, _, w, h in windows)]
+
+    def preprocess_windows(self, packed, windows):
+        """
+        preprocess() of packed windows: opening of each window, low-intensity
+        removal relative to the maximum over all of them. Packed.
+        """
+        for (_, eroded), (_, opened), (_, image) in zip(self._packed(self._eroded, windows),
+                                                        self._packed(self._opened, windows),
+                                                        self._packed(packed, windows)):
+            cv2.erode(image, self.kernel, dst=eroded, iterations=self.er_it)
+            cv2.dilate(eroded, self.kernel, dst=opened, iterations=self.op_it)
+        return self._remove_low_intensity(self._opened.reshape(-1)[:packed.size], self._low.reshape(-1)[:packed.size])
+
+    def unpack_mask(self, packed, windows):
+        """
+        Packed window labels back in their windows of `mask`, 0 elsewhere.
+        """
+        self.mask.fill(0)
+        for window, labels in self._packed(packed, windows):
+            self.mask[window] = labels
+        return self.mask
+
+    def downsampled(self, step):
+        """
+        Preprocessor with the same parameters for every step-th pixel of every
+        step-th row of the depth maps (depth_map[::step, ::step]), created on
+        first use; the preprocessor itself for step 1.
+        """
+        if step == 1:
+            return self
+        if step not in self._downsampled:
+            height, width = self.shape
+            self._downsampled[step] = Preprocessor((-(-height // step), -(-width // step)), self.kernel_size,
+                                                   self.er_it, self.op_it, self.relative_threshold)
+        return self._downsampled[step]
+
+    def upsample(self, mask):
+        """
+        Mask of a downsampled() preprocessor back at full size (nearest neighbour), written into `mask`.
+        """
+        return cv2.resize(mask, self.shape[::-1], dst=self.mask, interpolation=cv2.INTER_NEAREST)
+
+    def __call__(self, depth_map, background):
+        return self.preprocess(self.subtract_background(depth_map, background))
@@ -0,0 +1,110 @@
+import numpy as np
+
+from detection import find_components
+from preprocessing import Preprocessor
+from target_tracker import merge_windows
+
+
+class PyramidDetector:
+    """
+    Coarse-to-fine segmentation of a frame: the targets are found on a
+    subsampled frame, and the mask is computed at full resolution only in
+    windows around them.
+
+    Background subtraction, opening, segmentation and labelling first run on
+    every step-th pixel of every step-th row (1/step**2 of the pixels), with
+    the opening iterations divided by step so that it reaches about as far as
+    at full resolution. The coarse boxes, scaled back up and grown by
+    margin_pixels, are the windows in which the full-resolution stages run
+    (the *_windows methods of the Preprocessor, the rest of the frame counted
+    as background by the segmentation), so box edges, areas and centroids are
+    those of the full-resolution mask. The coarse level can miss the thin
+    parts of a target (a partly hidden person): a window with mask pixels on
+    an inner edge is grown on that side by half its size and the
+    full-resolution stages run again, up to max_growth times. A target too
+    small to survive the coarse opening is not found at all.
+
+    Args:
+        preprocessor (Preprocessor): Full-resolution preprocessor; the mask is written into its `mask`.
+        segmenter: Called as segmenter(image, out=labels, n_outside=n) (TwoMeansSegmenter, cluster_depth_map).
+        step (int): Subsampling of the coarse level (2: 1/2 scale, 4: 1/4 scale).
+        min_area (int): Smallest coarse region kept, in full-resolution pixels.
+        margin_pixels (int): Growth of the scaled coarse boxes on every side (default 2 * step + 8).
+        max_growth (int): Rounds of window growth after the first full-resolution pass.
+    """
+
+    def __init__(self, preprocessor, segmenter, step=2, min_area=0, margin_pixels=None, max_growth=3):
+        self.preprocessor = preprocessor
+        self.segmenter = segmenter
+        self.step = step
+        self.min_area = min_area
+        self.margin_pixels = 2 * step + 8 if margin_pixels is None else margin_pixels
+        self.max_growth = max_growth
+        height, width = self.shape = preprocessor.shape
+        self.coarse = Preprocessor((-(-height // step), -(-width // step)), preprocessor.kernel_size,
+                                   max(1, preprocessor.er_it // step), max(1, preprocessor.op_it // step),
+                                   preprocessor.relative_threshold)
+        self.components = None  # coarse components of the last frame
+        self.windows = None     # full-resolution windows of the last frame
+        self.n_growths = 0      # windows grown, over all frames
+
+    def coarse_windows(self, depth_map, background):
+        """
+        Full-resolution windows (x, y, w, h) around the regions found at the coarse level, merged where they meet.
+        """
+        step, coarse = self.step, self.coarse
+        cleaned_image = coarse(depth_map[::step, ::step], background[::step, ::step])
+        BW_dm = self.segmenter(cleaned_image, out=coarse.mask)
+        self.components = find_components(BW_dm, min_area=self.min_area / step ** 2, out=coarse.labels)
+        boxes = self.components.boxes * step
+        height, width = self.shape
+        x0 = np.clip(boxes[:, 0] - self.margin_pixels, 0, width)
+        y0 = np.clip(boxes[:, 1] - self.margin_pixels, 0, height)
+        x1 = np.clip(boxes[:, 0] + boxes[:, 2] + step + self.margin_pixels, 0, width)
+        y1 = np.clip(boxes[:, 1] + boxes[:, 3] + step + self.margin_pixels, 0, height)
+        return merge_windows(zip(x0.tolist(), y0.tolist(), (x1 - x0).tolist(), (y1 - y0).tolist()))
+
+    def segment_windows(self, depth_map, background, windows):
+        """
+        Full-resolution mask (preprocessor.mask) of the windows, 0 elsewhere.
+        """
+        preprocessor = self.preprocessor
+        foreground = preprocessor.subtract_background_windows(depth_map, background, windows)
+        cleaned_image = preprocessor.preprocess_windows(foreground, windows)
+        labels = self.segmenter(cleaned_image, out=preprocessor.packed_mask[:cleaned_image.size],
+                                n_outside=preprocessor.mask.size - cleaned_image.size)
+        return preprocessor.unpack_mask(labels, windows)
+
+    def _grown(self, mask, windows):
+        # windows with mask pixels on an edge that is not the frame's, grown on that side; None if there is none
+        height, width = self.shape
+        grown, changed = [], False
+        for x, y, w, h in windows:
+            x0, y0, x1, y1 = x, y, x + w, y + h
+            if x0 > 0 and mask[y0:y1, x0].any():
+                x0 = max(x0 - max(w // 2, self.margin_pixels), 0)
+            if x1 < width and mask[y0:y1, x1 - 1].any():
+                x1 = min(x1 + max(w // 2, self.margin_pixels), width)
+            if y0 > 0 and mask[y0, x0:x1].any():
+                y0 = max(y0 - max(h // 2, self.margin_pixels), 0)
+            if y1 < height and mask[y1 - 1, x0:x1].any():
+                y1 = min(y1 + max(h // 2, self.margin_pixels), height)
+            changed |= (x0, y0, x1, y1) != (x, y, x + w, y + h)
+            grown.append((x0, y0, x1 - x0, y1 - y0))
+        return merge_windows(grown) if changed else None
+
+    def __call__(self, depth_map, background):
+        """
+        Mask of the frame (preprocessor.mask, overwritten by the next frame).
+        """
+        windows = self.coarse_windows(depth_map, background)
+        mask = self.segment_windows(depth_map, background, windows)
+        for _ in range(self.max_growth):
+            grown = self._grown(mask, windows)
+            if grown is None:
+                break
+            self.n_growths += 1
+            windows = grown
+            mask = self.segment_windows(depth_map, background, windows)
+        self.windows = windows
+        return mask
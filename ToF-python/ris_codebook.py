@@ -0,0 +1,183 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ris_config import port_values_from_levels
+from ris_phase import (DEFAULT_M, DEFAULT_N, ELEMENT_SPACING, PHASE_BITS, PHI_COMBINATIONS, THETA_COMBINATIONS,
+                       far_field_phase, near_field_phase, quantize_phase)
+
+# Distance of the far-field configurations in the distance grid
+FAR_FIELD = np.inf
+DEFAULT_DISTANCES = (1, 2, 4, FAR_FIELD)
+
+
+def codebook_dtype(M=DEFAULT_M, N=DEFAULT_N):
+    """
+    One codebook entry: the parameters it was computed with, the phase levels
+    (phase = level * 2*pi / 2**n_bits) and the byte payload sent to the controller.
+    """
+    return np.dtype([('frequency', '<f8'), ('du', '<f8'), ('n_bits', '<i4'), ('theta', '<f8'), ('phi', '<f8'),
+                     ('r', '<f8'), ('levels', '<u2', (M, N)), ('payload', 'u1', (M * N,))])
+
+
+def _entry_key(entry):
+    return tuple(float(entry[field]) for field in ('frequency', 'du', 'n_bits', 'theta', 'phi', 'r'))
+
+
+def _compute_levels(theta, phi, r, frequency, M, N, du, n_bits):
+    # Phase levels of a batch of configurations at one distance (runs in the worker processes)
+    if np.isinf(r):
+        phase = far_field_phase(theta, phi, frequency, M=M, N=N, du=du, quantize=False)
+    else:
+        phase = near_field_phase(theta, phi, r, frequency, M=M, N=N, du=du, quantize=False)
+    return quantize_phase(phase, n_bits, return_index=True).astype(np.uint16)
+
+
+def build_codebook(path, frequency=3.5, distances=DEFAULT_DISTANCES, M=DEFAULT_M, N=DEFAULT_N, du=ELEMENT_SPACING,
+                   n_bits=PHASE_BITS, theta=THETA_COMBINATIONS, phi=PHI_COMBINATIONS, max_workers=None):
+    """
+    Compute the phase levels and byte payloads of every beam configuration at
+    every distance and store them in a single .npy file of shape
+    (len(distances), len(theta)).
+
+    If path already holds a codebook, the entries whose parameters did not
+    change are copied from it and only the others are computed (the file is
+    left alone when nothing changed). The new file is
+    written next to the old one and renamed over it, so readers never see a
+    half-written codebook.
+
+    Args:
+        path (str): Codebook file (.npy).
+        frequency (float): Frequency in GHz.
+        distances (list): Near-field distances in meters; FAR_FIELD (inf) for the far-field solution.
+        M, N (int): Number of element rows and columns.
+        du (float): Element spacing in meters.
+        n_bits (int): Phase resolution.
+        theta, phi (array): Beam directions in degrees, one per configuration index.
+        max_workers (int): Size of the process pool; 0 computes in this process.
+
+    Returns:
+        int: Number of computed entries.
+    """
+    theta = np.asarray(theta, dtype=np.float64)
+    phi = np.asarray(phi, dtype=np.float64)
+    distances = np.unique(np.asarray(distances, dtype=np.float64))  # sorted, far field last
+    dtype = codebook_dtype(M, N)
+    entries = np.zeros((len(distances), len(theta)), dtype=dtype)
+    entries['frequency'], entries['du'], entries['n_bits'] = frequency, du, n_bits
+    entries['theta'], entries['phi'] = theta, phi
+    entries['r'] = distances[:, None]
+
+    # reuse the entries of the previous codebook computed with the same parameters: compared in place first,
+    # looked up by parameters only when they moved (a key can be at several positions, as theta = phi = 0)
+    previous, old = {}, None
+    if os.path.exists(path):
+        try:
+            old = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            old = None
+        if old is not None and old.dtype != dtype:
+            old = None
+    in_place = old is not None and old.shape == entries.shape
+    missing = np.zeros(entries.shape, dtype=bool)
+    unchanged = in_place
+    for position, entry in np.ndenumerate(entries):
+        key = _entry_key(entry)
+        if in_place and _entry_key(old[position]) == key:
+            entries[position] = old[position]
+            continue
+        unchanged = False
+        if old is not None and not previous:
+            previous = {_entry_key(old_entry): source for source, old_entry in np.ndenumerate(old)}
+        source = previous.get(key)
+        if source is None:
+            missing[position] = True
+        else:
+            entries[position] = old[source]
+    if unchanged:
+        return 0
+
+    # one task per distance, with the configurations missing at that distance
+    tasks = [(d, np.flatnonzero(missing[d])) for d in range(len(distances)) if missing[d].any()]
+    args = [(theta[i], phi[i], distances[d], frequency, M, N, du, n_bits) for d, i in tasks]
+    if max_workers == 0 or len(tasks) <= 1:
+        results = [_compute_levels(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_compute_levels, *zip(*args)))
+    for (d, i), levels in zip(tasks, results):
+        entries['levels'][d, i] = levels
+        entries['payload'][d, i] = port_values_from_levels(levels)
+    previous, old = None, None  # release the memory map before replacing the file
+
+    tmp_path = path + '.tmp'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=entries.shape)
+    out[...] = entries
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+    return int(missing.sum())
+
+
+class Codebook:
+    """
+    Read-only, memory-mapped codebook written by build_codebook.
+
+    The payload of a configuration is a view on the file, found by direct
+    indexing: nothing is computed and only the pages that are used are read.
+
+    Args:
+        path (str): Codebook file (.npy).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = np.load(path, mmap_mode='r')
+        self.distances = np.array(self.entries['r'][:, 0])
+        self.payloads = self.entries['payload']
+        self.levels = self.entries['levels']
+        self.n_bits = int(self.entries['n_bits'][0, 0])
+
+    def __len__(self):
+        return self.entries.shape[1]
+
+    def distance_index(self, r=None):
+        """
+        Position in the distance grid of the distance closest to r (None: far field if present, else the last).
+        """
+        if r is None or np.isinf(r):
+            return len(self.distances) - 1
+        finite = np.isfinite(self.distances)
+        if not finite.any():
+            return len(self.distances) - 1
+        return int(np.flatnonzero(finite)[np.argmin(np.abs(self.distances[finite] - r))])
+
+    def payload(self, index, r=None):
+        """
+        Byte payload (uint8 view) of configuration index at the distance closest to r.
+        """
+        return self.payloads[self.distance_index(r), index]
+
+    def phase(self, index, r=None):
+        """
+        Quantized phase map (radians) of configuration index at the distance closest to r.
+        """
+        return self.levels[self.distance_index(r), index] * (2 * np.pi / 2 ** self.n_bits)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build or update the RIS beam codebook.')
+    parser.add_argument('output', help='codebook file (.npy)')
+    parser.add_argument('--frequency', type=float, default=3.5, help='GHz')
+    parser.add_argument('--distances', type=float, nargs='+', default=DEFAULT_DISTANCES,
+                        help='near-field distances in meters, inf for far field')
+    parser.add_argument('--size', type=int, nargs=2, default=(DEFAULT_M, DEFAULT_N), help='M N')
+    parser.add_argument('--du', type=float, default=ELEMENT_SPACING, help='element spacing in meters')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    n_computed = build_codebook(args.output, args.frequency, args.distances, *args.size, du=args.du,
+                                max_workers=args.workers)
+    print(f'{n_computed} entries computed, codebook written to {args.output}')
@@ -0,0 +1,111 @@
+# Phase -> voltage / DAC mapping of the RIS elements and the byte vector sent to the
+# controller, ported from processAndSaveData() in MATLAB/Beamsteering_NF.m.
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from ris_phase import PHASE_BITS
+
+# Measured element phase (degrees) for each bias voltage (V), from the MATLAB phasesheet/Voltsheet
+PHASE_SHEET = np.array([-74 + 360, -76.31 + 360, -79.95 + 360, -83.94 + 360, -92.58 + 360, -104.29 + 360,
+                        -130.16 + 360, -154.53 + 360, -171.46 + 360, 171.43, 121.30, 103.78, 80.83, 51.80, 36.95,
+                        27.70, 20.81, 15.52, 10.01])
+VOLT_SHEET = np.array([23, 20, 18, 16, 14, 12, 10, 9, 8.5, 8, 7, 6.5, 6, 5, 4, 3, 2, 1, 0])
+MAX_VOLTAGE = 23   # voltage sent as 255
+DAC_REFERENCE = 5  # volts at DAC code 255
+
+RisConfig = namedtuple('RisConfig', ['phase', 'phase_deg', 'decimal', 'dac', 'voltage', 'port_value'])
+
+
+def _degrees(phase):
+    # BD = B*180/pi
+    return np.asarray(phase) * 180 / np.pi
+
+
+def _matlab_round(x):
+    # MATLAB round: halves away from zero
+    return np.sign(x) * np.floor(np.abs(x) + 0.5)
+
+
+def _voltage_table():
+    # Bin edges (degrees) and the voltage of each bin, built once.
+    # Sorted by phase, a phase gets the voltage of the nearest measured phase:
+    # bin edges are the midpoints between neighbours, and above the midpoint
+    # between the last phase and the first one + 360 it wraps to the first voltage.
+    # (same arithmetic as the MATLAB comparisons, so boundary values fall in the same bin)
+    phases, volts = np.flip(PHASE_SHEET), np.flip(VOLT_SHEET)
+    edges = np.append(phases[:-1] + (phases[1:] - phases[:-1]) / 2, phases[-1] + (phases[0] + 360 - phases[-1]) / 2)
+    return edges, np.append(volts, volts[0])
+
+
+VOLTAGE_EDGES, VOLTAGE_VALUES = _voltage_table()
+# Byte sent to the controller for each voltage bin
+PORT_BYTES = _matlab_round(VOLTAGE_VALUES * 255 / MAX_VOLTAGE).astype(np.uint8)
+# ... and for each quantized phase level of ris_phase.quantize_phase (0 .. 2**PHASE_BITS)
+LEVEL_PORT_BYTES = PORT_BYTES[np.searchsorted(
+    VOLTAGE_EDGES, _degrees(np.arange(2 ** PHASE_BITS + 1) * (2 * np.pi / 2 ** PHASE_BITS)), side='left')]
+
+
+def phase_to_voltage(phase):
+    """
+    Bias voltage of each element for a phase map in radians (the MATLAB BV matrix).
+    """
+    return VOLTAGE_VALUES[np.searchsorted(VOLTAGE_EDGES, _degrees(phase), side='left')]
+
+
+def port_values(phase):
+    """
+    Byte vector sent to the controller for an M x N phase map in radians.
+
+    Row-major over the M x N map, i.e. the column-major order of its transpose,
+    as portValue = PortValue(:) with PortValue = portVal.' in MATLAB.
+    """
+    return PORT_BYTES[np.searchsorted(VOLTAGE_EDGES, _degrees(phase), side='left')].reshape(-1)
+
+
+def port_values_from_levels(levels):
+    """
+    Same as port_values, from the quantization levels (quantize_phase(..., return_index=True)).
+    Works on a batch of maps too: (..., M, N) -> (..., M*N).
+    """
+    levels = np.asarray(levels)
+    return LEVEL_PORT_BYTES[levels].reshape(levels.shape[:-2] + (-1,))
+
+
+def ris_config(phase):
+    """
+    All the matrices processAndSaveData wrote to Excel, as arrays:
+    phase (B), phase_deg (BD), decimal (B_scaled), dac (DAC), voltage (BV) and
+    port_value (portValue, uint8). Characters/Hex/Hex2 are text forms of decimal and port_value.
+    """
+    phase = np.asarray(phase, dtype=np.float64)
+    phase_deg = _degrees(phase)
+    decimal = _matlab_round(phase * 255 / np.pi / 2)
+    bins = np.searchsorted(VOLTAGE_EDGES, phase_deg, side='left')
+    return RisConfig(phase=phase, phase_deg=phase_deg, decimal=decimal, dac=decimal / 255 * DAC_REFERENCE,
+                     voltage=VOLTAGE_VALUES[bins], port_value=PORT_BYTES[bins].reshape(-1))
+
+
+def save_config(path, config, background=True):
+    """
+    Write a RisConfig to a single compressed .npz file, by default from a
+    background thread so the caller can send port_value right away.
+
+    Returns:
+        threading.Thread or None: The writer thread (join() it before exiting), or None.
+    """
+    def write():
+        np.savez_compressed(path, **config._asdict())
+
+    if not background:
+        write()
+        return None
+    thread = threading.Thread(target=write, name='save_config')
+    thread.start()
+    return thread
+
+
+def load_config(path):
+    with np.load(path) as data:
+        return RisConfig(**{field: data[field] for field in RisConfig._fields})
@@ -0,0 +1,111 @@
+import struct
+
+import numpy as np
+
+# Encodings of a configuration update against the configuration the controller holds
+DELTA_FULL = 0    # the whole byte vector (sent as DATA frames)
+DELTA_SPARSE = 1  # records of element index (u16), value (u8)
+DELTA_RUNS = 2    # records of start (u16), length (u16), values
+
+_SPARSE_DTYPE = np.dtype([('index', '<u2'), ('value', 'u1')])
+_RUN = struct.Struct('<HH')
+
+
+def _as_array(vector):
+    if isinstance(vector, (bytes, bytearray)):
+        return np.frombuffer(vector, dtype=np.uint8)
+    return np.asarray(vector, dtype=np.uint8)
+
+
+def changed_runs(old, new, merge_gap=_RUN.size - 1):
+    """
+    Runs of changed elements between two byte vectors, as (starts, lengths).
+    Runs separated by at most merge_gap unchanged elements are merged, since
+    resending those elements is cheaper than a new run header.
+    """
+    changed = np.flatnonzero(np.asarray(old) != np.asarray(new))
+    if len(changed) == 0:
+        return changed, changed
+    breaks = np.flatnonzero(np.diff(changed) > merge_gap + 1)
+    starts = changed[np.r_[0, breaks + 1]]
+    ends = changed[np.r_[breaks, len(changed) - 1]] + 1
+    return starts, ends - starts
+
+
+def _split(records, record_size, max_bytes):
+    step = max(1, max_bytes // record_size) * record_size
+    return [records[i:i + step] for i in range(0, len(records), step)]
+
+
+def encode_sparse(old, new, max_bytes):
+    """
+    Sparse (index, value) records of the changed elements, in chunks of at most max_bytes.
+    """
+    new = np.asarray(new)
+    changed = np.flatnonzero(np.asarray(old) != new)
+    records = np.empty(len(changed), dtype=_SPARSE_DTYPE)
+    records['index'] = changed
+    records['value'] = new[changed]
+    return _split(records.tobytes(), _SPARSE_DTYPE.itemsize, max_bytes)
+
+
+def encode_runs(old, new, max_bytes):
+    """
+    Run-length records (start, length, values) of the changed elements, in chunks
+    of at most max_bytes; a run longer than a chunk is split.
+    """
+    new = np.asarray(new, dtype=np.uint8)
+    max_values = max(1, max_bytes - _RUN.size)
+    chunks, chunk = [], b''
+    for start, length in zip(*changed_runs(old, new)):
+        for piece in range(start, start + length, max_values):
+            values = new[piece:min(piece + max_values, start + length)].tobytes()
+            record = _RUN.pack(piece, len(values)) + values
+            if len(chunk) + len(record) > max_bytes:
+                chunks.append(chunk)
+                chunk = b''
+            chunk += record
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def encode_delta(old, new, max_bytes=256, frame_overhead=0):
+    """
+    Cheapest encoding of new given the old vector the controller holds.
+
+    Each candidate is costed as its bytes plus frame_overhead per chunk; the
+    full vector is used when there is no old vector or nothing is cheaper.
+
+    Returns:
+        tuple: (encoding, list of chunks); no chunks if nothing changed.
+    """
+    new = _as_array(new)
+    full = [new[i:i + max_bytes].tobytes() for i in range(0, len(new), max_bytes)]
+    if old is None or len(old) != len(new):
+        return DELTA_FULL, full
+    old = _as_array(old)
+    if np.array_equal(old, new):
+        return DELTA_FULL, []
+    candidates = [(DELTA_FULL, full), (DELTA_SPARSE, encode_sparse(old, new, max_bytes)),
+                  (DELTA_RUNS, encode_runs(old, new, max_bytes))]
+    return min(candidates, key=lambda candidate: sum(map(len, candidate[1])) + len(candidate[1]) * frame_overhead)
+
+
+def apply_delta(target, encoding, chunk):
+    """
+    Apply one SPARSE or RUNS chunk to a bytearray (or uint8 array) in place.
+    """
+    view = np.frombuffer(target, dtype=np.uint8) if isinstance(target, bytearray) else target
+    if encoding == DELTA_SPARSE:
+        records = np.frombuffer(chunk, dtype=_SPARSE_DTYPE)
+        view[records['index']] = records['value']
+    elif encoding == DELTA_RUNS:
+        position = 0
+        while position < len(chunk):
+            start, length = _RUN.unpack_from(chunk, position)
+            position += _RUN.size
+            view[start:start + length] = np.frombuffer(chunk, dtype=np.uint8, count=length, offset=position)
+            position += length
+    else:
+        raise ValueError(f'unknown delta encoding {encoding}')
@@ -0,0 +1,145 @@
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+
+from ris_delta import apply_delta
+from ris_protocol import (FRAME_ACK, FRAME_BAUD, FRAME_COMMIT, FRAME_DATA, FRAME_DELTA, FRAME_NAK, FRAME_SELECT,
+                          STATUS_REJECTED, FrameParser, encode_frame)
+
+
+class ControllerEmulator:
+    """
+    Stand-in for the RIS controller on a pseudo-terminal (Linux/macOS), to test
+    and benchmark uploads without the hardware.
+
+    The host opens port_name like the controller's UART. Incoming bytes are
+    consumed at the line rate of the emulated baud rate (10 bits per byte),
+    frames are checked and acknowledged as described in ris_protocol, and
+    received bytes are corrupted at byte_error_rate to exercise the recovery.
+    Bytes outside valid frames (e.g. the legacy index/portValue stream) are
+    counted in n_skipped.
+
+    Args:
+        baudrate (float): Emulated line rate; None for no limit.
+        byte_error_rate (float): Probability that a received byte is corrupted.
+        frame_time (float): Processing time of the controller per frame, seconds.
+        seed (int): Seed of the error injection.
+    """
+
+    def __init__(self, baudrate=115200, byte_error_rate=0.0, frame_time=0.0, seed=0):
+        self.baudrate = baudrate
+        self.byte_error_rate = byte_error_rate
+        self.frame_time = frame_time
+        self._random = random.Random(seed)
+        self._master, slave = os.openpty()
+        self._slave = slave
+        self.port_name = os.ttyname(slave)
+        self._parser = FrameParser()
+        self._expected = 0
+        self._nak_sent = False
+        self._staging = {}
+        self.configurations = {}  # committed configurations by index
+        self.selected = None
+        self.n_frames = 0
+        self.n_naks = 0
+        self.n_corrupted = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ControllerEmulator', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    @property
+    def n_crc_errors(self):
+        return self._parser.n_crc_errors
+
+    @property
+    def n_skipped(self):
+        return self._parser.n_skipped
+
+    def _reply(self, frame_type, seq, payload=b''):
+        os.write(self._master, encode_frame(frame_type, seq, payload))
+
+    def _run(self):
+        os.set_blocking(self._master, False)
+        line_free = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                data = os.read(self._master, 64)  # small reads: frames are handled as they arrive
+            except BlockingIOError:
+                time.sleep(0.0005)
+                continue
+            except OSError:
+                break
+            if self.baudrate:
+                # the bytes arrive no faster than the line rate
+                line_free = max(line_free, time.perf_counter()) + len(data) * 10 / self.baudrate
+                delay = line_free - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if self.byte_error_rate and self._random.random() > (1 - self.byte_error_rate) ** len(data):
+                data = bytearray(data)
+                data[self._random.randrange(len(data))] ^= 0xFF
+                self.n_corrupted += 1
+            for frame_type, seq, payload in self._parser.feed(bytes(data)):
+                self._handle(frame_type, seq, payload)
+
+    def _handle(self, frame_type, seq, payload):
+        if frame_type is None or seq != self._expected:
+            # go-back-N receiver: drop the frame, ask once for the expected one
+            if not self._nak_sent:
+                self._reply(FRAME_NAK, self._expected)
+                self.n_naks += 1
+                self._nak_sent = True
+            return
+        self._nak_sent = False
+        self._expected = (self._expected + 1) & 0xFF
+        self.n_frames += 1
+        if self.frame_time:
+            time.sleep(self.frame_time)
+        baudrate = None
+        status = b''
+        if frame_type == FRAME_DATA:
+            index, offset = struct.unpack_from('<BH', payload)
+            staging = self._staging.setdefault(index, bytearray())
+            data = payload[3:]
+            if len(staging) < offset + len(data):
+                staging.extend(bytes(offset + len(data) - len(staging)))
+            staging[offset:offset + len(data)] = data
+        elif frame_type == FRAME_DELTA:
+            index, encoding = payload[0], payload[1]
+            # deltas apply to a copy of the stored configuration
+            if index not in self._staging:
+                self._staging[index] = bytearray(self.configurations.get(index, b''))
+            try:
+                apply_delta(self._staging[index], encoding, payload[2:])
+            except (ValueError, IndexError):
+                status = STATUS_REJECTED
+        elif frame_type == FRAME_COMMIT:
+            index, length, crc = struct.unpack('<BHI', payload)
+            staging = bytes(self._staging.pop(index, b''))[:length]
+            if len(staging) == length and zlib.crc32(staging) == crc:
+                self.configurations[index] = staging
+                self.selected = index
+            else:
+                status = STATUS_REJECTED
+        elif frame_type == FRAME_SELECT:
+            self.selected = payload[0]
+        elif frame_type == FRAME_BAUD:
+            (baudrate,) = struct.unpack('<I', payload)
+        self._reply(FRAME_ACK, seq, status)
+        if baudrate is not None and self.baudrate:
+            self.baudrate = baudrate
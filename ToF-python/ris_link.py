@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import serial
+
+
+class RisLink:
+    """
+    Persistent link to the RIS controller that sends beam configuration indices.
+
+    The port is opened once and kept open for the session; a background thread
+    does the UART writes, so send_index() never blocks the vision loop. Only
+    changes of the index are transmitted, optionally after the new index was
+    requested for `hysteresis` consecutive frames. If the port fails, the thread
+    reconnects every reconnect_delay seconds and then sends the latest index.
+
+    Args:
+        port (str): Serial port ('COM5', '/dev/ttyUSB0') or pyserial URL such as 'loop://'.
+        baudrate (int): Baud rate.
+        hysteresis (int): Consecutive requests of a new index needed before it is sent (1 = immediately).
+        reconnect_delay (float): Seconds between reconnection attempts.
+        timeout (float): Write timeout of the port in seconds.
+    """
+
+    def __init__(self, port='COM5', baudrate=115200, hysteresis=1, reconnect_delay=1.0, timeout=1):
+        self.port_name = port
+        self.baudrate = baudrate
+        self.hysteresis = max(1, hysteresis)
+        self.reconnect_delay = reconnect_delay
+        self.timeout = timeout
+        self.port = None
+        self.last_sent = None       # last index written to the controller
+        self._candidate = None      # index waiting for the hysteresis count
+        self._candidate_count = 0
+        self._requested = None      # last index handed to the writer thread
+        self._queue = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.n_requests = 0
+        self.n_sent = 0
+        self.n_reconnects = 0
+        self.n_errors = 0
+        self._latencies = deque(maxlen=10000)  # enqueue -> write complete, seconds
+        self._thread = threading.Thread(target=self._run, name='RisLink', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send_index(self, index):
+        """
+        Request a beam configuration index. Returns True if it was queued for transmission.
+        """
+        self.n_requests += 1
+        if index is None:
+            return False
+        index = int(index)
+        if index == self._requested:
+            self._candidate, self._candidate_count = None, 0
+            return False
+        if index == self._candidate:
+            self._candidate_count += 1
+        else:
+            self._candidate, self._candidate_count = index, 1
+        if self._candidate_count < self.hysteresis:
+            return False
+        self._candidate, self._candidate_count = None, 0
+        self._requested = index
+        # latest wins: drop an index the writer has not picked up yet
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put_nowait((index, time.perf_counter()))
+        return True
+
+    def flush(self, timeout=1.0):
+        """
+        Wait until the requested index has been written (or timeout). Returns True if it was.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._queue.empty() and self.last_sent == self._requested:
+                return True
+            time.sleep(0.001)
+        return False
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._close_port()
+
+    def stats(self):
+        """
+        Counters and write latency percentiles (ms) of the link.
+        """
+        with self._lock:
+            latencies = np.array(self._latencies) * 1e3
+        result = {'requests': self.n_requests, 'sent': self.n_sent, 'reconnects': self.n_reconnects,
+                  'errors': self.n_errors, 'connected': self.port is not None}
+        if len(latencies):
+            result.update(latency_p50_ms=np.percentile(latencies, 50), latency_p95_ms=np.percentile(latencies, 95),
+                          latency_max_ms=latencies.max())
+        return result
+
+    def _open_port(self):
+        try:
+            self.port = serial.serial_for_url(self.port_name, baudrate=self.baudrate, timeout=self.timeout,
+                                              write_timeout=self.timeout)
+            return True
+        except (serial.SerialException, OSError):
+            self.port = None
+            return False
+
+    def _close_port(self):
+        if self.port is not None:
+            try:
+                self.port.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.port = None
+
+    def _run(self):
+        self._open_port()
+        pending = None
+        while not self._stop.is_set():
+            if pending is None:
+                try:
+                    pending = self._queue.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+            else:
+                # a newer index replaces the one that could not be sent
+                try:
+                    pending = self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+            if self.port is None:
+                if not self._open_port():
+                    self._stop.wait(self.reconnect_delay)
+                    continue
+                self.n_reconnects += 1
+            index, requested_at = pending
+            try:
+                # Convert the image index to uint8 and send it
+                self.port.write(bytes([index & 0xFF]))
+                self.port.flush()
+            except (serial.SerialException, OSError):
+                self.n_errors += 1
+                self._close_port()
+                continue
+            self.last_sent = index
+            self.n_sent += 1
+            with self._lock:
+                self._latencies.append(time.perf_counter() - requested_at)
+            pending = None
@@ -0,0 +1,102 @@
+# RIS phase solver, ported from calculate() in MATLAB/Beamsteering_NF.m (near field)
+# and MATLAB/Beamsteering_FF.m (far field).
+# Element (i, j) of the M x N panel sits at ((i-1)*du, (j-1)*du, 0), the transmitter
+# at the origin. The phase maps are computed for all elements at once with
+# broadcasting, for one or many (theta, phi, r) targets per call, and are quantized
+# arithmetically to the 2**n_bits + 1 levels of the MATLAB grid E.
+import numpy as np
+
+SPEED_OF_LIGHT = 299792458  # m/s
+ELEMENT_SPACING = 11.30e-3  # du, meters
+DEFAULT_M, DEFAULT_N = 37, 50
+PHASE_BITS = 10
+
+# The 64 predefined beam configurations of the RIS controller (index 0..63), in degrees
+THETA_COMBINATIONS = np.hstack([0, np.linspace(10, 60, 6), np.linspace(3, 60, 20), np.flip(np.linspace(10, 60, 6)),
+                                np.linspace(20, 60, 5), np.linspace(3, 60, 20), np.linspace(20, 60, 5), 0])
+PHI_COMBINATIONS = np.hstack([0, np.linspace(0, 75, 6), np.repeat(90, 20), np.linspace(105, 180, 6),
+                              np.linspace(195, 255, 5), np.repeat(270, 20), np.linspace(285, 345, 5), 0])
+
+
+def wave_number(frequency):
+    """
+    Wave number k (rad/m) for a frequency in GHz, as entered in the MATLAB GUI.
+    """
+    return 2 * np.pi / (SPEED_OF_LIGHT / (frequency * 1e9))
+
+
+def quantize_phase(phase, n_bits=PHASE_BITS, return_index=False):
+    """
+    Quantize phases in [0, 2*pi] to the grid E = 2*pi/2**n_bits * [0, 1, ..., 2**n_bits].
+
+    Same result as [~, p] = min(abs(E - phase)); B = E(p), including the
+    choice of the lower level on an exact tie, without building the grid.
+
+    Returns:
+        numpy.ndarray: Quantized phases, or the level indices p-1 with return_index.
+    """
+    step = 2 * np.pi / 2 ** n_bits
+    index = np.ceil(np.asarray(phase) / step - 0.5)
+    np.clip(index, 0, 2 ** n_bits, out=index)
+    if return_index:
+        return index.astype(np.int32)
+    return index * step
+
+
+def element_positions(M=DEFAULT_M, N=DEFAULT_N, du=ELEMENT_SPACING):
+    """
+    x (M, 1) and y (1, N) coordinates of the RIS elements, for broadcasting.
+    """
+    return (np.arange(M) * du)[:, None], (np.arange(N) * du)[None, :]
+
+
+def near_field_phase(theta, phi, r=2, frequency=3.5, M=DEFAULT_M, N=DEFAULT_N, du=ELEMENT_SPACING,
+                     n_bits=PHASE_BITS, quantize=True):
+    """
+    Near-field phase map k * (|Q_p - P_TX| + |Q_p - P_RX|) mod 2*pi of every element.
+
+    theta, phi (degrees) and r (meters) may be scalars or arrays; they are
+    broadcast together and the result has shape broadcast_shape + (M, N).
+
+    Args:
+        theta (float or array): Elevation of the receiver in degrees.
+        phi (float or array): Azimuth of the receiver in degrees.
+        r (float or array): Distance of the receiver in meters.
+        frequency (float): Frequency in GHz.
+        M, N (int): Number of element rows and columns.
+        du (float): Element spacing in meters.
+        n_bits (int): Phase resolution of the quantization.
+        quantize (bool): Quantize the phases to the n_bits grid.
+
+    Returns:
+        numpy.ndarray: Phases in radians.
+    """
+    theta_r, phi_r, r = np.broadcast_arrays(np.radians(theta), np.radians(phi), np.asarray(r, dtype=np.float64))
+    k = wave_number(frequency)
+    x, y = element_positions(M, N, du)
+    # Receiver position from r, theta, phi; trailing axes broadcast over the elements
+    p_x = (r * np.cos(phi_r) * np.sin(theta_r))[..., None, None]
+    p_y = (r * np.sin(phi_r) * np.sin(theta_r))[..., None, None]
+    p_z = (r * np.cos(theta_r))[..., None, None]
+    d_tx = np.hypot(x, y)  # P_TX at the origin
+    d_rx = np.sqrt((x - p_x) ** 2 + (y - p_y) ** 2 + p_z ** 2)
+    phase = np.mod(k * (d_tx + d_rx), 2 * np.pi)
+    return quantize_phase(phase, n_bits) if quantize else phase
+
+
+def far_field_phase(theta, phi, frequency=3.5, M=DEFAULT_M, N=DEFAULT_N, du=ELEMENT_SPACING,
+                    n_bits=PHASE_BITS, quantize=True):
+    """
+    Far-field (linear) phase map mod(i*dsx + j*dsy, 2*pi), i = 1..M, j = 1..N.
+
+    theta and phi (degrees) may be arrays; the result has shape broadcast_shape + (M, N).
+    See near_field_phase for the other arguments.
+    """
+    theta_r, phi_r = np.broadcast_arrays(np.radians(theta), np.radians(np.asarray(phi) - 180))
+    k = wave_number(frequency)
+    dsx = (du * k * np.cos(phi_r) * np.sin(theta_r))[..., None, None]
+    dsy = (du * k * np.sin(phi_r) * np.sin(theta_r))[..., None, None]
+    i = np.arange(1, M + 1)[:, None]
+    j = np.arange(1, N + 1)[None, :]
+    phase = np.mod(i * dsx + j * dsy, 2 * np.pi)
+    return quantize_phase(phase, n_bits) if quantize else phase
@@ -0,0 +1,322 @@
+import binascii
+import struct
+import time
+import zlib
+
+import serial
+
+from ris_delta import DELTA_FULL, encode_delta
+
+# Framed protocol between the host and the RIS controller:
+#   SOF | type | seq | length (u16) | payload | CRC-16/CCITT (u16) of type..payload
+# Little endian. The controller answers every frame it accepts in order with an
+# ACK carrying its seq (cumulative), and a frame it rejects (bad CRC, gap in the
+# sequence) with a NAK carrying the seq it expects next. An ACK payload of
+# STATUS_REJECTED means the frame arrived but could not be applied (e.g. a
+# COMMIT whose CRC-32 does not match).
+SOF = 0xA5
+FRAME_DATA = 0x01    # index (u8), offset (u16), configuration bytes
+FRAME_COMMIT = 0x02  # index (u8), total length (u16), CRC-32 of the configuration: apply it
+FRAME_SELECT = 0x03  # index (u8): switch to a stored configuration (the legacy index byte)
+FRAME_BAUD = 0x04    # baud rate (u32): switch after the ACK
+FRAME_PING = 0x05
+FRAME_DELTA = 0x06   # index (u8), encoding (u8), ris_delta records against the stored configuration
+FRAME_ACK = 0x80
+FRAME_NAK = 0x81
+STATUS_REJECTED = b'\x01'
+
+_HEADER = struct.Struct('<BBBH')
+_DATA = struct.Struct('<BH')
+_COMMIT = struct.Struct('<BHI')
+_DELTA = struct.Struct('<BB')
+_CRC = struct.Struct('<H')
+FRAME_OVERHEAD = _HEADER.size + _CRC.size
+MAX_PAYLOAD = 4096
+# Longest blocking read while waiting for replies (the read returns as soon as a byte arrives). Set on the
+# port once: on a real port every change of the timeout reconfigures it (ioctl / SetCommTimeouts)
+READ_POLL = 0.005
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def crc16(data, crc=0xFFFF):
+    return binascii.crc_hqx(data, crc)
+
+
+def encode_frame(frame_type, seq, payload=b''):
+    body = _HEADER.pack(SOF, frame_type, seq & 0xFF, len(payload)) + bytes(payload)
+    return body + _CRC.pack(crc16(body[1:]))
+
+
+class FrameParser:
+    """
+    Incremental frame decoder. Bytes that are not part of a valid frame are
+    skipped; a frame with a bad CRC is reported once so the receiver can NAK it.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.n_crc_errors = 0
+        self.n_skipped = 0
+
+    def feed(self, data):
+        """
+        Add received bytes.
+
+        Returns:
+            list: (type, seq, payload) of the complete frames; type None for a frame with a bad CRC.
+        """
+        self._buffer += data
+        frames = []
+        buffer = self._buffer
+        while True:
+            start = buffer.find(SOF)
+            if start < 0:
+                self.n_skipped += len(buffer)
+                buffer.clear()
+                break
+            if start:
+                self.n_skipped += start
+                del buffer[:start]
+            if len(buffer) < _HEADER.size:
+                break
+            _, frame_type, seq, length = _HEADER.unpack_from(buffer)
+            if length > MAX_PAYLOAD:
+                # not a frame start
+                self.n_skipped += 1
+                del buffer[:1]
+                continue
+            end = _HEADER.size + length + _CRC.size
+            if len(buffer) < end:
+                break
+            (crc,) = _CRC.unpack_from(buffer, end - _CRC.size)
+            if crc16(bytes(buffer[1:end - _CRC.size])) != crc:
+                # resynchronise on the next SOF, report the error once
+                self.n_crc_errors += 1
+                self.n_skipped += 1
+                del buffer[:1]
+                if not frames or frames[-1][0] is not None:
+                    frames.append((None, seq, b''))
+                continue
+            frames.append((frame_type, seq, bytes(buffer[_HEADER.size:end - _CRC.size])))
+            del buffer[:end]
+        return frames
+
+
+class RisUploader:
+    """
+    Uploads full RIS configurations (the portValue bytes) with the framed protocol.
+
+    The configuration is cut into DATA frames of chunk_size bytes followed by a
+    COMMIT frame. Up to `window` frames are in flight before an ACK is needed
+    (go-back-N): the controller's ACKs pace the transfer instead of fixed
+    sleeps, and a NAK or a timeout resends from the first unacknowledged frame.
+    A NAK for a sequence number outside the window (the controller and the
+    uploader out of step, e.g. after a failed transfer) renumbers the frames
+    still to send from the one the controller expects.
+
+    Args:
+        port: An open pyserial port (its read timeout is set to READ_POLL), or a port name / pyserial URL to open.
+        baudrate (int): Baud rate when the port is opened here.
+        chunk_size (int): Configuration bytes per DATA frame.
+        window (int): Frames in flight.
+        timeout (float): Seconds without ACK before resending, on top of the line time of the frames in flight.
+        max_retries (int): Resends of the same frame before giving up.
+    """
+
+    def __init__(self, port, baudrate=115200, chunk_size=256, window=8, timeout=0.2, max_retries=10):
+        if isinstance(port, str):
+            port = serial.serial_for_url(port, baudrate=baudrate, timeout=READ_POLL, write_timeout=1)
+        elif port.timeout != READ_POLL:
+            port.timeout = READ_POLL
+        self.port = port
+        self.chunk_size = chunk_size
+        self.window = window
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._seq = 0
+        self._parser = FrameParser()
+        self.n_frames = 0
+        self.n_retransmitted = 0
+        self.n_bytes = 0
+        self.acknowledged = {}  # configuration index -> bytes the controller committed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.port.close()
+
+    def _line_time(self, n_bytes):
+        # time to put n_bytes on the wire (start + 8 data + stop bits)
+        baudrate = getattr(self.port, 'baudrate', None)
+        return n_bytes * 10 / baudrate if baudrate else 0
+
+    def _read_replies(self):
+        data = self.port.read(max(1, self.port.in_waiting))
+        return self._parser.feed(data) if data else []
+
+    def _abort(self, message, seqs, base, next_):
+        # Before giving up on a transfer: read the replies still coming for the frames in flight until the line
+        # is quiet, and continue from the seq the controller expects next, so that the next transfer is in step
+        # and no late ACK is taken for one of its frames
+        expected = seqs[base]
+        quiet_until = time.monotonic() + self.timeout
+        while time.monotonic() < quiet_until:
+            replies = self._read_replies()
+            if replies:
+                quiet_until = time.monotonic() + self.timeout
+            for frame_type, seq, _ in replies:
+                offset = (seq - seqs[base]) & 0xFF
+                if offset < next_ - base:
+                    expected = (seq + 1) & 0xFF if frame_type == FRAME_ACK else seq
+                elif frame_type == FRAME_NAK:
+                    expected = seq
+        self._seq = expected
+        return ProtocolError(message)
+
+    def send_frames(self, frames):
+        """
+        Send a list of (type, payload) frames in order with go-back-N flow control.
+
+        Returns:
+            int: Number of bytes written, retransmissions included.
+        """
+        seqs = [(self._seq + i) & 0xFF for i in range(len(frames))]
+        encoded = [encode_frame(frame_type, seq, payload) for (frame_type, payload), seq in zip(frames, seqs)]
+        window = max(1, min(self.window, 127))
+        base = 0       # first unacknowledged frame
+        next_ = 0      # next frame to write
+        retries = 0
+        written = 0
+        deadline = time.monotonic() + self.timeout
+        while base < len(encoded):
+            if next_ < min(base + window, len(encoded)):
+                burst = b''.join(encoded[next_:min(base + window, len(encoded))])
+                self.port.write(burst)
+                written += len(burst)
+                self.n_frames += min(base + window, len(encoded)) - next_
+                next_ = min(base + window, len(encoded))
+                deadline = time.monotonic() + self.timeout + self._line_time(sum(map(len, encoded[base:next_])))
+            remaining = deadline - time.monotonic()
+            replies = self._read_replies() if remaining > 0 else []
+            resend = remaining <= 0
+            for frame_type, seq, status in replies:
+                if base == len(encoded):
+                    break
+                offset = (seq - seqs[base]) & 0xFF
+                if frame_type == FRAME_ACK and offset < next_ - base:
+                    if status == STATUS_REJECTED:
+                        raise self._abort(f'frame {seq} rejected by the controller', seqs, base, next_)
+                    base += offset + 1
+                    retries = 0
+                    deadline = time.monotonic() + self.timeout + self._line_time(sum(map(len, encoded[base:next_])))
+                elif frame_type == FRAME_NAK and offset < next_ - base:
+                    # the controller expects seq: everything before it arrived
+                    base += offset
+                    resend = True
+                elif frame_type == FRAME_NAK:
+                    # out of step: the frames from base are renumbered from the seq the controller expects
+                    seqs[base:] = [(seq + i) & 0xFF for i in range(len(frames) - base)]
+                    encoded[base:] = [encode_frame(kind, frame_seq, payload)
+                                      for (kind, payload), frame_seq in zip(frames[base:], seqs[base:])]
+                    resend = True
+            if resend and base < len(encoded):
+                retries += 1
+                if retries > self.max_retries:
+                    raise self._abort(f'no ACK for frame {seqs[base]} after {self.max_retries} retries', seqs,
+                                      base, next_)
+                self.n_retransmitted += next_ - base
+                next_ = base
+        if seqs:
+            self._seq = (seqs[-1] + 1) & 0xFF
+        self.n_bytes += written
+        return written
+
+    def upload(self, index, payload, delta=True):
+        """
+        Upload a configuration to slot `index` of the controller and apply it.
+
+        With delta, only the elements that differ from the last configuration
+        the controller acknowledged in that slot are sent (sparse or run-length
+        records, see ris_delta), unless the full vector is cheaper. A rejected
+        delta is followed by a full upload.
+
+        Returns:
+            int: Number of bytes written on the line.
+        """
+        payload = bytes(payload)
+        commit = (FRAME_COMMIT, _COMMIT.pack(index, len(payload), zlib.crc32(payload)))
+        encoding = DELTA_FULL
+        if delta and index in self.acknowledged:
+            encoding, chunks = encode_delta(self.acknowledged[index], payload, self.chunk_size,
+                                            FRAME_OVERHEAD + _DELTA.size)
+            if not chunks:
+                return 0
+        if encoding != DELTA_FULL:
+            frames = [(FRAME_DELTA, _DELTA.pack(index, encoding) + chunk) for chunk in chunks]
+            try:
+                written = self.send_frames(frames + [commit])
+                self.acknowledged[index] = payload
+                return written
+            except ProtocolError:
+                # e.g. the controller lost the configuration the delta applies to; send_frames left the
+                # sequence numbers in step with it for the full upload
+                self.acknowledged.pop(index, None)
+        frames = [(FRAME_DATA, _DATA.pack(index, offset) + payload[offset:offset + self.chunk_size])
+                  for offset in range(0, len(payload), self.chunk_size)]
+        written = self.send_frames(frames + [commit])
+        self.acknowledged[index] = payload
+        return written
+
+    def select(self, index):
+        """
+        Switch the controller to a stored configuration.
+        """
+        return self.send_frames([(FRAME_SELECT, bytes([index & 0xFF]))])
+
+    def ping(self):
+        t0 = time.perf_counter()
+        self.send_frames([(FRAME_PING, b'')])
+        return time.perf_counter() - t0
+
+    def set_baudrate(self, baudrate):
+        """
+        Ask the controller to change its baud rate, then follow it.
+        """
+        self.send_frames([(FRAME_BAUD, struct.pack('<I', baudrate))])
+        self.port.baudrate = baudrate
+
+    def autotune(self, payload, chunk_sizes=(64, 128, 256, 512, 1024), windows=(1, 2, 4, 8, 16), baudrates=None,
+                 index=0, repeats=2):
+        """
+        Upload payload with every combination of settings and keep the fastest.
+
+        Returns:
+            list: (seconds per upload, baudrate, chunk_size, window) of every combination, fastest first.
+        """
+        results = []
+        for baudrate in baudrates or [self.port.baudrate]:
+            if baudrate != self.port.baudrate:
+                self.set_baudrate(baudrate)
+            for chunk_size in chunk_sizes:
+                for window in windows:
+                    self.chunk_size, self.window = chunk_size, window
+                    t0 = time.perf_counter()
+                    try:
+                        for _ in range(repeats):
+                            self.upload(index, payload, delta=False)
+                        elapsed = (time.perf_counter() - t0) / repeats
+                    except ProtocolError:
+                        elapsed = float('inf')
+                    results.append((elapsed, baudrate, chunk_size, window))
+        results.sort()
+        _, baudrate, self.chunk_size, self.window = results[0]
+        if baudrate != self.port.baudrate:
+            self.set_baudrate(baudrate)
+        return results
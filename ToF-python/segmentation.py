@@ -0,0 +1,133 @@
+import numpy as np
+
+from camera_model import DEPTH_SCALE_FACTOR
+
+
+class TwoMeansSegmenter:
+    """
+    Exact two-class 1-D k-means (the Otsu criterion) on a histogram of the depth values.
+
+    Drop-in for the KMeans(n_clusters=2) call of cluster_depth_map. The values
+    are binned once on a grid of `resolution` (the depth maps are multiples of
+    the raw depth step, so the grid is lossless for them), bin counts and
+    value sums are accumulated, and the split that maximises the between-class
+    term S0**2/n0 + S1**2/n1 is found with cumulative sums over all bins.
+
+    With warm_start, the threshold of the previous frame seeds Lloyd
+    iterations on the same cumulative sums (what KMeans does, but starting from
+    the last solution instead of a random init), which keeps the split stable
+    from frame to frame; the exhaustive scan is used on the first frame and
+    whenever the iterations fail to converge. It is off by default: Lloyd
+    iterations can stop at a local optimum that the scan does not, and the scan
+    over the cumulative sums is not measurably slower.
+
+    The working buffers only grow, so inputs of varying size (e.g. packed
+    windows) do not reallocate them.
+
+    Args:
+        resolution (float): Bin width in depth units.
+        max_bins (int): Upper bound of the histogram size; the bin width grows when exceeded.
+        warm_start (bool): Seed the split with the threshold of the previous call.
+        max_iter (int): Maximum number of warm-started Lloyd iterations.
+    """
+
+    def __init__(self, resolution=DEPTH_SCALE_FACTOR / 2, max_bins=1 << 20, warm_start=False, max_iter=20):
+        self.resolution = resolution
+        self.max_bins = max_bins
+        self.warm_start = warm_start
+        self.max_iter = max_iter
+        self.threshold = None  # split of the previous call, in depth units
+        self._scaled = None  # bin positions, indices and float64 values of the largest input so far, reused
+        self._idx = None
+        self._weights = None
+
+    def __call__(self, depth_map, out=None, n_outside=0):
+        return self.fit_labels(depth_map, out=out, n_outside=n_outside)
+
+    def fit_labels(self, depth_map, out=None, n_outside=0):
+        """
+        Labels (shape of depth_map) of the two classes, the most populated one being 0:
+        int32, or written into out (e.g. a uint8 buffer) and returned.
+
+        n_outside pixels of value 0 that are not in depth_map are counted in
+        the population: when depth_map holds packed windows around the targets,
+        the rest of the frame, so the split is the one of the whole frame.
+        A depth_map with a single value or with NaN / inf is all background.
+        """
+        values = depth_map.ravel()
+        if out is None:
+            out = np.empty(depth_map.shape, dtype=np.int32)
+        if values.size == 0:
+            return out  # no window
+        v_min, v_max = float(values.min()), float(values.max())
+        if n_outside:
+            v_min, v_max = min(v_min, 0.0), max(v_max, 0.0)
+        if v_max == v_min or not np.isfinite(v_max - v_min):
+            # a single value, or NaN / inf in the input: all background
+            self.threshold = None
+            out.fill(0)
+            return out
+        resolution = max(self.resolution, (v_max - v_min) / (self.max_bins - 1))
+        n_bins = int((v_max - v_min) / resolution) + 1
+        if self._idx is None or self._idx.size < values.size or self._scaled.dtype != values.dtype:
+            self._scaled = np.empty(values.size, dtype=values.dtype)
+            self._idx = np.empty(values.size, dtype=np.intp)
+            self._weights = np.empty(values.size, dtype=np.float64) if values.dtype != np.float64 else None
+        scaled = self._scaled[:values.size]
+        # ((values - v_min) * (1 / resolution)).astype(np.intp), in the reused buffers
+        np.subtract(values, v_min, out=scaled)
+        np.multiply(scaled, 1.0 / resolution, out=scaled)
+        idx = self._idx[:values.size]
+        np.copyto(idx, scaled, casting='unsafe')
+        np.minimum(idx, n_bins - 1, out=idx)
+        counts = np.bincount(idx, minlength=n_bins)
+        if n_outside:
+            counts[min(int((0.0 - v_min) * (1.0 / resolution)), n_bins - 1)] += n_outside
+        counts = np.cumsum(counts)
+        weights = values
+        if self._weights is not None:
+            # bincount works on float64 weights: convert into the reused buffer rather than a temporary
+            weights = self._weights[:values.size]
+            np.copyto(weights, values)
+        sums = np.cumsum(np.bincount(idx, weights=weights, minlength=n_bins))
+
+        split = None
+        if self.warm_start and self.threshold is not None:
+            split = self._lloyd(counts, sums, v_min, resolution, n_bins)
+        if split is None:
+            split = self._scan(counts, sums)
+        self.threshold = v_min + (split + 1) * resolution
+
+        # class 0: bins 0..split (the lower values)
+        np.greater(idx.reshape(depth_map.shape), split, out=out, casting='unsafe')
+        n_low = counts[split]
+        if counts[-1] - n_low > n_low:
+            out ^= 1  # Ensure the label with the most elements is 0
+        return out
+
+    @staticmethod
+    def _scan(counts, sums):
+        # Exhaustive search of the split maximising the between-class term
+        n_total, s_total = counts[-1], sums[-1]
+        n0, s0 = counts[:-1], sums[:-1]
+        n1, s1 = n_total - n0, s_total - s0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            between = s0 * s0 / n0 + s1 * s1 / n1
+        between[(n0 == 0) | (n1 == 0)] = -np.inf
+        return int(np.argmax(between))
+
+    def _lloyd(self, counts, sums, v_min, resolution, n_bins):
+        # Lloyd iterations from the previous threshold, O(1) per iteration
+        n_total, s_total = counts[-1], sums[-1]
+        split = int(np.clip(np.ceil((self.threshold - v_min) / resolution) - 1, 0, n_bins - 2))
+        for _ in range(self.max_iter):
+            n0, s0 = counts[split], sums[split]
+            n1, s1 = n_total - n0, s_total - s0
+            if n0 == 0 or n1 == 0:
+                return None
+            midpoint = (s0 / n0 + s1 / n1) / 2
+            new_split = int(np.clip(np.ceil((midpoint - v_min) / resolution) - 1, 0, n_bins - 2))
+            if new_split == split:
+                return split
+            split = new_split
+        return None
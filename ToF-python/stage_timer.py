@@ -0,0 +1,182 @@
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Binary dump: one record per stage (.npy)
+STATS_DTYPE = np.dtype([('stage', 'S32'), ('count', '<u8'), ('sum', '<f8'), ('max', '<f8'),
+                        ('p50', '<f8'), ('p95', '<f8'), ('p99', '<f8')])
+QUANTILES = (50, 95, 99)
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+class _Series:
+    # Last `window` durations of a stage (seconds), plus totals since the start
+
+    __slots__ = ('values', 'count', 'sum', 'max')
+
+    def __init__(self, window):
+        self.values = np.zeros(window)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.values[self.count % len(self.values)] = duration
+        self.count += 1
+        self.sum += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentiles(self):
+        return np.percentile(self.values[:min(self.count, len(self.values))], QUANTILES)
+
+
+class StageTimer:
+    """
+    Per-stage latency of the processing loop on the monotonic clock.
+
+    start() marks the beginning of a frame and lap(stage) closes the stage
+    that ran since the previous mark, so consecutive stages cost one clock read
+    each; span(stage) times a block on its own. frame_done() records the whole
+    frame and counts the camera frames that were never processed. Percentiles
+    are computed over the last `window` frames, only when stats are read or
+    written. With enabled=False every method is a no-op and nothing is recorded.
+
+    Args:
+        enabled (bool): Record timings.
+        window (int): Number of recent durations per stage the percentiles are computed over.
+        dump_path (str): File the statistics are written to periodically: Prometheus text, or a
+            binary STATS_DTYPE array if it ends with .npy. None to never write.
+        dump_interval (float): Seconds between two writes of dump_path.
+    """
+
+    def __init__(self, enabled=True, window=1000, dump_path=None, dump_interval=10.0):
+        self.enabled = enabled
+        self.window = window
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.series = {}
+        self.counters = {'frames': 0, 'dropped_frames': 0, 'repeated_frames': 0}
+        self._frame_start = None
+        self._last = None
+        self._last_index = None
+        self._next_dump = time.monotonic() + dump_interval
+        if not enabled:
+            self.start = self.lap = self.frame_done = self.count = _noop
+            self.span = _null_span
+
+    def _record(self, stage, duration):
+        series = self.series.get(stage)
+        if series is None:
+            series = self.series[stage] = _Series(self.window)
+        series.add(duration)
+
+    def start(self):
+        self._frame_start = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self._record(stage, now - self._last)
+        self._last = now
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(stage, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def frame_done(self, frame_index=None):
+        """
+        Close the frame started by start(). frame_index (the camera sequence
+        number) is used to count dropped and repeated frames.
+        """
+        now = time.perf_counter()
+        self._record('frame', now - self._frame_start)
+        self._last = now
+        self.counters['frames'] += 1
+        if frame_index is not None:
+            if self._last_index is not None:
+                if frame_index <= self._last_index:
+                    self.counters['repeated_frames'] += 1
+                else:
+                    self.counters['dropped_frames'] += frame_index - self._last_index - 1
+            if self._last_index is None or frame_index > self._last_index:
+                self._last_index = frame_index
+        if self.dump_path is not None and time.monotonic() >= self._next_dump:
+            self._next_dump = time.monotonic() + self.dump_interval
+            self.dump()
+
+    def stats(self):
+        """
+        Statistics per stage in the STATS_DTYPE layout (durations in seconds).
+        """
+        stats = np.zeros(len(self.series), dtype=STATS_DTYPE)
+        for row, (stage, series) in zip(stats, self.series.items()):
+            row['stage'] = stage.encode()[:32]
+            row['count'], row['sum'], row['max'] = series.count, series.sum, series.max
+            row['p50'], row['p95'], row['p99'] = series.percentiles()
+        return stats
+
+    def prometheus_text(self, prefix='tof'):
+        lines = [f'# TYPE {prefix}_stage_seconds summary']
+        for row in self.stats():
+            stage = row['stage'].decode()
+            for quantile in QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{quantile / 100:g}"}} '
+                             f'{row[f"p{quantile}"]:.6g}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {row["sum"]:.6g}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {row["count"]}')
+        for name, value in self.counters.items():
+            lines += [f'# TYPE {prefix}_{name}_total counter', f'{prefix}_{name}_total {value}']
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path=None):
+        """
+        Write the statistics to path (default dump_path), replacing the file atomically.
+        """
+        path = path or self.dump_path
+        tmp_path = path + '.tmp'
+        if path.endswith('.npy'):
+            with open(tmp_path, 'wb') as f:
+                np.save(f, self.stats())
+        else:
+            with open(tmp_path, 'w') as f:
+                f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def report(self):
+        """
+        Human-readable table of the statistics in milliseconds.
+        """
+        lines = [f'{"stage":<16s} {"count":>7s} {"mean":>8s} {"p50":>8s} {"p95":>8s} {"p99":>8s} {"max":>8s}']
+        for row in self.stats():
+            lines.append(f'{row["stage"].decode():<16s} {row["count"]:7d} {row["sum"] / row["count"] * 1e3:8.2f} '
+                         f'{row["p50"] * 1e3:8.2f} {row["p95"] * 1e3:8.2f} {row["p99"] * 1e3:8.2f} '
+                         f'{row["max"] * 1e3:8.2f}')
+        lines.append(', '.join(f'{name} {value}' for name, value in self.counters.items()))
+        return '\n'.join(lines)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _null_span(stage):
+    return _NULL_SPAN
@@ -0,0 +1,217 @@
+import csv
+
+import numpy as np
+
+from camera_model import DEPTH_SCALE_FACTOR
+from capture_file import CaptureWriter
+
+# Ground truth, one row per person per frame: image box, angles in degrees of the direction of the body
+# centre (half the height above the floor; positive to the right and downwards, as target_angles), position
+# on the floor in meters (x to the right, z away from the camera)
+TRUTH_FIELDS = ['frame', 'timestamp', 'person', 'x', 'y', 'w', 'h', 'angle_hor', 'angle_ver', 'pos_x', 'pos_z',
+                'visible']
+
+
+def _reflect(x, low, high):
+    # Positions of a point bouncing between low and high, moving freely along x
+    span = high - low
+    x = np.mod(x - low, 2 * span)
+    return low + np.where(x > span, 2 * span - x, x)
+
+
+class SceneGenerator:
+    """
+    Synthetic raw depth sequences of a room with people walking in it, seen by
+    the ToF camera with the field of view of load_camera_matrix.
+
+    The room is a box (floor, ceiling, back and side walls) around a camera
+    looking horizontally; each person is an upright elliptical blob walking at
+    constant speed on the floor and bouncing off the walls. Frames are rendered
+    in chunks with array operations only; the sensor noise and dropouts are
+    windows at random offsets into banks drawn once, so a frame costs no random
+    draws per pixel. Everything is determined by the seed.
+
+    Args:
+        n_people (int): Number of people.
+        shape (tuple): Frame shape (height, width).
+        fov (tuple): Horizontal and vertical field of view in degrees.
+        fps (float): Frame rate, for the timestamps and walking speeds.
+        noise (float): Standard deviation of the depth noise in meters.
+        dropout (float): Fraction of pixels without a return (0).
+        seed (int): Seed of the trajectories, noise and dropouts.
+        room (tuple): Width, depth and height of the room in meters.
+        camera_height (float): Height of the camera above the floor in meters.
+    """
+
+    def __init__(self, n_people=2, shape=(480, 640), fov=(108, 78), fps=24, noise=0.01, dropout=0.005, seed=0,
+                 room=(6.0, 6.0, 2.8), camera_height=1.2):
+        self.n_people = n_people
+        self.shape = tuple(shape)
+        self.fps = fps
+        self.noise = noise
+        self.dropout = dropout
+        self.room = room
+        self.camera_height = camera_height
+        height, width = self.shape
+        self.fx = width / (2 * np.tan(np.radians(fov[0]) / 2))
+        self.fy = height / (2 * np.tan(np.radians(fov[1]) / 2))
+        self.cx, self.cy = width / 2, height / 2
+        rng = np.random.default_rng(seed)
+
+        # people: start position, velocity (0.3 .. 1.4 m/s), size
+        room_width, room_depth, _ = room
+        self.x_range = (-room_width / 2 + 0.4, room_width / 2 - 0.4)
+        self.z_range = (1.0, room_depth - 0.4)
+        self.start = np.stack([rng.uniform(*self.x_range, n_people), rng.uniform(*self.z_range, n_people)], axis=1)
+        heading = rng.uniform(0, 2 * np.pi, n_people)
+        speed = rng.uniform(0.3, 1.4, n_people)
+        self.velocity = np.stack([np.cos(heading), np.sin(heading)], axis=1) * speed[:, None]
+        self.person_height = rng.uniform(1.55, 1.9, n_people)
+        self.person_width = rng.uniform(0.4, 0.55, n_people)
+
+        self._u = np.arange(width, dtype=np.float32)
+        self._v = np.arange(height, dtype=np.float32)
+        self.background = self._room_depth()
+
+        # noise and dropout banks, read through random windows
+        n_pixels = height * width
+        self._noise_bank = (rng.standard_normal(4 * n_pixels, dtype=np.float32) * noise).astype(np.float32)
+        self._dropout_bank = rng.random(4 * n_pixels, dtype=np.float32) < dropout
+        self._seed = seed
+
+    def _room_depth(self):
+        # distance along the optical axis to the first wall hit by each pixel ray
+        x = ((self._u - self.cx) / self.fx)[None, :]
+        y = ((self._v - self.cy) / self.fy)[:, None]  # image down = towards the floor
+        room_width, room_depth, room_height = self.room
+        with np.errstate(divide='ignore'):
+            candidates = [np.full(np.broadcast(x, y).shape, room_depth, dtype=np.float32),
+                          np.where(y > 0, self.camera_height / y, np.inf),
+                          np.where(y < 0, (room_height - self.camera_height) / -y, np.inf),
+                          np.where(x != 0, room_width / 2 / np.abs(x), np.inf)]
+        return np.minimum.reduce([np.broadcast_to(c, candidates[0].shape) for c in candidates]).astype(np.float32)
+
+    def positions(self, frames):
+        """
+        Floor positions (len(frames), n_people, 2) of the people at frame numbers `frames`.
+        """
+        t = np.asarray(frames, dtype=np.float64)[:, None] / self.fps
+        x = _reflect(self.start[:, 0] + self.velocity[:, 0] * t, *self.x_range)
+        z = _reflect(self.start[:, 1] + self.velocity[:, 1] * t, *self.z_range)
+        return np.stack([x, z], axis=-1)
+
+    def boxes(self, positions):
+        """
+        Image bounding boxes (..., 4) as x, y, w, h (floats, unclipped) of people at positions.
+        """
+        x, z = positions[..., 0], positions[..., 1]
+        u_center = self.cx + self.fx * x / z
+        half_width = self.fx * self.person_width / 2 / z
+        v_feet = self.cy + self.fy * self.camera_height / z
+        v_head = self.cy + self.fy * (self.camera_height - self.person_height) / z
+        return np.stack([u_center - half_width, v_head, 2 * half_width, v_feet - v_head], axis=-1)
+
+    def render(self, first, n_frames):
+        """
+        Raw uint16 frames first .. first + n_frames - 1, as (n_frames, height, width).
+        """
+        frames = np.arange(first, first + n_frames)
+        positions = self.positions(frames)
+        boxes = self.boxes(positions)
+        depth = np.repeat(self.background[None], n_frames, axis=0)
+        height, width = self.shape
+        for person in range(self.n_people):
+            # only the window the person covers during the chunk is rendered
+            x, y, w, h = (boxes[:, person, k] for k in range(4))
+            u0, u1 = max(int(x.min()), 0), min(int(np.ceil((x + w).max())) + 1, width)
+            v0, v1 = max(int(y.min()), 0), min(int(np.ceil((y + h).max())) + 1, height)
+            if u0 >= u1 or v0 >= v1:
+                continue
+            u = self._u[None, None, u0:u1]
+            v = self._v[None, v0:v1, None]
+            x, y, w, h = (a[:, None, None] for a in (x, y, w, h))
+            # elliptical silhouette, a bit closer in the middle than on the sides
+            r2 = ((u - x - w / 2) / (w / 2)) ** 2 + ((v - y - h / 2) / (h / 2)) ** 2
+            body = positions[:, person, 1][:, None, None] - 0.12 * np.sqrt(np.clip(1 - r2, 0, 1))
+            window = depth[:, v0:v1, u0:u1]
+            np.minimum(window, np.where(r2 < 1, body, np.inf), out=window)
+        n_pixels = depth[0].size
+        for i, frame in enumerate(frames):
+            # windows drawn from the frame number, so a frame does not depend on the chunking
+            noise_offset, dropout_offset = np.random.default_rng([self._seed, frame]).integers(
+                0, len(self._noise_bank) - n_pixels, 2)
+            flat = depth[i].reshape(-1)
+            flat += self._noise_bank[noise_offset:noise_offset + n_pixels]
+            flat[self._dropout_bank[dropout_offset:dropout_offset + n_pixels]] = 0
+        np.clip(depth / DEPTH_SCALE_FACTOR, 0, 65535, out=depth)
+        return depth.astype(np.uint16)
+
+    def ground_truth(self, first, n_frames):
+        """
+        Ground truth rows (TRUTH_FIELDS) of frames first .. first + n_frames - 1.
+        """
+        frames = np.arange(first, first + n_frames)
+        positions = self.positions(frames)
+        boxes = self.boxes(positions)
+        height, width = self.shape
+        # the box as the detector sees it: clipped to the image
+        x0 = np.clip(boxes[..., 0], 0, width)
+        y0 = np.clip(boxes[..., 1], 0, height)
+        x1 = np.clip(boxes[..., 0] + boxes[..., 2], 0, width)
+        y1 = np.clip(boxes[..., 1] + boxes[..., 3], 0, height)
+        # direction of the 3D body centre, not of the box centre (the box is not symmetric about it off axis)
+        body_y = self.camera_height - self.person_height / 2
+        angle_hor = np.degrees(np.arctan2(positions[..., 0], positions[..., 1]))
+        angle_ver = np.degrees(np.arctan2(body_y, positions[..., 1]))
+        visible = (x1 > x0) & (y1 > y0)
+        rows = []
+        for i, frame in enumerate(frames):
+            for person in range(self.n_people):
+                rows.append([int(frame), float(frame / self.fps), person, round(float(x0[i, person])),
+                             round(float(y0[i, person])), round(float(x1[i, person] - x0[i, person])),
+                             round(float(y1[i, person] - y0[i, person])), float(angle_hor[i, person]),
+                             float(angle_ver[i, person]), float(positions[i, person, 0]),
+                             float(positions[i, person, 1]), int(visible[i, person])])
+        return rows
+
+
+def write_sequence(path, generator, n_frames, truth_path=None, chunk_frames=32, start_time=0.0):
+    """
+    Render n_frames into a capture file (see capture_file) and write the ground truth CSV
+    next to it (path + '.truth.csv' by default).
+
+    Returns:
+        str: Path of the ground truth file.
+    """
+    truth_path = truth_path or path + '.truth.csv'
+    with CaptureWriter(path, shape=generator.shape, max_frames=max(n_frames, 1), buffer_frames=chunk_frames) \
+            as writer, open(truth_path, 'w', newline='') as truth_file:
+        truth = csv.writer(truth_file)
+        truth.writerow(TRUTH_FIELDS)
+        for first in range(0, n_frames, chunk_frames):
+            count = min(chunk_frames, n_frames - first)
+            for i, frame in enumerate(generator.render(first, count)):
+                writer.append(frame, timestamp=start_time + (first + i) / generator.fps, sequence=first + i)
+            truth.writerows(generator.ground_truth(first, count))
+    return truth_path
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Write a synthetic multi-person depth sequence as a capture file.')
+    parser.add_argument('output', help='capture file (.fdcap)')
+    parser.add_argument('--people', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--fps', type=float, default=24)
+    parser.add_argument('--noise', type=float, default=0.01, help='depth noise in meters')
+    parser.add_argument('--dropout', type=float, default=0.005, help='fraction of pixels without a return')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generator = SceneGenerator(args.people, fps=args.fps, noise=args.noise, dropout=args.dropout, seed=args.seed)
+    n_frames = int(args.seconds * args.fps)
+    t0 = time.perf_counter()
+    truth_path = write_sequence(args.output, generator, n_frames)
+    print(f'{n_frames} frames written to {args.output} in {time.perf_counter() - t0:.1f} s, '
+          f'ground truth in {truth_path}')
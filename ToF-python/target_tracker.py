@@ -0,0 +1,270 @@
+import numpy as np
+
+# Coordinates of a track, each filtered on its own with a constant-velocity model:
+#   box centre x, y, width and height in pixels, horizontal and vertical angle in degrees
+TRACK_COORDS = ['center_x', 'center_y', 'width', 'height', 'angle_hor', 'angle_ver']
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Intersection over union (len(boxes_a), len(boxes_b)) of boxes (x, y, w, h).
+    """
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(1, -1, 4)
+    overlap_w = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    overlap_h = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    intersection = np.clip(overlap_w, 0, None) * np.clip(overlap_h, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(union > 0, intersection / union, 0.0)
+
+
+def merge_windows(windows):
+    """
+    Windows (x, y, w, h) replaced by their bounding rectangle while any two
+    overlap or touch, so that no pixel is processed twice and no target is
+    split between two windows.
+    """
+    windows = [tuple(window) for window in windows]
+    i = 0
+    while i < len(windows):
+        x0, y0, w0, h0 = windows[i]
+        for j in range(i + 1, len(windows)):
+            x1, y1, w1, h1 = windows[j]
+            if x0 <= x1 + w1 and x1 <= x0 + w0 and y0 <= y1 + h1 and y1 <= y0 + h0:
+                x, y = min(x0, x1), min(y0, y1)
+                windows[i] = (x, y, max(x0 + w0, x1 + w1) - x, max(y0 + h0, y1 + h1) - y)
+                del windows[j]
+                i = -1  # the grown window can now reach an earlier one
+                break
+        i += 1
+    return windows
+
+
+class TargetTracker:
+    """
+    Constant-velocity Kalman tracking of the targets found by find_components,
+    the windows of the next frame they can be in, and their angles at a later time.
+
+    Each coordinate of a track (TRACK_COORDS: box centre and size, angles)
+    has its own position/velocity filter with white-noise acceleration; the
+    states of all tracks are (tracks, coordinates, 2) arrays filtered at once.
+    The tracks are predicted to the time of each frame and the detections are
+    associated greedily, by decreasing IoU of the predicted and detected boxes
+    (at least min_iou). A detection left over starts a new track, replacing
+    the track missed for longest if max_tracks are already followed, and a
+    track missed more than max_missed frames in a row is dropped.
+
+    windows() gives the parts of the next frame to process: the predicted
+    boxes grown on every side by margin times their size plus margin_pixels,
+    merged where they meet. It gives None, for a sweep of the whole frame,
+    when there is no track, every sweep_interval frames (to catch people
+    coming in; every search_interval frames while fewer than max_tracks are
+    followed) and after a target touched the inner edge of its window (it may
+    extend beyond). predict_angles() extrapolates the angles of tracks, e.g.
+    to the time the RIS is steered, so that the beam follows the target
+    rather than the frame it was seen in.
+
+    Times are in seconds, on any clock used consistently (capture times and actuation time).
+
+    Args:
+        max_tracks (int): Number of targets followed.
+        min_iou (float): Smallest IoU of a detection with a predicted box to continue the track.
+        max_missed (int): Frames in a row a track is kept without detection.
+        sweep_interval (int): Frames between two sweeps of the whole frame.
+        search_interval (int): Frames between two sweeps while fewer than max_tracks targets are followed.
+        margin (float): Growth of the predicted boxes on every side, as a fraction of their size.
+        margin_pixels (int): Growth of the predicted boxes on every side, in pixels.
+        shape (tuple): Frame shape (height, width).
+        box_noise (float): Standard deviation of the measured box coordinates, in pixels.
+        angle_noise (float): Standard deviation of the measured angles, in degrees.
+        box_acceleration (float): Standard deviation of the box accelerations, in pixels/s^2.
+        angle_acceleration (float): Standard deviation of the angular accelerations, in degrees/s^2.
+    """
+
+    def __init__(self, max_tracks=2, min_iou=0.1, max_missed=6, sweep_interval=24, search_interval=6, margin=0.25,
+                 margin_pixels=16, shape=(480, 640), box_noise=2.0, angle_noise=0.3, box_acceleration=300.0,
+                 angle_acceleration=30.0):
+        self.max_tracks = max_tracks
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.sweep_interval = sweep_interval
+        self.search_interval = search_interval
+        self.margin = margin
+        self.margin_pixels = margin_pixels
+        self.shape = tuple(shape)
+        self._variance = np.array([box_noise] * 4 + [angle_noise] * 2) ** 2
+        self._acceleration = np.array([box_acceleration] * 4 + [angle_acceleration] * 2) ** 2
+        self.ids = np.empty(0, dtype=np.int64)
+        self.state = np.empty((0, len(TRACK_COORDS), 2))             # position, velocity
+        self.covariance = np.empty((0, len(TRACK_COORDS), 2, 2))
+        self.missed = np.empty(0, dtype=np.int64)
+        self.time = None        # time the tracks are predicted to
+        self.n_sweeps = 0
+        self._next_id = 0
+        self._since_sweep = 0
+        self._sweep = True      # sweep the next frame
+        self._windows = None    # windows handed out for the current frame
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _advance(self, timestamp):
+        # predict every track to timestamp
+        if self.time is not None and len(self.ids) and timestamp > self.time:
+            dt = timestamp - self.time
+            q = self._acceleration
+            state, covariance = self.state, self.covariance
+            state[..., 0] += dt * state[..., 1]
+            p00, p01, p11 = covariance[..., 0, 0], covariance[..., 0, 1], covariance[..., 1, 1]
+            # F P F^T + Q, F = [[1, dt], [0, 1]]
+            p00 += 2 * dt * p01 + dt * dt * p11 + q * dt ** 3 / 3
+            p01 += dt * p11 + q * dt ** 2 / 2
+            p11 += q * dt
+            covariance[..., 1, 0] = p01
+        if self.time is None or timestamp > self.time:
+            self.time = timestamp
+
+    def _boxes(self, positions):
+        # (x, y, w, h) of the centre/size positions
+        center, size = positions[:, :2], positions[:, 2:4]
+        return np.concatenate([center - size / 2, size], axis=1)
+
+    def _rows(self, ids):
+        return np.array([np.flatnonzero(self.ids == track_id)[0] for track_id in ids], dtype=np.intp)
+
+    def windows(self, timestamp):
+        """
+        Windows (x, y, w, h) of the frame captured at timestamp the targets can
+        be in, or None if the whole frame has to be processed.
+        """
+        self._advance(timestamp)
+        self._since_sweep += 1
+        interval = self.sweep_interval if len(self.ids) >= self.max_tracks else self.search_interval
+        if self._sweep or not len(self.ids) or self._since_sweep >= interval:
+            self._sweep = False
+            self._since_sweep = 0
+            self.n_sweeps += 1
+            self._windows = None
+            return None
+        boxes = self._boxes(self.state[..., 0])
+        grow = self.margin * boxes[:, 2:] + self.margin_pixels
+        height, width = self.shape
+        x0, y0 = np.floor(boxes[:, :2] - grow).T
+        x1, y1 = np.ceil(boxes[:, :2] + boxes[:, 2:] + grow).T
+        x0, x1 = np.clip(x0, 0, width).astype(int), np.clip(x1, 0, width).astype(int)
+        y0, y1 = np.clip(y0, 0, height).astype(int), np.clip(y1, 0, height).astype(int)
+        keep = (x1 > x0) & (y1 > y0)
+        self._windows = merge_windows(zip(x0[keep], y0[keep], (x1 - x0)[keep], (y1 - y0)[keep]))
+        if not self._windows:
+            self._windows = None
+            self.n_sweeps += 1
+        return self._windows
+
+    def update(self, boxes, angles, timestamp):
+        """
+        Continue the tracks with the detections of the frame captured at
+        timestamp: boxes (k, 4) as x, y, w, h and angles (k, 2), largest first.
+
+        Returns:
+            numpy.ndarray: Track id of each detection, -1 if it is not followed.
+        """
+        self._advance(timestamp)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        angles = np.asarray(angles, dtype=np.float64).reshape(-1, 2)
+        measured = np.concatenate([boxes[:, :2] + boxes[:, 2:] / 2, boxes[:, 2:], angles], axis=1)
+        ids = np.full(len(boxes), -1, dtype=np.int64)
+        matched = np.zeros(len(self.ids), dtype=bool)
+        if len(self.ids) and len(boxes):
+            iou = box_iou(self._boxes(self.state[..., 0]), boxes)
+            for track, detection in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[track, detection] < self.min_iou:
+                    break
+                if not matched[track] and ids[detection] < 0:
+                    matched[track] = True
+                    ids[detection] = self.ids[track]
+        if matched.any():
+            self._correct(self._rows(ids[ids >= 0]), measured[ids >= 0])
+        self.missed[matched] = 0
+        self.missed[~matched] += 1
+        keep = self.missed <= self.max_missed
+        self.ids, self.state, self.covariance, self.missed = (self.ids[keep], self.state[keep],
+                                                              self.covariance[keep], self.missed[keep])
+        for detection in np.flatnonzero(ids < 0):
+            if len(self.ids) >= self.max_tracks:
+                if not self.missed.any():
+                    break
+                self._drop(np.argmax(self.missed))
+            ids[detection] = self._start(measured[detection])
+        if self._windows is not None and len(boxes):
+            self._sweep |= self._touches_window(boxes)
+        return ids
+
+    def _correct(self, rows, measured):
+        # Kalman update with the measured positions, H = [1, 0]
+        state, covariance = self.state[rows], self.covariance[rows]
+        p00, p01, p11 = covariance[..., 0, 0], covariance[..., 0, 1], covariance[..., 1, 1]
+        s = p00 + self._variance
+        k0, k1 = p00 / s, p01 / s
+        innovation = measured - state[..., 0]
+        state[..., 0] += k0 * innovation
+        state[..., 1] += k1 * innovation
+        # (I - K H) P
+        p11 -= k1 * p01
+        p00 *= 1 - k0
+        p01 *= 1 - k0
+        covariance[..., 1, 0] = p01
+        self.state[rows], self.covariance[rows] = state, covariance
+
+    def _start(self, measured):
+        track_id = self._next_id
+        self._next_id += 1
+        state = np.stack([measured, np.zeros_like(measured)], axis=-1)
+        # velocity unknown: up to one second of the typical acceleration
+        covariance = np.zeros((len(measured), 2, 2))
+        covariance[:, 0, 0] = self._variance
+        covariance[:, 1, 1] = self._acceleration
+        self.ids = np.append(self.ids, track_id)
+        self.state = np.concatenate([self.state, state[None]])
+        self.covariance = np.concatenate([self.covariance, covariance[None]])
+        self.missed = np.append(self.missed, 0)
+        return track_id
+
+    def _drop(self, row):
+        self.ids, self.state, self.covariance, self.missed = (np.delete(self.ids, row), np.delete(self.state, row, 0),
+                                                              np.delete(self.covariance, row, 0),
+                                                              np.delete(self.missed, row))
+
+    def _touches_window(self, boxes):
+        # a box on the edge of its window that is not the edge of the frame
+        height, width = self.shape
+        x0, y0 = boxes[:, 0], boxes[:, 1]
+        x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+        for wx, wy, ww, wh in self._windows:
+            inside = (x0 >= wx) & (x1 <= wx + ww) & (y0 >= wy) & (y1 <= wy + wh)
+            edge = (((x0 == wx) & (wx > 0)) | ((x1 == wx + ww) & (wx + ww < width)) |
+                    ((y0 == wy) & (wy > 0)) | ((y1 == wy + wh) & (wy + wh < height)))
+            if (inside & edge).any():
+                return True
+        return False
+
+    def predict(self, timestamp, ids=None):
+        """
+        Boxes (k, 4) as x, y, w, h and angles (k, 2) of the tracks ids (all by default) extrapolated to timestamp.
+        """
+        rows = slice(None) if ids is None else self._rows(ids)
+        positions = self.state[rows, :, 0] + (timestamp - self.time) * self.state[rows, :, 1]
+        return self._boxes(positions), positions[:, 4:]
+
+    def predict_angles(self, timestamp, ids=None):
+        """
+        Angles (k, 2) of the tracks ids (all by default) extrapolated to timestamp.
+        """
+        return self.predict(timestamp, ids)[1]
+
+    def angle_rates(self, ids=None):
+        """
+        Angular velocities (k, 2) of the tracks ids (all by default), in degrees per second.
+        """
+        rows = slice(None) if ids is None else self._rows(ids)
+        return self.state[rows, 4:, 1]
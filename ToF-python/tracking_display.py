@@ -0,0 +1,165 @@
+import time
+
+import numpy as np
+
+# 'blit': artists created once and redrawn over a saved background, at a capped rate;
+# 'redraw': axes cleared and everything recreated and drawn every frame (the original loop);
+# 'headless': nothing is drawn
+DISPLAY_MODES = ('blit', 'redraw', 'headless')
+
+
+def _angle_text(angle_hor, angle_ver):
+    return f'horizontal: {angle_hor:.2f}$^\\circ$\nvertical: {angle_ver:.2f}$^\\circ$'
+
+
+class TrackingDisplay:
+    """
+    Raw frame and depth map of the processing loop with the boxes and angles of the targets.
+
+    The loop used to clear both axes, create two images, a Rectangle and a
+    text artist per box and redraw the whole figure for every frame ('redraw'
+    mode, kept for comparison). In 'blit' mode the images, boxes and labels
+    are created once, marked animated and updated in place (set_data,
+    set_bounds, set_text); the static parts (axes, ticks, colorbar) are drawn
+    once and saved, and a refresh restores them and draws only the animated
+    artists. Refreshes happen at most max_fps times per second whatever the
+    processing rate: update() returns at once in between. In 'headless' mode
+    nothing is drawn and matplotlib is not imported.
+
+    Args:
+        mode (str): 'blit', 'redraw' or 'headless'.
+        max_targets (int): Number of boxes shown.
+        max_fps (float): Largest refresh rate in 'blit' mode (None: every frame).
+        shape (tuple): Image shape (height, width).
+        cmap: Colormap of the depth map.
+        vmax (float): Depth at the top of the colour scale, in meters.
+        show_frame (bool): Show the raw frame next to the depth map.
+    """
+
+    def __init__(self, mode='blit', max_targets=2, max_fps=10, shape=(480, 640), cmap='jet', vmax=10,
+                 show_frame=True):
+        if mode not in DISPLAY_MODES:
+            raise ValueError(f'unknown display mode {mode!r}, expected one of {DISPLAY_MODES}')
+        self.mode = mode
+        self.max_targets = max_targets
+        self.interval = 1 / max_fps if max_fps else 0.0
+        self.cmap = cmap
+        self.vmax = vmax
+        self.n_updates = 0  # frames offered
+        self.n_draws = 0    # refreshes of the figure
+        self._next = 0.0
+        self.fig = None
+        if mode == 'headless':
+            return
+
+        import matplotlib.pyplot as plt
+
+        self.plt = plt
+        if show_frame:
+            self.fig, self.axes = plt.subplots(1, 2, figsize=(10, 5))
+        else:
+            self.fig, axis = plt.subplots(figsize=(6, 5))
+            self.axes = [None, axis]
+        if mode == 'redraw':
+            return
+        zeros = np.zeros(shape, dtype=np.float32)
+        # nearest-neighbour resampling: the cheapest to redraw, at screen size the difference is invisible
+        self.raw_image = None
+        if show_frame:
+            self.raw_image = self.axes[0].imshow(zeros, cmap='Greys', interpolation='nearest', animated=True)
+        self.depth_image = self.axes[1].imshow(zeros, cmap=cmap, vmin=0, vmax=vmax, interpolation='nearest',
+                                               animated=True)
+        self.fig.colorbar(self.depth_image, label='Depth (meter)', pad=.05, fraction=0.034)
+        self.boxes = [self.axes[1].add_patch(plt.Rectangle((0, 0), 0, 0, fill=False, color='white',
+                                                           visible=False, animated=True))
+                      for _ in range(max_targets)]
+        self.labels = [self.axes[1].text(0, 0, '', color='white', fontsize=10, ha='right', va='bottom',
+                                         bbox=dict(facecolor='black', alpha=0.5, pad=5), visible=False,
+                                         animated=True)
+                       for _ in range(max_targets)]
+        self._artists = [artist for artist in [self.raw_image, self.depth_image] + self.boxes + self.labels
+                         if artist is not None]
+        self._background = None
+        # the saved background is taken again whenever the figure is fully drawn (first show, resize)
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def _on_draw(self, event):
+        canvas = self.fig.canvas
+        self._background = canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._artists:
+            self.fig.draw_artist(artist)
+
+    def due(self):
+        """
+        True if update() would refresh the figure now.
+        """
+        return self.mode == 'redraw' or (self.mode == 'blit' and time.perf_counter() >= self._next)
+
+    def update(self, img, depth_map, boxes, angles):
+        """
+        Show a frame (ignored without show_frame), its depth map and the targets'
+        boxes (x, y, w, h) and angles (horizontal, vertical).
+
+        Returns:
+            bool: True if the figure was refreshed.
+        """
+        self.n_updates += 1
+        if not self.due():
+            return False
+        self._next = time.perf_counter() + self.interval
+        if self.mode == 'redraw':
+            self._redraw(img, depth_map, boxes, angles)
+        else:
+            self._blit(img, depth_map, boxes, angles)
+        self.n_draws += 1
+        return True
+
+    def _redraw(self, img, depth_map, boxes, angles):
+        axes, plt = self.axes, self.plt
+        if axes[0] is not None:
+            axes[0].cla()  # Clear the first axis
+            axes[0].imshow(img, cmap='Greys')
+        axes[1].cla()  # Clear the second axis
+        im0 = axes[1].imshow(depth_map, cmap=self.cmap, vmin=0, vmax=self.vmax)
+        if self.n_draws == 0:
+            self.fig.colorbar(im0, label='Depth (meter)', pad=.05, fraction=0.034)
+        for x, y, w, h in boxes:
+            axes[1].add_patch(plt.Rectangle((x, y), w, h, fill=False, color='white'))
+        for i, (angle_hor, angle_ver) in enumerate(angles):
+            axes[1].text(boxes[i][0], boxes[i][1] - 10, _angle_text(angle_hor, angle_ver), color='white',
+                         fontsize=10, ha='right', va='bottom', bbox=dict(facecolor='black', alpha=0.5, pad=5))
+        self.fig.canvas.draw()
+        self.fig.canvas.flush_events()
+
+    def _blit(self, img, depth_map, boxes, angles):
+        if self.raw_image is not None:
+            self.raw_image.set_data(img)
+            self.raw_image.autoscale()  # grey scale over the range of the frame, as imshow does
+        self.depth_image.set_data(depth_map)
+        boxes = np.asarray(boxes).tolist()
+        angles = np.asarray(angles).tolist()
+        for i, (box, label) in enumerate(zip(self.boxes, self.labels)):
+            visible = i < len(boxes)
+            box.set_visible(visible)
+            label.set_visible(visible)
+            if visible:
+                x, y, w, h = boxes[i]
+                box.set_bounds(x, y, w, h)
+                label.set_position((x, y - 10))
+                label.set_text(_angle_text(*angles[i]))
+        canvas = self.fig.canvas
+        if self._background is None:
+            canvas.draw()  # draw_event saves the background and draws the artists
+        else:
+            canvas.restore_region(self._background)
+            for artist in self._artists:
+                self.fig.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def close(self):
+        if self.fig is not None:
+            self.plt.close(self.fig)
+            self.fig = None